@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Simulador del Arduino (robot_arm.ino) sobre un pseudo-terminal.
+
+Abre un pty y habla el mismo protocolo que el firmware:
+  - move <motor> <pasos> <f|b>    bloquea el bucle pasos x 1.2 ms + 100 ms
+                                  y al terminar responde {"done":N}
+  - pbd start / pbd stop
+  - record start <ejes_csv> [ms] / record stop   -> {"axis":N,"pos":M}
+  - track <ms>                    muestras del eje durante cada move, cada
+                                  <ms> y una al final (0 = ninguna)
+  - bomba, solenoide, efector, rotarEfector      (se aceptan y se ignoran)
+
+Igual que en el firmware, un movimiento bloquea el bucle: mientras dura no
+se leen comandos ni se envían más muestras que las de "track", y lo que
+llegue en ese tiempo por encima del buffer de recepción de 64 bytes se pierde.
+
+Uso:
+    python3 arduino_sim.py [--link /tmp/ttyROBOT] [--fast] [--stall EJE]
+    ROBOT_SERIAL_PORT=/tmp/ttyROBOT python3 main.py
+"""
+
+import argparse
+import math
+import os
+import select
+import threading
+import time
+import tty
+
+STEP_HALF_PERIOD_S = 600e-6      # delayMicroseconds(600) alto + 600 bajo
+MOVE_SETTLE_S      = 0.100       # delay(100) tras cada move
+RX_BUFFER_BYTES    = 64          # buffer de Serial en el Arduino
+BAUD               = 38400
+COUNTS_PER_STEP    = 65536.0 / 3200.0
+DEFAULT_INTERVAL_MS = 1000
+
+class ArduinoSim:
+    """Arduino simulado. `realistic=False` quita los retardos de movimiento
+       y el límite de baudios (útil para medir la capacidad del host).
+    """
+    def __init__(self, realistic: bool = True, link: str = None, done_reply: bool = True):
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.port      = os.ttyname(self.slave)
+        self.link      = link
+        if link:
+            try:
+                os.unlink(link)
+            except FileNotFoundError:
+                pass
+            os.symlink(self.port, link)
+        self.realistic = realistic
+        self.done_reply = done_reply    # False: firmware antiguo sin {"done":N}
+        self.enc       = {1: 0, 2: 0, 3: 0}     # posición de encoder (cuentas)
+        self.pbd       = False
+        self.recording = False
+        self.rec_axes  = []
+        self.interval  = DEFAULT_INTERVAL_MS / 1000.0
+        self.next_sample = 0.0
+        self.stream_rate = 0.0      # muestras/s forzadas (benchmarks), 0 = off
+        self.hand_motion = True     # durante la grabación, el brazo "se mueve"
+        self.track     = 0.0        # s entre muestras durante un move (track <ms>)
+        self.stalled   = set()      # ejes bloqueados: dan pasos pero el encoder no cambia
+        self.running   = False
+        self._rx       = bytearray()
+        self._t_rec0   = 0.0
+        self._lock     = threading.Lock()
+        self._thread   = None
+        # Ganchos opcionales (benchmarks): f(linea, t_perf)
+        self.on_command = None
+        self.on_sample  = None
+        # Contadores
+        self.commands    = 0
+        self.moves       = 0
+        self.samples     = 0
+        self.rx_overflow = 0
+
+    # ---------- salida ----------
+    def write_line(self, text: str):
+        data = (text + "\r\n").encode()
+        with self._lock:
+            os.write(self.master, data)
+        if self.realistic:
+            time.sleep(len(data) * 10.0 / BAUD)
+
+    def emit_sample(self, axis: int, pos: int = None):
+        if pos is None:
+            pos = int(self.enc[axis])
+        self.samples += 1
+        if self.on_sample:
+            self.on_sample(axis, pos, time.perf_counter())
+        self.write_line(f'{{"axis":{axis},"pos":{pos}}}')
+
+    # ---------- entrada ----------
+    def _read_available(self, timeout: float):
+        r, _, _ = select.select([self.master], [], [], max(0.0, timeout))
+        if not r:
+            return b""
+        try:
+            return os.read(self.master, 4096)
+        except OSError:
+            return b""
+
+    def _block(self, duration: float):
+        """Bucle bloqueado (moveMotor/delay): lo que llegue mientras tanto
+           se queda en el buffer de 64 bytes; el resto se pierde.
+        """
+        if self.realistic and duration > 0:
+            time.sleep(duration)
+        arrived = bytearray()
+        while True:
+            chunk = self._read_available(0)
+            if not chunk:
+                break
+            arrived += chunk
+        room = max(0, RX_BUFFER_BYTES - len(self._rx))
+        if self.realistic and len(arrived) > room:
+            self.rx_overflow += len(arrived) - room
+            arrived = arrived[:room]
+        self._rx += arrived
+
+    # ---------- protocolo ----------
+    def process(self, cmd: str):
+        self.commands += 1
+        if self.on_command:
+            self.on_command(cmd, time.perf_counter())
+
+        if cmd == "pbd start":
+            self.pbd = True
+            return
+        if cmd == "pbd stop":
+            self.pbd = False
+            self.recording = False
+            return
+        if cmd.startswith("move"):
+            parts = cmd.split()
+            if len(parts) != 4:
+                return
+            motor, steps, d = int(parts[1]), int(parts[2]), parts[3]
+            if motor not in self.enc:
+                return
+            self.moves += 1
+            sign = 1 if d == "f" else -1
+            self._move(motor, sign * steps)
+            self._block(MOVE_SETTLE_S)
+            if self.done_reply:
+                self.write_line(f'{{"done":{motor}}}')
+            return
+        if cmd.startswith("track"):
+            arg = cmd[len("track"):].strip()
+            ms = int(arg) if arg.lstrip("-").isdigit() else 0
+            self.track = max(10, ms) / 1000.0 if ms > 0 else 0.0
+            return
+        if cmd.startswith("record start"):
+            if not self.pbd:
+                return
+            args = cmd[len("record start"):].split()
+            if not args:
+                return
+            axes = []
+            for a in args[0].split(","):
+                if a.isdigit() and int(a) in self.enc and int(a) not in axes:
+                    axes.append(int(a))
+            if not axes:
+                return
+            interval_ms = int(args[1]) if len(args) > 1 else DEFAULT_INTERVAL_MS
+            self.rec_axes    = axes[:3]
+            self.interval    = max(10, interval_ms) / 1000.0
+            self.recording   = True
+            self._t_rec0     = time.monotonic()
+            self.next_sample = time.monotonic() + self.interval
+            self.write_line('{"record":"start"}')
+            return
+        if cmd == "record stop":
+            if self.recording and self.pbd:
+                self.recording = False
+                self.write_line('{"record":"stop"}')
+            return
+        # bomba / solenoide / efector / rotarEfector: sin efecto en la simulación
+
+    def _move(self, axis: int, steps: int):
+        """moveMotor: pasos x 1.2 ms; con track, muestras por el camino."""
+        duration = abs(steps) * 2 * STEP_HALF_PERIOD_S
+        start    = self.enc[axis]
+        total    = 0.0 if axis in self.stalled else steps * COUNTS_PER_STEP
+        if not self.track:
+            self._block(duration)
+            self.enc[axis] = start + total
+            return
+        elapsed = 0.0
+        while True:
+            chunk = min(self.track, duration - elapsed)
+            self._block(chunk)
+            elapsed += chunk
+            self.enc[axis] = start + total * (elapsed / duration if duration else 1.0)
+            self.emit_sample(axis)
+            if elapsed >= duration:
+                return
+
+    def _hand_move(self, now: float):
+        """Movimiento sintético de la mano del operador durante la grabación."""
+        t = now - self._t_rec0
+        for i, axis in enumerate(self.rec_axes):
+            self.enc[axis] = 20000.0 * math.sin(0.5 * t + i)
+
+    # ---------- bucle principal (equivalente a loop()) ----------
+    def run(self):
+        self.running = True
+        next_stream = time.monotonic()
+        while self.running:
+            now = time.monotonic()
+            deadlines = []
+            if self.recording and self.pbd:
+                deadlines.append(self.next_sample)
+            if self.stream_rate > 0:
+                deadlines.append(next_stream)
+            timeout = min(deadlines) - now if deadlines else 0.05
+            if b"\n" not in self._rx:
+                self._rx += self._read_available(min(timeout, 0.05))
+
+            nl = self._rx.find(b"\n")
+            if nl >= 0:
+                line = self._rx[:nl].decode(errors="ignore").strip()
+                del self._rx[:nl + 1]
+                if line:
+                    self.process(line)
+
+            now = time.monotonic()
+            if self.recording and self.pbd and now >= self.next_sample:
+                self.next_sample += self.interval
+                if now - self.next_sample >= self.interval:
+                    self.next_sample = now + self.interval
+                if self.hand_motion:
+                    self._hand_move(now)
+                for axis in self.rec_axes:
+                    self.emit_sample(axis)
+            if self.stream_rate > 0 and now >= next_stream:
+                next_stream += 1.0 / self.stream_rate
+                if now - next_stream > 0.1:
+                    next_stream = now
+                self.emit_sample(1 + self.samples % 3)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="arduino-sim", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self._thread:
+            self._thread.join(1.0)
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        if self.link:
+            try:
+                os.unlink(self.link)
+            except OSError:
+                pass
+
+def main():
+    ap = argparse.ArgumentParser(description="Simulador del Arduino de robot_arm.ino")
+    ap.add_argument("--link", default=None,
+                    help="crea un enlace simbólico al pty (p.ej. /tmp/ttyROBOT)")
+    ap.add_argument("--fast", action="store_true",
+                    help="sin retardos de movimiento ni límite de baudios")
+    ap.add_argument("--verbose", action="store_true", help="muestra cada comando")
+    ap.add_argument("--no-done", action="store_true",
+                    help="no responde {\"done\":N} tras un move (firmware antiguo)")
+    ap.add_argument("--stall", type=int, action="append", default=[], metavar="EJE",
+                    help="el encoder de EJE no se mueve con los moves (prueba del stall)")
+    args = ap.parse_args()
+
+    sim = ArduinoSim(realistic=not args.fast, link=args.link, done_reply=not args.no_done)
+    sim.stalled.update(args.stall)
+    if args.verbose:
+        sim.on_command = lambda line, t: print(f"[SIM] <- {line}")
+    print(f"[SIM] Arduino simulado en {sim.port}" + (f" ({args.link})" if args.link else ""))
+    print(f"[SIM] Ejecuta: ROBOT_SERIAL_PORT={args.link or sim.port} python3 main.py")
+    try:
+        sim.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.stop()
+        print(f"[SIM] comandos={sim.commands} moves={sim.moves} "
+              f"muestras={sim.samples} rx_perdidos={sim.rx_overflow}")
+
+if __name__ == "__main__":
+    main()
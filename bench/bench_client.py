@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Coste por comando de una secuencia contra el puerto 6000 (main.py en marcha).
+
+Compara tres formas de enviar N comandos esperando su acuse:
+  connect    un socket nuevo por comando (como debug.py/debug_repl.py antes)
+  persistent client.CommandClient, uno tras otro por la misma conexión
+  pipelined  client.CommandClient.submit_many: todos en una línea y luego
+             los acuses
+
+Uso:
+    python3 bench/bench_client.py [--n 500] [--cmd '{"cmd":"solenoide","state":"on"}']
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from client import CMD_HOST, CMD_PORT, CommandClient     # noqa: E402
+
+def connect_per_command(msg, n):
+    for i in range(n):
+        with socket.create_connection((CMD_HOST, CMD_PORT)) as s:
+            s.sendall((json.dumps({**msg, "id": i}) + "\n").encode())
+            buf = b""
+            while b"\n" not in buf:
+                data = s.recv(4096)
+                if not data:
+                    break
+                buf += data
+
+def persistent(msg, n):
+    with CommandClient() as client:
+        for _ in range(n):
+            client.call(msg)
+
+def pipelined(msg, n):
+    with CommandClient() as client:
+        for fut in client.submit_many([msg] * n):
+            fut.result(10.0)
+
+def main():
+    ap = argparse.ArgumentParser(description="Coste por comando: socket por comando frente a conexión persistente")
+    ap.add_argument("--n", type=int, default=500)
+    ap.add_argument("--cmd", default='{"cmd":"solenoide","state":"on"}')
+    args = ap.parse_args()
+    msg = json.loads(args.cmd)
+    for name, fn in (("connect", connect_per_command), ("persistent", persistent),
+                     ("pipelined", pipelined)):
+        t0 = time.perf_counter()
+        fn(msg, args.n)
+        dt = time.perf_counter() - t0
+        print(f"[BENCH] {name:10s} {args.n} comandos en {dt * 1000:7.1f} ms "
+              f"({dt / args.n * 1e6:7.1f} us/comando)")
+
+if __name__ == "__main__":
+    main()
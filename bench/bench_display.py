@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Coste de render de display.py sin pantalla (driver "dummy" de SDL).
+
+Compara tres bucles durante el mismo tiempo, con las caras reales:
+  legacy  blit de 800x480 + flip cada 50 ms (el bucle anterior a 20 FPS)
+  full    render por eventos, redibujando la pantalla entera en cada cambio
+  dirty   render por eventos, copiando solo las zonas que cambian
+
+Para cada uno informa CPU del proceso (% de un núcleo), fotogramas dibujados
+y tiempo por fotograma. Con --move-every se simula un comando move cada N s;
+sin él, la cara solo parpadea (reposo). Con --pose-rate se mide además el
+modo pose: muestras de encoder senoidales a esa frecuencia y la mirada
+interpolada desde el atlas de ojos. Con --overlay se mide además la línea
+de telemetría, con muestras a OVERLAY_MAX_RATE y un comando cada 0.5 s.
+
+Uso:
+    python3 bench/bench_display.py [--seconds 10] [--move-every 0.5] [--pose-rate 1] [--overlay]
+"""
+
+import argparse
+import math
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)      # las caras se cargan con rutas relativas
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame       # noqa: E402
+import display      # noqa: E402
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    vals = sorted(values)
+    k = min(len(vals) - 1, max(0, int(round(p / 100.0 * (len(vals) - 1)))))
+    return vals[k]
+
+def setup():
+    display.screen = display.init_screen()
+    display.load_neutral()
+    display.load_blink()
+    display.load_motion_faces()
+
+def reset_state():
+    now = time.time()
+    display.current_image   = display.neutral_image
+    display.drawn_image     = None
+    display.blink_next_time = now + display.BLINK_INTERVAL
+    display.blink_end_time  = 0.0
+    display.blink_active    = False
+    display.last_change     = now
+    display.going           = True
+    for k in display.render_stats:
+        display.render_stats[k] = 0
+
+def mover(stop, every):
+    """Simula ecos de move cada `every` s recorriendo las caras."""
+    keys = list(display.face_paths)
+    i = 0
+    while not stop.wait(every):
+        display.show_face(keys[i % len(keys)])
+        i += 1
+
+def feeder(stop, rate):
+    """Simula pbd_sample de los tres ejes a `rate` Hz (barrido senoidal)."""
+    t0 = time.time()
+    while not stop.wait(1.0 / rate):
+        now = time.time()
+        phase = 2 * math.pi * 0.2 * (now - t0)
+        display.pose.add_sample(1, 80.0 * math.sin(phase), now)
+        display.pose.add_sample(2, 50.0 * math.cos(phase), now)
+        display.pose.add_sample(3, 50.0 * math.cos(phase), now)
+        display.wake()
+
+def telemetry_feeder(stop, rate):
+    """Simula muestras y ecos para la línea de telemetría."""
+    t0 = time.time()
+    n = 0
+    while not stop.wait(1.0 / rate):
+        now = time.time()
+        tel = display.overlay.telemetry
+        for axis in (1, 2, 3):
+            tel.sample(axis, 90.0 * math.sin(0.5 * (now - t0) + axis))
+        n += 1
+        if n % max(1, int(rate / 2)) == 0:
+            tel.command({"cmd": "move", "eje": 1, "dir": 1, "pasos": 100}, now)
+        display.wake()
+
+def measure(name, seconds, move_every, loop_fn, pose_rate=0.0, overlay_rate=0.0):
+    reset_state()
+    frame_times = []
+    stop = threading.Event()
+    if move_every:
+        threading.Thread(target=mover, args=(stop, move_every), daemon=True).start()
+    if pose_rate:
+        threading.Thread(target=feeder, args=(stop, pose_rate), daemon=True).start()
+    if overlay_rate:
+        threading.Thread(target=telemetry_feeder, args=(stop, overlay_rate), daemon=True).start()
+    cpu0, t0 = time.process_time(), time.monotonic()
+    loop_fn(seconds, frame_times)
+    cpu, wall = time.process_time() - cpu0, time.monotonic() - t0
+    stop.set()
+    res = {
+        "loop":     name,
+        "cpu_pct":  round(100.0 * cpu / wall, 2),
+        "frames":   len(frame_times),
+        "fps":      round(len(frame_times) / wall, 1),
+        "frame_ms_mean": round(1000 * sum(frame_times) / len(frame_times), 3) if frame_times else 0.0,
+        "frame_ms_p95":  round(1000 * percentile(frame_times, 95), 3),
+    }
+    print(f"[BENCH] {name:7s} CPU {res['cpu_pct']:6.2f} %  fotogramas {res['frames']:4d} "
+          f"({res['fps']:5.1f}/s)  por fotograma: media {res['frame_ms_mean']:.3f} ms "
+          f"p95 {res['frame_ms_p95']:.3f} ms")
+    return res
+
+def legacy_loop(seconds, frame_times):
+    """El bucle anterior: estado + blit completo + flip cada 50 ms."""
+    end = time.monotonic() + seconds
+    screen = display.screen
+    while time.monotonic() < end:
+        pygame.event.get()
+        display.update_face(time.time())
+        t = time.perf_counter()
+        screen.blit(display.current_image, (0, 0))
+        pygame.display.flip()
+        frame_times.append(time.perf_counter() - t)
+        pygame.time.delay(50)
+
+def event_loop(dirty):
+    def loop(seconds, frame_times):
+        display.DIRTY_RECTS = dirty
+        render = display.render
+
+        def timed_render(force=False):
+            t = time.perf_counter()
+            if render(force):
+                frame_times.append(time.perf_counter() - t)
+        display.render = timed_render
+
+        def stopper():
+            time.sleep(seconds)
+            display.going = False
+            display.wake()
+        threading.Thread(target=stopper, daemon=True).start()
+        try:
+            display.run()
+        finally:
+            display.render = render
+    return loop
+
+def main():
+    ap = argparse.ArgumentParser(description="CPU y tiempo por fotograma de display.py")
+    ap.add_argument("--seconds", type=float, default=10.0)
+    ap.add_argument("--move-every", type=float, default=0.0,
+                    help="simula un move cada N s (0 = reposo, solo parpadeo)")
+    ap.add_argument("--pose-rate", type=float, default=0.0,
+                    help="mide también el modo pose con muestras a N Hz (0 = no)")
+    ap.add_argument("--overlay", action="store_true",
+                    help="mide también la línea de telemetría")
+    args = ap.parse_args()
+
+    setup()
+    # Calienta la caché de zonas para no medir su cálculo en el primer cambio
+    faces = [display.neutral_image, display.blink_image, *display.images.values()]
+    for a in faces:
+        for b in faces:
+            if a is not b:
+                display.dirty_rects(a, b)
+    print(f"[BENCH] {args.seconds:.0f} s por bucle, "
+          + (f"move cada {args.move_every} s" if args.move_every else "en reposo"))
+    measure("legacy", args.seconds, args.move_every, legacy_loop)
+    measure("full", args.seconds, args.move_every, event_loop(False))
+    measure("dirty", args.seconds, args.move_every, event_loop(True))
+    if args.overlay:
+        display.init_overlay()
+        measure("overlay", args.seconds, args.move_every, event_loop(True),
+                overlay_rate=display.OVERLAY_MAX_RATE)
+        display.overlay = None
+    if args.pose_rate:
+        t = time.perf_counter()
+        display.FACE_MODE = "pose"
+        display.build_gaze_atlas()
+        print(f"[BENCH] atlas de mirada: {1000 * (time.perf_counter() - t):.0f} ms, "
+              f"{display.gaze_atlas.nbytes / 2**20:.1f} MB")
+        display.drawn_cell = None
+        measure("pose", args.seconds, 0.0, event_loop(True), args.pose_rate)
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Carga de caras de display.py: BMP directos frente a la caché de faces.py.
+
+Cada modo corre en un proceso nuevo (driver "dummy" de SDL) para que la
+memoria residente sea comparable:
+  legacy  pygame.image.load + scale por cada entrada, sin convert()
+          (como antes: arriba/abajo se cargan dos veces)
+  cold    FaceCache con la caché vacía (decodifica, escala y escribe)
+  warm    FaceCache con la caché ya generada
+
+Informa tiempo de carga de todas las caras, RSS tras cargar (y su aumento
+sobre el proceso con pygame y la pantalla ya iniciados) y el tiempo de un
+blit de pantalla completa con esas Surface.
+
+Con --drop-caches (root) se vacía la caché de páginas del kernel antes de
+cada modo, como en un arranque en frío desde la SD: ahí pesa leer 1.1 MB
+por BMP frente a ~30 KB por entrada comprimida.
+
+Uso:
+    python3 bench/bench_faces.py [--blits 200] [--drop-caches]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def child(mode: str, blits: int):
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    import pygame
+    import display
+    from faces import FaceCache, process_rss
+
+    pygame.init()
+    screen = pygame.display.set_mode(display.SCREEN_SIZE)
+    paths = [display.NEUTRAL_PATH, display.BLINK_PATH, *display.face_paths.values()]
+    rss0 = process_rss()
+    t0 = time.perf_counter()
+    if mode == "legacy":
+        surfaces = [pygame.transform.scale(pygame.image.load(p), display.SCREEN_SIZE)
+                    for p in paths]
+        stats = {}
+    else:
+        cache = FaceCache(display.SCREEN_SIZE)
+        surfaces = [cache.convert(p) for p in paths]
+        cache.save_index()
+        stats = cache.stats()
+    load_s = time.perf_counter() - t0
+    rss = process_rss()
+
+    t0 = time.perf_counter()
+    for i in range(blits):
+        screen.blit(surfaces[i % len(surfaces)], (0, 0))
+    blit_s = (time.perf_counter() - t0) / blits
+    print(json.dumps({"mode": mode, "load_ms": round(load_s * 1000, 1),
+                      "rss_mb": round(rss / 2**20, 1), "rss_delta_mb": round((rss - rss0) / 2**20, 1),
+                      "distinct": len({id(s) for s in surfaces}), "blit_ms": round(blit_s * 1000, 3),
+                      **{f"cache_{k}": v for k, v in stats.items()}}))
+
+def drop_caches():
+    os.sync()
+    with open("/proc/sys/vm/drop_caches", "w") as f:
+        f.write("3\n")
+
+def run(mode, env, blits):
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", mode,
+                          "--blits", str(blits)], env=env, capture_output=True, text=True,
+                         check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+def main():
+    ap = argparse.ArgumentParser(description="Carga de caras: BMP frente a caché")
+    ap.add_argument("--blits", type=int, default=200)
+    ap.add_argument("--drop-caches", action="store_true",
+                    help="vacía la caché de páginas antes de cada modo (requiere root)")
+    ap.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        child(args.child, args.blits)
+        return
+
+    env = dict(os.environ)
+    env.setdefault("SDL_VIDEODRIVER", "dummy")
+    env.setdefault("SDL_AUDIODRIVER", "dummy")
+    with tempfile.TemporaryDirectory() as d:
+        env["ROBOT_FACE_CACHE"] = d
+        for mode in ("legacy", "cold", "warm"):
+            if args.drop_caches:
+                drop_caches()
+            r = run(mode, env, args.blits)
+            print(f"[BENCH] {mode:6s} carga {r['load_ms']:7.1f} ms  RSS {r['rss_mb']:6.1f} MB "
+                  f"(+{r['rss_delta_mb']:5.1f} MB)  Surface distintas {r['distinct']}  "
+                  f"blit {r['blit_ms']:.3f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Benchmark de los servidores de main.py (puertos 6000/6001).
+
+Abre N clientes de comandos y N suscriptores de estado a la vez, y mide la
+latencia desde que un comando sale por el puerto 6000 hasta que su eco llega
+a los suscriptores del puerto 6001.
+
+Uso:
+    python3 bench/bench_server.py --clients 50 --rounds 20
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    vals = sorted(values)
+    k = min(len(vals) - 1, max(0, int(round(p / 100.0 * (len(vals) - 1)))))
+    return vals[k]
+
+async def subscriber(host, port, pending, latencies, ready):
+    """Suscriptor del puerto de estado: registra la latencia de cada eco."""
+    reader, writer = await asyncio.open_connection(host, port)
+    ready.release()
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                msg = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if not isinstance(msg, dict):
+                continue
+            t_sent = pending.get(msg.get("bench_seq"))
+            if t_sent is not None:
+                latencies.append(time.perf_counter() - t_sent)
+    except (asyncio.CancelledError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+async def commander(host, port, idx, args, pending):
+    """Cliente de comandos: envía `rounds` comandos marcados con bench_seq."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for r in range(args.rounds):
+            seq = idx * args.rounds + r
+            payload = dict(json.loads(args.cmd))
+            payload["bench_seq"] = seq
+            pending[seq] = time.perf_counter()
+            writer.write((json.dumps(payload) + "\n").encode())
+            await writer.drain()
+            await asyncio.sleep(args.interval)
+    finally:
+        writer.close()
+
+async def run(args):
+    pending   = {}
+    latencies = []
+    ready     = asyncio.Semaphore(0)
+
+    t0 = time.perf_counter()
+    subs = [asyncio.create_task(
+                subscriber(args.host, args.state_port, pending, latencies, ready))
+            for _ in range(args.subscribers)]
+    for _ in subs:
+        await ready.acquire()
+    t_conn = time.perf_counter() - t0
+    print(f"[BENCH] {len(subs)} suscriptores conectados en {t_conn*1000:.1f} ms")
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(commander(args.host, args.cmd_port, i, args, pending)
+                           for i in range(args.clients)))
+    t_send = time.perf_counter() - t0
+
+    # Esperar a que lleguen los ecos pendientes
+    expected = args.clients * args.rounds * args.subscribers
+    deadline = time.perf_counter() + args.timeout
+    while len(latencies) < expected and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    for t in subs:
+        t.cancel()
+    await asyncio.gather(*subs, return_exceptions=True)
+
+    sent = args.clients * args.rounds
+    print(f"[BENCH] clientes de comandos: {args.clients}  suscriptores: {args.subscribers}")
+    print(f"[BENCH] comandos enviados: {sent} en {t_send:.2f} s "
+          f"({sent / t_send if t_send else 0:.0f} cmd/s)")
+    print(f"[BENCH] ecos recibidos: {len(latencies)}/{expected}")
+    if latencies:
+        ms = [x * 1000 for x in latencies]
+        print(f"[BENCH] latencia comando->eco (ms): "
+              f"p50={percentile(ms, 50):.2f} p95={percentile(ms, 95):.2f} "
+              f"p99={percentile(ms, 99):.2f} max={max(ms):.2f}")
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--host", default="localhost")
+    ap.add_argument("--cmd-port", type=int, default=6000)
+    ap.add_argument("--state-port", type=int, default=6001)
+    ap.add_argument("--clients", type=int, default=50,
+                    help="clientes de comandos concurrentes")
+    ap.add_argument("--subscribers", type=int, default=None,
+                    help="suscriptores de estado (por defecto = --clients)")
+    ap.add_argument("--rounds", type=int, default=20,
+                    help="comandos por cliente")
+    ap.add_argument("--interval", type=float, default=0.01,
+                    help="pausa entre comandos de un cliente (s)")
+    ap.add_argument("--cmd", default='{"cmd":"bomba","state":"off"}',
+                    help="comando JSON a enviar (inofensivo por defecto)")
+    ap.add_argument("--timeout", type=float, default=10.0)
+    args = ap.parse_args()
+    if args.subscribers is None:
+        args.subscribers = args.clients
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
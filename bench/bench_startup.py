@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Arranque en frío de main.py y display.py hasta el aviso de "listo".
+
+Lanza cada proceso varias veces con NOTIFY_SOCKET apuntando a un socket
+propio (igual que systemd con Type=notify) y mide desde el fork hasta que
+llega READY=1. main.py corre contra arduino_sim.py y display.py con el
+driver de vídeo "dummy" de SDL si no hay pantalla.
+
+Uso:
+    python3 bench/bench_startup.py [--runs 5] [--only main|display]
+Sale con 1 si la mediana supera el objetivo de algún proceso.
+"""
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from arduino_sim import ArduinoSim   # noqa: E402
+
+# Objetivos por defecto (los mismos COLD_START_TARGET_S de cada script)
+TARGETS = {"main": 2.0, "display": 4.0}
+
+def wait_ready(sock, proc, timeout):
+    """Espera READY=1 en el socket de notificación. Devuelve (t, status)."""
+    deadline = time.monotonic() + timeout
+    status = ""
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"el proceso terminó antes de estar listo (rc={proc.returncode})")
+        sock.settimeout(max(0.01, min(0.2, deadline - time.monotonic())))
+        try:
+            data = sock.recv(4096).decode()
+        except socket.timeout:
+            continue
+        fields = dict(l.split("=", 1) for l in data.splitlines() if "=" in l)
+        status = fields.get("STATUS", status)
+        if fields.get("READY") == "1":
+            return time.monotonic(), status
+    raise RuntimeError("no llegó READY=1 a tiempo")
+
+def run_once(script, env, timeout):
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "notify")
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(path)
+        env = dict(env, NOTIFY_SOCKET=path)
+        t0 = time.monotonic()
+        proc = subprocess.Popen([sys.executable, os.path.join(ROOT, script)], cwd=ROOT, env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            t_ready, status = wait_ready(sock, proc, timeout)
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+            sock.close()
+    return t_ready - t0, status
+
+def bench(name, script, env, runs, timeout):
+    times = []
+    for i in range(runs):
+        dt, status = run_once(script, env, timeout)
+        times.append(dt)
+        print(f"[BENCH] {name} #{i + 1}: {dt * 1000:.0f} ms  ({status})")
+        time.sleep(0.3)     # deja liberar los puertos
+    times.sort()
+    median = times[len(times) // 2]
+    ok = median <= TARGETS[name]
+    print(f"[BENCH] {name}: mediana {median * 1000:.0f} ms, peor {times[-1] * 1000:.0f} ms "
+          f"(objetivo {TARGETS[name] * 1000:.0f} ms) {'OK' if ok else 'FALLA'}")
+    return ok
+
+def main():
+    ap = argparse.ArgumentParser(description="Arranque en frío hasta READY=1")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--only", choices=("main", "display"))
+    ap.add_argument("--timeout", type=float, default=20.0)
+    args = ap.parse_args()
+
+    ok = True
+    if args.only in (None, "main"):
+        sim = ArduinoSim(realistic=True).start()
+        try:
+            env = dict(os.environ, ROBOT_SERIAL_PORT=sim.port)
+            ok &= bench("main", "main.py", env, args.runs, args.timeout)
+        finally:
+            sim.stop()
+    if args.only in (None, "display"):
+        env = dict(os.environ)
+        if not env.get("DISPLAY") and not os.path.exists("/dev/fb0"):
+            env["SDL_VIDEODRIVER"] = "dummy"
+        ok &= bench("display", "display.py", env, args.runs, args.timeout)
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
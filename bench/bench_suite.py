@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Benchmarks extremo a extremo de main.py contra arduino_sim.py (sin hardware).
+
+Arranca el simulador en este proceso y main.py como subproceso apuntando a
+su pty, y mide:
+  - latencia comando -> UART   (puerto 6000 hasta que el simulador lo lee)
+  - latencia muestra -> suscriptor (del simulador a un cliente del 6001)
+  - error de temporización de la reproducción PBD (play_report); sale con 1
+    si tarda más de PLAY_MODEL_TOLERANCE sobre lo previsto por el plan
+  - reparto del firmware entre tres ejes reproducidos a la vez (sin
+    servidor: los planes no pueden pedir más tiempo del que dura la
+    reproducción, y un movimiento que el firmware puede seguir termina
+    en el tiempo grabado; si falla sale con 1)
+  - máxima frecuencia de muestras sostenida por el host
+
+Uso:
+    python3 bench/bench_suite.py
+    python3 bench/bench_suite.py --save base.json
+    python3 bench/bench_suite.py --compare base.json   # sale con 1 si hay regresión
+"""
+
+import argparse
+import json
+import math
+import os
+import queue
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from arduino_sim import ArduinoSim   # noqa: E402
+from motion import MOVE_SETTLE_S, STEP_PERIOD_S   # noqa: E402
+from trajectory import Trajectory, compile_plan, serial_end   # noqa: E402
+
+HOST       = "localhost"
+CMD_PORT   = 6000
+STATE_PORT = 6001
+
+# Métricas donde más es mejor; en el resto, menos es mejor
+HIGHER_IS_BETTER = {"max_sample_rate_hz"}
+# Diferencia absoluta mínima para considerar regresión (ruido de medida)
+ABS_NOISE = {"max_sample_rate_hz": 50.0}
+ABS_NOISE_MS = 0.5
+# Reproducción: real / previsto por el plan (un move a la vez) como máximo 1 + esto
+PLAY_MODEL_TOLERANCE = 0.10
+
+def pct(values, p):
+    vals = sorted(values)
+    if not vals:
+        return float("nan")
+    k = min(len(vals) - 1, max(0, int(round(p / 100.0 * (len(vals) - 1)))))
+    return vals[k]
+
+def summary_ms(values):
+    ms = [v * 1000 for v in values]
+    return {"p50": round(pct(ms, 50), 3), "p95": round(pct(ms, 95), 3),
+            "p99": round(pct(ms, 99), 3), "max": round(max(ms), 3) if ms else float("nan"),
+            "n": len(ms)}
+
+class LineSocket:
+    """Socket TCP con lectura por líneas (bytes)."""
+    def __init__(self, port):
+        self.sock = socket.create_connection((HOST, port))
+        self.buf  = b""
+
+    def send(self, obj):
+        self.sock.sendall((json.dumps(obj) + "\n").encode())
+
+    def readline(self, timeout=5.0):
+        self.sock.settimeout(timeout)
+        while b"\n" not in self.buf:
+            data = self.sock.recv(65536)
+            if not data:
+                raise ConnectionError("conexión cerrada")
+            self.buf += data
+        line, self.buf = self.buf.split(b"\n", 1)
+        return line
+
+    def query(self, obj):
+        self.send(obj)
+        return json.loads(self.readline())
+
+    def close(self):
+        self.sock.close()
+
+# ==================================
+#  Servidor bajo prueba
+# ==================================
+def start_server(sim, log_path):
+    env = dict(os.environ, ROBOT_SERIAL_PORT=sim.port, PYTHONUNBUFFERED="1")
+    log = open(log_path, "w")
+    proc = subprocess.Popen([sys.executable, os.path.join(ROOT, "main.py")],
+                            cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"main.py terminó al arrancar (ver {log_path})")
+        try:
+            socket.create_connection((HOST, CMD_PORT), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("main.py no abrió el puerto 6000 a tiempo")
+
+def stop_server(proc):
+    proc.send_signal(signal.SIGINT)
+    try:
+        proc.wait(5)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+# ==================================
+#  Benchmarks
+# ==================================
+def bench_command_latency(sim, n):
+    arrivals = queue.Queue()
+    sim.on_command = lambda line, t: arrivals.put(t)
+    cmd = LineSocket(CMD_PORT)
+    lat = []
+    try:
+        for i in range(n):
+            t0 = time.perf_counter()
+            cmd.send({"cmd": "rotarEfector", "angle": i % 180})
+            lat.append(arrivals.get(timeout=2.0) - t0)
+    finally:
+        sim.on_command = None
+        cmd.close()
+    return summary_ms(lat)
+
+def bench_sample_latency(sim, n, rate_hz):
+    sent = {}
+    lat  = []
+    sub  = LineSocket(STATE_PORT)
+    sub.send({"cmd": "subscribe", "types": ["samples"], "format": "compact"})
+    sub.readline()      # confirmación "subscribed"
+    sim.on_sample = lambda axis, pos, t: sent.__setitem__(pos, t)
+
+    def receiver():
+        while len(lat) < n:
+            try:
+                msg = json.loads(sub.readline(timeout=2.0))
+            except (OSError, ValueError):
+                return
+            t_sent = sent.get(msg.get("pos_raw"))
+            if t_sent is not None:
+                lat.append(time.perf_counter() - t_sent)
+
+    rx = threading.Thread(target=receiver, daemon=True)
+    rx.start()
+    base = 1_000_000
+    for i in range(n):
+        sim.emit_sample(1, base + i)
+        time.sleep(1.0 / rate_hz)
+    rx.join(3.0)
+    sim.on_sample = None
+    sub.close()
+    return summary_ms(lat)
+
+def bench_playback(sim, rec_seconds, rate_hz):
+    cmd = LineSocket(CMD_PORT)
+    sub = LineSocket(STATE_PORT)
+    sub.send({"cmd": "subscribe", "types": ["events"]})
+    sub.readline()
+    moves = []
+    sim.on_command = lambda line, t: moves.append(t) if line.startswith("move") else None
+
+    cmd.send({"cmd": "pbd", "action": "enter"})
+    cmd.send({"cmd": "pbd", "action": "recstart", "axes": [1, 2, 3], "rate_hz": rate_hz})
+    time.sleep(rec_seconds)
+    cmd.send({"cmd": "pbd", "action": "recstop"})
+    time.sleep(0.3)
+    overflow0 = sim.rx_overflow
+    cmd.send({"cmd": "pbd", "action": "play_all"})
+    report = None
+    deadline = time.time() + rec_seconds * 10 + 10
+    while time.time() < deadline:
+        msg = json.loads(sub.readline(timeout=deadline - time.time()))
+        if msg.get("type") == "play_report":
+            report = msg
+            break
+    # Los moves que el Arduino aún no ha ejecutado siguen en la cola de movimientos
+    t_report = time.time()
+    while time.time() < deadline:
+        st = cmd.query({"cmd": "motion"})
+        if st["active"] is None and not any(a["queued"] for a in st["axes"].values()):
+            break
+        time.sleep(0.05)
+    drain_s = time.time() - t_report
+    time.sleep(0.5)
+    sim.on_command = None
+    cmd.send({"cmd": "pbd", "action": "exit"})
+    cmd.close()
+    sub.close()
+    if report is None:
+        raise RuntimeError("no llegó play_report")
+    report["sim_moves"]       = len(moves)
+    report["sim_span_s"]      = round(moves[-1] - moves[0], 3) if len(moves) > 1 else 0.0
+    report["sim_rx_overflow"] = sim.rx_overflow - overflow0
+    report["motion_drain_s"]  = round(drain_s, 3)
+    return report
+
+def check_plan_share(seconds=3.0, rec_hz=10.0, rate_hz=None, axes=3, amplitude=20000.0):
+    """Compila tres ejes con la mano sintética de arduino_sim (grabación de
+       `seconds`) para reproducirlos juntos y suma el tiempo de firmware que
+       piden sus moves, sin el tramo final que recupera lo aplazado. Como
+       el firmware ejecuta un move a la vez, esa suma no puede pasar de la
+       duración (más el arrastre de una pausa por eje). Si todos los moves
+       caben en la duración (`feasible`), además, la reproducción tiene que
+       terminar en el tiempo grabado (más PLAY_MODEL_TOLERANCE y la pausa
+       del último move de cada eje).
+    """
+    demand = 0.0
+    moves  = []
+    for i in range(axes):
+        traj = Trajectory()
+        for k in range(int(seconds * rec_hz) + 1):
+            t = k / rec_hz
+            traj.append(t, int(amplitude * math.sin(0.5 * t + i)))
+        plan = compile_plan(traj, 65536.0 / 3200.0, tolerance=41.0, min_steps=4,
+                            rate_hz=rate_hz, max_step_rate=1.0 / STEP_PERIOD_S,
+                            settle_s=MOVE_SETTLE_S, axes=axes)
+        demand += sum(MOVE_SETTLE_S + abs(n) * STEP_PERIOD_S
+                      for t_move, n in plan.moves if t_move < seconds)
+        moves.extend(plan.moves)
+    end = serial_end(sorted(moves), 1.0 / STEP_PERIOD_S, MOVE_SETTLE_S)
+    total = sum(MOVE_SETTLE_S + abs(n) * STEP_PERIOD_S for _, n in moves)
+    feasible = total <= seconds
+    ok = demand <= seconds + axes * MOVE_SETTLE_S
+    if feasible:
+        ok = ok and end <= seconds * (1 + PLAY_MODEL_TOLERANCE) + axes * MOVE_SETTLE_S
+    return {"rate_hz": rate_hz, "amplitude": amplitude, "demand_s": round(demand, 3),
+            "end_s": round(end, 3), "span_s": seconds, "feasible": feasible, "ok": ok}
+
+def bench_max_rate(sim, rates, seconds):
+    cmd = LineSocket(CMD_PORT)
+    realistic, sim.realistic = sim.realistic, False
+    results = []
+    best = 0.0
+    try:
+        for rate in rates:
+            before   = cmd.query({"cmd": "ingest"})["samples"]
+            emitted0 = sim.samples
+            t0 = time.perf_counter()
+            sim.stream_rate = rate
+            time.sleep(seconds)
+            sim.stream_rate = 0
+            dt = time.perf_counter() - t0
+            time.sleep(0.5)
+            emitted  = sim.samples - emitted0
+            received = cmd.query({"cmd": "ingest"})["samples"] - before
+            ratio    = received / emitted if emitted else 0.0
+            achieved = emitted / dt
+            ok = ratio >= 0.99 and achieved >= 0.95 * rate
+            results.append({"rate_hz": rate, "emitted": emitted, "received": received,
+                            "achieved_hz": round(achieved, 1), "ok": ok})
+            if not ok:
+                break
+            best = rate
+    finally:
+        sim.realistic = realistic
+        cmd.close()
+    return best, results
+
+# ==================================
+#  Comparación con una línea base
+# ==================================
+def flatten(res):
+    return {
+        "cmd_latency_p50_ms":    res["command_latency"]["p50"],
+        "cmd_latency_p99_ms":    res["command_latency"]["p99"],
+        "sample_latency_p50_ms": res["sample_latency"]["p50"],
+        "sample_latency_p99_ms": res["sample_latency"]["p99"],
+        "play_jitter_ms":        res["playback"]["jitter_ms"],
+        "play_max_late_ms":      res["playback"]["max_late_ms"],
+        "max_sample_rate_hz":    res["max_sample_rate_hz"],
+    }
+
+def compare(current, baseline, tolerance):
+    regressions = []
+    for key, cur in current.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        if key in HIGHER_IS_BETTER:
+            worse = base - cur
+        else:
+            worse = cur - base
+        noise = ABS_NOISE.get(key, ABS_NOISE_MS)
+        if worse > noise and worse > tolerance * abs(base):
+            regressions.append((key, base, cur))
+    return regressions
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmarks de main.py contra arduino_sim.py")
+    ap.add_argument("--commands", type=int, default=200)
+    ap.add_argument("--samples", type=int, default=200)
+    ap.add_argument("--sample-rate", type=float, default=50.0)
+    ap.add_argument("--rec-seconds", type=float, default=3.0)
+    ap.add_argument("--rec-rate", type=float, default=20.0)
+    ap.add_argument("--rates", default="200,500,1000,2000,5000,10000",
+                    help="frecuencias a probar para la máxima sostenida")
+    ap.add_argument("--rate-seconds", type=float, default=2.0)
+    ap.add_argument("--log", default="/tmp/bench_main.log", help="salida de main.py")
+    ap.add_argument("--save", help="guarda los resultados en JSON")
+    ap.add_argument("--compare", help="JSON de línea base para detectar regresiones")
+    ap.add_argument("--tolerance", type=float, default=0.25,
+                    help="empeoramiento relativo permitido frente a la base")
+    args = ap.parse_args()
+
+    shares = [check_plan_share(rate_hz=r, amplitude=a)
+              for a in (20000.0, 2000.0) for r in (None, 5.0, 10.0)]
+    for sh in shares:
+        print(f"[BENCH] 3 ejes a la vez{' @%gHz' % sh['rate_hz'] if sh['rate_hz'] else ''} "
+              f"amplitud {sh['amplitude']:g}: firmware pedido {sh['demand_s']}s en {sh['span_s']}s, "
+              f"fin {sh['end_s']}s{'' if sh['feasible'] else ' (no cabe)'} "
+              f"{'OK' if sh['ok'] else 'FALLA'}")
+    if not all(sh["ok"] for sh in shares):
+        sys.exit(1)
+
+    sim  = ArduinoSim(realistic=True).start()
+    proc = start_server(sim, args.log)
+    results = {}
+    play_ok = True
+    try:
+        results["command_latency"] = bench_command_latency(sim, args.commands)
+        print(f"[BENCH] comando->UART (ms): {results['command_latency']}")
+        results["sample_latency"] = bench_sample_latency(sim, args.samples, args.sample_rate)
+        print(f"[BENCH] muestra->suscriptor (ms): {results['sample_latency']}")
+        results["playback"] = bench_playback(sim, args.rec_seconds, args.rec_rate)
+        pb = results["playback"]
+        play_ok = pb["elapsed_s"] <= pb["expected_s"] * (1 + PLAY_MODEL_TOLERANCE)
+        print(f"[BENCH] reproducción: plan={pb['planned_s']}s previsto={pb['expected_s']}s "
+              f"real={pb['elapsed_s']}s {'OK' if play_ok else 'FALLA'} "
+              f"jitter={pb['jitter_ms']}ms max={pb['max_late_ms']}ms deriva={pb['drift_ms']}ms "
+              f"moves_sim={pb['sim_moves']} rx_perdidos={pb['sim_rx_overflow']} "
+              f"drenaje={pb.get('drain_s')}s cola_tras_fin={pb['motion_drain_s']}s")
+        rates = [float(r) for r in args.rates.split(",") if r]
+        best, steps = bench_max_rate(sim, rates, args.rate_seconds)
+        results["max_sample_rate_hz"] = best
+        results["rate_steps"] = steps
+        for s in steps:
+            print(f"[BENCH] {s['rate_hz']:>7.0f} Hz: emitidas={s['emitted']} "
+                  f"recibidas={s['received']} ({s['achieved_hz']} Hz) {'OK' if s['ok'] else 'FALLA'}")
+        print(f"[BENCH] máxima frecuencia sostenida: {best:.0f} muestras/s")
+    finally:
+        stop_server(proc)
+        sim.stop()
+
+    flat = flatten(results)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"metrics": flat, "detail": results}, f, indent=2)
+        print(f"[BENCH] Resultados guardados en {args.save}")
+    if not play_ok:
+        print(f"[BENCH] La reproducción tardó más de un {PLAY_MODEL_TOLERANCE:.0%} sobre lo previsto")
+        sys.exit(1)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["metrics"]
+        regressions = compare(flat, baseline, args.tolerance)
+        for key, base, cur in regressions:
+            print(f"[REGRESIÓN] {key}: base={base} actual={cur}")
+        if regressions:
+            sys.exit(1)
+        print("[BENCH] Sin regresiones frente a la línea base.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Fases de arranque medidas y aviso de "listo" para el supervisor.
+
+Cada proceso declara sus fases de inicialización; las independientes se
+lanzan en paralelo y al final se imprime cuánto tardó cada una:
+
+    boot = Boot("main", target_s=1.0)
+    with boot.phase("uart"):
+        ...
+    boot.parallel(library=scan_library, gpio=setup_gpio)
+    boot.ready()
+
+`ready()` avisa a systemd (Type=notify) por NOTIFY_SOCKET con READY=1 y,
+si existe ROBOT_READY_DIR, crea <dir>/<nombre>.ready para otros
+supervisores. El tiempo de arranque se mide desde que el kernel creó el
+proceso (/proc/self/stat), así incluye el intérprete y los imports.
+"""
+
+import os
+import socket
+import threading
+import time
+
+_T_IMPORT = time.monotonic()
+
+def process_age() -> float:
+    """Segundos desde que arrancó el proceso (incluye el intérprete)."""
+    try:
+        with open("/proc/self/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        start_ticks = int(fields[19])       # campo 22: starttime
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return time.monotonic() - _T_IMPORT
+
+def sd_notify(state: str) -> bool:
+    """Envía `state` a systemd si el proceso corre con NOTIFY_SOCKET."""
+    addr = os.environ.get("NOTIFY_SOCKET")
+    if not addr:
+        return False
+    if addr.startswith("@"):
+        addr = "\0" + addr[1:]      # socket abstracto
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as s:
+            s.connect(addr)
+            s.sendall(state.encode())
+        return True
+    except OSError:
+        return False
+
+class Boot:
+    def __init__(self, name: str, target_s: float):
+        self.name     = name
+        self.target_s = target_s
+        self.t0       = time.monotonic()
+        self.t_before = process_age()       # intérprete + imports hasta aquí
+        self.phases   = {}                  # nombre -> segundos
+        self.t_ready  = None
+        self._lock    = threading.Lock()
+
+    def _record(self, name: str, dt: float):
+        with self._lock:
+            self.phases[name] = dt
+
+    def phase(self, name: str):
+        return _Phase(self, name)
+
+    def parallel(self, **fns):
+        """Ejecuta las fases dadas en hilos y espera a todas. Devuelve
+           {nombre: resultado}; relanza la primera excepción.
+        """
+        results, errors = {}, []
+
+        def run(name, fn):
+            try:
+                with self.phase(name):
+                    results[name] = fn()
+            except BaseException as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=item, name=f"boot-{item[0]}")
+                   for item in fns.items()]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if errors:
+            raise errors[0]
+        return results
+
+    def elapsed(self) -> float:
+        """Arranque total: edad del proceso al crear Boot + lo transcurrido."""
+        return self.t_before + (time.monotonic() - self.t0)
+
+    def ready(self, log=None) -> float:
+        """Marca el proceso como listo. `log(texto)` recibe el resumen; por
+           defecto se imprime con el prefijo [BOOT].
+        """
+        self.t_ready = self.elapsed()
+        parts = " ".join(f"{n}={dt * 1000:.0f}ms" for n, dt in self.phases.items())
+        verdict = "OK" if self.t_ready <= self.target_s else "SUPERA EL OBJETIVO"
+        text = (f"{self.name} listo en {self.t_ready * 1000:.0f} ms "
+                f"(objetivo {self.target_s * 1000:.0f} ms, {verdict}); "
+                f"intérprete+imports={self.t_before * 1000:.0f}ms {parts}")
+        if log is None:
+            print(f"[BOOT] {text}")
+        else:
+            log(text)
+        sd_notify(f"READY=1\nSTATUS={self.name} listo en {self.t_ready * 1000:.0f} ms")
+        ready_dir = os.environ.get("ROBOT_READY_DIR")
+        if ready_dir:
+            try:
+                os.makedirs(ready_dir, exist_ok=True)
+                with open(os.path.join(ready_dir, f"{self.name}.ready"), "w") as f:
+                    f.write(f"{os.getpid()} {self.t_ready:.3f}\n")
+            except OSError:
+                pass
+        return self.t_ready
+
+    def report(self) -> dict:
+        return {
+            "name":        self.name,
+            "ready":       self.t_ready is not None,
+            "ready_ms":    round(self.t_ready * 1000, 1) if self.t_ready is not None else None,
+            "target_ms":   round(self.target_s * 1000, 1),
+            "imports_ms":  round(self.t_before * 1000, 1),
+            "phases_ms":   {n: round(dt * 1000, 1) for n, dt in self.phases.items()},
+        }
+
+    def clear_ready(self):
+        """Retira el aviso de listo al salir."""
+        sd_notify("STOPPING=1")
+        ready_dir = os.environ.get("ROBOT_READY_DIR")
+        if ready_dir:
+            try:
+                os.unlink(os.path.join(ready_dir, f"{self.name}.ready"))
+            except OSError:
+                pass
+
+class _Phase:
+    __slots__ = ("boot", "name", "t")
+
+    def __init__(self, boot, name):
+        self.boot = boot
+        self.name = name
+
+    def __enter__(self):
+        self.t = time.monotonic()
+        return self
+
+    def __exit__(self, *exc):
+        self.boot._record(self.name, time.monotonic() - self.t)
+        return False
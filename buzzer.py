@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Buzzer con un solo hilo y cola de patrones (lo usa display.py).
+
+Antes cada eco de move arrancaba un hilo que tocaba el pin durante 800 ms;
+en una reproducción PBD o una ráfaga de jogs se apilaban decenas de hilos
+peleando por el mismo GPIO y los pitidos se mezclaban. Aquí hay un único
+hilo que toca patrones de uno en uno:
+
+  - una petición de un tipo que ya suena (o ya está en cola) se fusiona con
+    ella: una ráfaga de moves suena como un patrón, no como cincuenta;
+  - entre dos patrones hay al menos BUZZER_GAP_S de silencio, y el tipo que
+    acaba de sonar se sigue fusionando durante ese hueco;
+  - la cola guarda como mucho BUZZER_MAX_PENDING patrones; lo que no cabe se
+    descarta (y se cuenta).
+
+Un patrón es una tupla de tramos (encendido_s, apagado_s).
+"""
+
+import threading
+import time
+from collections import deque
+
+# Patrones por tipo de evento
+PATTERNS = {
+    "move":  ((0.2, 0.2), (0.2, 0.2)),      # dos pitidos de 200 ms (el histórico)
+    "tool":  ((0.08, 0.0),),                # bomba/solenoide/efector: un toque corto
+    "pbd":   ((0.5, 0.0),),                 # grabar/reproducir PBD: uno largo
+}
+BUZZER_GAP_S       = 0.15   # silencio mínimo entre dos patrones
+BUZZER_MAX_PENDING = 4      # patrones en cola además del que suena
+
+class Buzzer:
+    """`output(on)` enciende/apaga el buzzer (None = sin hardware: se
+       cuenta igual, útil fuera de la BeagleBone). `request()` se puede
+       llamar desde cualquier hilo y nunca bloquea.
+    """
+    def __init__(self, output=None, patterns=None, gap=BUZZER_GAP_S,
+                 max_pending=BUZZER_MAX_PENDING):
+        self.output      = output
+        self.patterns    = dict(PATTERNS if patterns is None else patterns)
+        self.gap         = gap
+        self.max_pending = max_pending
+        self.pending     = deque()
+        self.current     = None       # tipo que suena (o en su hueco posterior)
+        self.cond        = threading.Condition()
+        self.closed      = False
+        self.thread      = None
+        # Contadores
+        self.requested = 0
+        self.played    = 0
+        self.merged    = 0
+        self.dropped   = 0
+
+    def request(self, kind: str) -> bool:
+        """Pide el patrón `kind`. Devuelve False si se fusionó, se descartó
+           o el tipo no existe.
+        """
+        if kind not in self.patterns:
+            return False
+        with self.cond:
+            if self.closed:
+                return False
+            self.requested += 1
+            if kind == self.current or kind in self.pending:
+                self.merged += 1
+                return False
+            if len(self.pending) >= self.max_pending:
+                self.dropped += 1
+                return False
+            self.pending.append(kind)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="buzzer", daemon=True)
+                self.thread.start()
+            self.cond.notify()
+        return True
+
+    def _set(self, on: bool):
+        if self.output is not None:
+            self.output(on)
+
+    def _sleep(self, seconds: float) -> bool:
+        """Espera `seconds` salvo que se cierre el buzzer (devuelve False)."""
+        end = time.monotonic() + seconds
+        with self.cond:
+            while not self.closed:
+                left = end - time.monotonic()
+                if left <= 0:
+                    return True
+                self.cond.wait(left)
+        return False
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.pending and not self.closed:
+                    self.current = None
+                    self.cond.wait()
+                if self.closed:
+                    break
+                kind = self.current = self.pending.popleft()
+                self.played += 1
+            ok = True
+            for on_s, off_s in self.patterns[kind]:
+                self._set(True)
+                ok = self._sleep(on_s)
+                self._set(False)
+                if not ok or not self._sleep(off_s):
+                    ok = False
+                    break
+            if not ok or not self._sleep(self.gap):
+                break
+        self._set(False)
+
+    def close(self, timeout: float = 1.0):
+        """Corta el patrón en curso y deja el buzzer apagado."""
+        with self.cond:
+            self.closed = True
+            self.pending.clear()
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout)
+        self._set(False)
+
+    def stats(self) -> dict:
+        with self.cond:
+            return {"requested": self.requested, "played": self.played,
+                    "merged": self.merged, "dropped": self.dropped,
+                    "pending": len(self.pending)}
@@ -0,0 +1,543 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Cliente de los puertos 6000 (comandos) y 6001 (estado) de main.py.
+
+Lo usan debug.py, debug_repl.py y display.py en lugar de abrir un socket por
+comando y repetir cada uno su lectura por líneas.
+
+Comandos (`CommandClient`, `AsyncCommandClient`): una sola conexión que se
+mantiene abierta (y se reabre si se cae). Cada petición lleva un "id" y su
+acuse se empareja por id, así se pueden enviar muchas sin esperar a las
+anteriores; el servidor las ejecuta en orden.
+
+    client = CommandClient()
+    client.call({"cmd": "stats"})                        # respuesta o acuse
+    client.call({"cmd": "move", ...}, wait_done=True)    # hasta que termina
+    futs = client.submit_many([...])                     # una línea, N acuses
+
+Estado (`StateClient`, `AsyncStateClient`): iterador de mensajes (dict) que
+reenvía la suscripción y vuelve a conectar con espera exponencial cuando
+main.py se reinicia. `StateFramer` separa los mensajes sobre un bytearray
+(sin decodificar ni concatenar str) y entiende también el formato binario.
+"""
+
+import asyncio
+import itertools
+import json
+import socket
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from statebus import FRAME_HEADER, FRAME_TYPE_JSON, FRAME_TYPE_SAMPLE, SAMPLE_PAYLOAD
+
+CMD_HOST   = "localhost"
+CMD_PORT   = 6000
+STATE_PORT = 6001
+
+CONNECT_TIMEOUT_S = 2.0
+CALL_TIMEOUT_S    = 5.0     # espera por defecto de call()
+RECONNECT_MIN_S   = 0.25    # primera espera tras perder el 6001
+RECONNECT_MAX_S   = 5.0     # techo de la espera exponencial
+READ_CHUNK        = 65536
+
+_OPEN_BRACE = ord("{")
+_NEWLINE    = ord("\n")
+
+class CommandFailed(RuntimeError):
+    """El servidor rechazó el comando (acuse o fin con status "error").
+       `reply` es la respuesta de datos si la hubo (p.ej. pbd_library con
+       ok=false); si no, el propio acuse.
+    """
+    def __init__(self, ack: dict, reply: dict = None):
+        super().__init__(ack.get("error") or ack.get("status") or "error")
+        self.ack   = ack
+        self.reply = ack if reply is None else reply
+
+# ===== Framing =====
+class StateFramer:
+    """Separa mensajes del 6001. Cada mensaje es una línea JSON o una trama
+       binaria [tipo u8][largo u16][payload]; se distinguen por el primer
+       byte ("{" frente a 1/2), así el cambio de formato a mitad de conexión
+       (al suscribirse) no rompe el flujo.
+    """
+    def __init__(self):
+        self.buf = bytearray()
+
+    def feed(self, data: bytes) -> list:
+        buf = self.buf
+        buf += data
+        out = []
+        pos, end = 0, len(buf)
+        while pos < end:
+            first = buf[pos]
+            if first == _NEWLINE:
+                pos += 1
+            elif first == _OPEN_BRACE:
+                nl = buf.find(b"\n", pos)
+                if nl < 0:
+                    break
+                try:
+                    msg = json.loads(buf[pos:nl])
+                except ValueError:
+                    msg = None
+                if isinstance(msg, dict):
+                    out.append(msg)
+                pos = nl + 1
+            else:
+                if end - pos < FRAME_HEADER.size:
+                    break
+                ftype, n = FRAME_HEADER.unpack_from(buf, pos)
+                body = pos + FRAME_HEADER.size
+                if end - body < n:
+                    break
+                if ftype == FRAME_TYPE_SAMPLE:
+                    axis, ts, raw = SAMPLE_PAYLOAD.unpack_from(buf, body)
+                    out.append({"type": "pbd_sample", "ts": ts, "axis": axis, "pos_raw": raw})
+                elif ftype == FRAME_TYPE_JSON:
+                    try:
+                        msg = json.loads(buf[body:body + n])
+                    except ValueError:
+                        msg = None
+                    if isinstance(msg, dict):
+                        out.append(msg)
+                pos = body + n
+        del buf[:pos]
+        return out
+
+def encode(obj) -> bytes:
+    return (json.dumps(obj) + "\n").encode()
+
+def _subscribe_line(subscribe) -> bytes:
+    return encode({"cmd": "subscribe", **subscribe}) if subscribe else b""
+
+# ===== Acuses =====
+class _Call:
+    """Seguimiento de una petición con id hasta su acuse (o su "done")."""
+    __slots__ = ("wait_done", "reply")
+
+    def __init__(self, wait_done: bool):
+        self.wait_done = wait_done
+        self.reply     = None       # respuesta de datos (consultas), llega antes del acuse
+
+    def feed(self, msg: dict):
+        """Devuelve None mientras no termina; si no, (resultado, excepción)."""
+        kind = msg.get("type")
+        if kind not in ("ack", "done"):
+            self.reply = msg
+            return None
+        if msg.get("status") != "ok":
+            return None, CommandFailed(msg, self.reply)
+        if kind == "ack" and msg.get("pending") and self.wait_done:
+            return None
+        return (self.reply if self.reply is not None else msg), None
+
+class _CallTable:
+    """id -> (llamada, futuro, conexión), común a los clientes síncrono y
+       asyncio. Al caerse una conexión solo fallan sus propias llamadas, no
+       las ya enviadas por la conexión nueva.
+    """
+    def __init__(self):
+        self.ids   = itertools.count(1)
+        self.calls = {}
+        self.lock  = threading.Lock()
+
+    def add(self, futs, wait_done: bool, conn):
+        with self.lock:
+            for fut in futs:
+                self.calls[fut.call_id] = (_Call(wait_done), fut, conn)
+
+    def discard(self, call_id):
+        with self.lock:
+            self.calls.pop(call_id, None)
+
+    def dispatch(self, msg: dict):
+        """Entrega `msg` a su llamada. Devuelve (futuro, resultado, excepción)
+           si la llamada terminó, o None.
+        """
+        call_id = msg.get("id")
+        with self.lock:
+            entry = self.calls.get(call_id)
+            if entry is None:
+                return None
+            res = entry[0].feed(msg)
+            if res is None:
+                return None
+            del self.calls[call_id]
+        return (entry[1], *res)
+
+    def drop_conn(self, conn) -> list:
+        """Quita y devuelve los futuros pendientes de la conexión `conn`."""
+        with self.lock:
+            ids = [i for i, entry in self.calls.items() if entry[2] is conn]
+            return [self.calls.pop(i)[1] for i in ids]
+
+def _prepare(table, msgs, make_future):
+    """Futuros con id y la línea a enviar (objeto o array JSON)."""
+    futs, items = [], []
+    for msg in msgs:
+        fut = make_future()
+        fut.call_id = next(table.ids)
+        futs.append(fut)
+        items.append({**msg, "id": fut.call_id})
+    return futs, encode(items[0] if len(items) == 1 else items)
+
+def _settle(fut, result, exc):
+    if fut.done():
+        return
+    if exc is not None:
+        fut.set_exception(exc)
+    else:
+        fut.set_result(result)
+
+# ===== Comandos (bloqueante) =====
+class CommandClient:
+    """Conexión persistente al puerto 6000. Seguro entre hilos."""
+
+    def __init__(self, host: str = CMD_HOST, port: int = CMD_PORT,
+                 timeout: float = CONNECT_TIMEOUT_S):
+        self.host    = host
+        self.port    = port
+        self.timeout = timeout
+        self.sock    = None
+        self.lock    = threading.Lock()     # escritura y (re)conexión
+        self.table   = _CallTable()
+        self.connects = 0
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.settimeout(None)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock = sock
+        self.connects += 1
+        threading.Thread(target=self._reader, args=(sock,), name="cmd-client",
+                         daemon=True).start()
+
+    def _reader(self, sock):
+        framer = StateFramer()
+        try:
+            while True:
+                data = sock.recv(READ_CHUNK)
+                if not data:
+                    break
+                for msg in framer.feed(data):
+                    done = self.table.dispatch(msg)
+                    if done is not None:
+                        _settle(*done)
+        except OSError:
+            pass
+        with self.lock:
+            if self.sock is sock:
+                self.sock = None
+        sock.close()
+        exc = ConnectionError("conexión de comandos cerrada")
+        for fut in self.table.drop_conn(sock):
+            _settle(fut, None, exc)
+
+    def _write(self, data: bytes, futs=(), wait_done: bool = False):
+        """Envía `data` (registrando antes `futs` en la conexión usada); si
+           la conexión se había caído, reconecta y reintenta una vez.
+        """
+        with self.lock:
+            for attempt in range(2):
+                if self.sock is None:
+                    self._connect()
+                sock = self.sock
+                self.table.add(futs, wait_done, sock)
+                try:
+                    sock.sendall(data)
+                    return
+                except OSError:
+                    for fut in futs:
+                        self.table.discard(fut.call_id)
+                    if self.sock is sock:
+                        self.sock = None
+                    sock.close()
+                    if attempt:
+                        raise
+
+    def send(self, msg: dict):
+        """Envía sin id ni espera (como los clientes antiguos)."""
+        self._write(encode(msg))
+
+    def submit(self, msg: dict, wait_done: bool = False) -> Future:
+        """Envía con id. El futuro se resuelve con la respuesta de datos (si
+           la hay) o con el acuse; con `wait_done`, con el "done" de los
+           comandos diferidos. Un rechazo se entrega como CommandFailed.
+        """
+        return self.submit_many([msg], wait_done)[0]
+
+    def submit_many(self, msgs, wait_done: bool = False) -> list:
+        """Varias peticiones en una sola línea (array JSON), en orden."""
+        futs, data = _prepare(self.table, msgs, Future)
+        try:
+            self._write(data, futs, wait_done)
+        except OSError as e:
+            for fut in futs:
+                _settle(fut, None, e)
+        return futs
+
+    def call(self, msg: dict, wait_done: bool = False, timeout: float = CALL_TIMEOUT_S):
+        """submit() y espera. Lanza CommandFailed u OSError (sin conexión,
+           conexión caída o TimeoutError si no llega el acuse a tiempo).
+        """
+        fut = self.submit(msg, wait_done)
+        try:
+            return fut.result(timeout)
+        except FutureTimeout:
+            raise TimeoutError(f"sin respuesta en {timeout} s") from None
+        finally:
+            self.table.discard(fut.call_id)
+
+    def close(self):
+        with self.lock:
+            sock, self.sock = self.sock, None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# ===== Comandos (asyncio) =====
+class AsyncCommandClient:
+    """Como CommandClient, dentro de un bucle asyncio."""
+
+    def __init__(self, host: str = CMD_HOST, port: int = CMD_PORT,
+                 timeout: float = CONNECT_TIMEOUT_S):
+        self.host    = host
+        self.port    = port
+        self.timeout = timeout
+        self.writer  = None
+        self.task    = None
+        self.lock    = None         # asyncio.Lock, creado dentro del bucle
+        self.table   = _CallTable()
+        self.connects = 0
+
+    async def _connect(self):
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout)
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.writer = writer
+        self.connects += 1
+        self.task = asyncio.create_task(self._reader(reader, writer))
+
+    async def _reader(self, reader, writer):
+        framer = StateFramer()
+        try:
+            while True:
+                data = await reader.read(READ_CHUNK)
+                if not data:
+                    break
+                for msg in framer.feed(data):
+                    done = self.table.dispatch(msg)
+                    if done is not None:
+                        _settle(*done)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            if self.writer is writer:
+                self.writer = None
+            writer.close()
+            exc = ConnectionError("conexión de comandos cerrada")
+            for fut in self.table.drop_conn(writer):
+                _settle(fut, None, exc)
+
+    async def _write(self, data: bytes, futs=(), wait_done: bool = False):
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            for attempt in range(2):
+                if self.writer is None or self.writer.is_closing():
+                    await self._connect()
+                writer = self.writer
+                self.table.add(futs, wait_done, writer)
+                try:
+                    writer.write(data)
+                    await writer.drain()
+                    return
+                except ConnectionError:
+                    for fut in futs:
+                        self.table.discard(fut.call_id)
+                    if self.writer is writer:
+                        self.writer = None
+                    writer.close()
+                    if attempt:
+                        raise
+
+    async def send(self, msg: dict):
+        await self._write(encode(msg))
+
+    async def submit(self, msg: dict, wait_done: bool = False):
+        return (await self.submit_many([msg], wait_done))[0]
+
+    async def submit_many(self, msgs, wait_done: bool = False) -> list:
+        futs, data = _prepare(self.table, msgs, asyncio.get_running_loop().create_future)
+        try:
+            await self._write(data, futs, wait_done)
+        except (OSError, asyncio.TimeoutError) as e:
+            for fut in futs:
+                _settle(fut, None, e)
+        return futs
+
+    async def call(self, msg: dict, wait_done: bool = False, timeout: float = CALL_TIMEOUT_S):
+        fut = await self.submit(msg, wait_done)
+        try:
+            return await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"sin respuesta en {timeout} s") from None
+        finally:
+            self.table.discard(fut.call_id)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+# ===== Estado =====
+class _Backoff:
+    def __init__(self, lo: float, hi: float):
+        self.lo, self.hi = lo, hi
+        self.delay = lo
+
+    def next(self) -> float:
+        delay = self.delay
+        self.delay = min(self.hi, self.delay * 2)
+        return delay
+
+    def reset(self):
+        self.delay = self.lo
+
+class StateClient:
+    """Suscripción al puerto 6001 con reconexión. `messages()` entrega dicts
+       hasta close(); `on_connect()` se llama tras cada conexión.
+    """
+    def __init__(self, host: str = CMD_HOST, port: int = STATE_PORT, subscribe: dict = None,
+                 on_connect=None, retry_min: float = RECONNECT_MIN_S,
+                 retry_max: float = RECONNECT_MAX_S):
+        self.host       = host
+        self.port       = port
+        self.subscribe  = subscribe
+        self.on_connect = on_connect
+        self.backoff    = _Backoff(retry_min, retry_max)
+        self.stop       = threading.Event()
+        self.sock       = None
+        self.connects   = 0
+        self.received   = 0
+
+    def _open(self):
+        """Conecta (esperando entre intentos); None si se cerró antes."""
+        while not self.stop.is_set():
+            try:
+                sock = socket.create_connection((self.host, self.port), timeout=CONNECT_TIMEOUT_S)
+                sock.settimeout(None)
+                sock.sendall(_subscribe_line(self.subscribe))
+            except OSError:
+                self.stop.wait(self.backoff.next())
+                continue
+            self.backoff.reset()
+            self.sock = sock
+            self.connects += 1
+            if self.on_connect:
+                self.on_connect()
+            return sock
+        return None
+
+    def messages(self):
+        while True:
+            sock = self._open()
+            if sock is None:
+                return
+            framer = StateFramer()
+            try:
+                while True:
+                    data = sock.recv(READ_CHUNK)
+                    if not data:
+                        break
+                    msgs = framer.feed(data)
+                    self.received += len(msgs)
+                    yield from msgs
+            except OSError:
+                pass
+            finally:
+                self.sock = None
+                sock.close()
+            # main.py se reinicia: no martillear el puerto mientras arranca
+            self.stop.wait(self.backoff.next())
+
+    def close(self):
+        self.stop.set()
+        sock = self.sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+class AsyncStateClient:
+    """Como StateClient, como generador asíncrono: `async for msg in c.messages()`."""
+
+    def __init__(self, host: str = CMD_HOST, port: int = STATE_PORT, subscribe: dict = None,
+                 on_connect=None, retry_min: float = RECONNECT_MIN_S,
+                 retry_max: float = RECONNECT_MAX_S):
+        self.host       = host
+        self.port       = port
+        self.subscribe  = subscribe
+        self.on_connect = on_connect
+        self.backoff    = _Backoff(retry_min, retry_max)
+        self.closed     = False
+        self.writer     = None
+        self.connects   = 0
+        self.received   = 0
+
+    async def messages(self):
+        while not self.closed:
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port), CONNECT_TIMEOUT_S)
+                writer.write(_subscribe_line(self.subscribe))
+                await writer.drain()
+            except (OSError, asyncio.TimeoutError):
+                await asyncio.sleep(self.backoff.next())
+                continue
+            self.backoff.reset()
+            self.writer = writer
+            self.connects += 1
+            if self.on_connect:
+                self.on_connect()
+            framer = StateFramer()
+            try:
+                while True:
+                    data = await reader.read(READ_CHUNK)
+                    if not data:
+                        break
+                    msgs = framer.feed(data)
+                    self.received += len(msgs)
+                    for msg in msgs:
+                        yield msg
+            except ConnectionError:
+                pass
+            finally:
+                self.writer = None
+                writer.close()
+            if not self.closed:
+                await asyncio.sleep(self.backoff.next())
+
+    def close(self):
+        self.closed = True
+        if self.writer is not None:
+            self.writer.close()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Registro de comandos del puerto 6000 con validación de esquema.
+
+Cada manejador se registra con el nombre del comando (y la acción, para los
+que tienen subcomandos como "pbd") y los campos que acepta:
+
+    @commands.command("move", eje=Field(int, lo=1, hi=3), pasos=Field(int, lo=0))
+    def cmd_move(req, eje, pasos): ...
+
+El manejador recibe la petición (`Request`) y los campos ya convertidos.
+Si el mensaje trae "id", la conexión recibe un acuse por comando:
+
+    {"type":"ack","id":7,"status":"ok"}                     aceptado y terminado
+    {"type":"ack","id":7,"status":"ok","pending":true}      aceptado; luego llega
+    {"type":"done","id":7,"status":"ok"}                    ... su finalización
+    {"type":"ack","id":7,"status":"error","error":"..."}    rechazado
+"""
+
+import threading
+
+REQUIRED = object()
+
+class CommandError(ValueError):
+    """Comando rechazado (desconocido, campos inválidos o sin efecto posible)."""
+
+class Field:
+    """Campo de un comando. `kind` es int, float, str, bool o list (con
+       `item` como tipo de los elementos).
+    """
+    __slots__ = ("kind", "default", "choices", "lo", "hi", "item")
+
+    def __init__(self, kind, default=REQUIRED, choices=None, lo=None, hi=None, item=None):
+        self.kind    = kind
+        self.default = default
+        self.choices = choices
+        self.lo      = lo
+        self.hi      = hi
+        self.item    = item
+
+    def _scalar(self, kind, value):
+        if kind is bool:
+            if value in (True, False, 0, 1):
+                return bool(value)
+            raise ValueError
+        if kind is str:
+            if not isinstance(value, str):
+                raise ValueError
+            return value
+        if isinstance(value, bool):
+            raise ValueError
+        if kind is int and isinstance(value, float) and not value.is_integer():
+            raise ValueError
+        return kind(value)
+
+    def parse(self, name: str, value):
+        try:
+            if self.kind is list:
+                if not isinstance(value, list):
+                    raise ValueError
+                value = [self._scalar(self.item, v) for v in value]
+                checked = value
+            else:
+                value = self._scalar(self.kind, value)
+                checked = [value]
+        except (TypeError, ValueError):
+            kind = f"lista de {self.item.__name__}" if self.kind is list else self.kind.__name__
+            raise CommandError(f"'{name}': se esperaba {kind}, llegó {value!r}") from None
+        for v in checked:
+            if self.choices is not None and v not in self.choices:
+                raise CommandError(f"'{name}': {v!r} no está en {list(self.choices)}")
+            if self.lo is not None and v < self.lo or self.hi is not None and v > self.hi:
+                raise CommandError(f"'{name}': {v!r} fuera de rango [{self.lo}, {self.hi}]")
+        return value
+
+class Request:
+    """Un comando recibido: mensaje original, id opcional y la conexión."""
+    __slots__ = ("msg", "id", "_reply", "_loop", "acked", "pending")
+
+    def __init__(self, msg: dict, reply, loop):
+        self.msg     = msg
+        self.id      = msg.get("id")
+        self._reply  = reply
+        self._loop   = loop
+        self.acked   = False
+        self.pending = False
+
+    def reply(self, obj: dict):
+        """Respuesta de datos (consultas); lleva el id si lo hay."""
+        if self.id is not None:
+            obj = {**obj, "id": self.id}
+        self._reply(obj)
+
+    def ack(self, status: str = "ok", **extra):
+        """Acuse único por comando; sin id no se envía nada."""
+        if self.acked:
+            return
+        self.acked = True
+        if self.id is None:
+            return
+        obj = {"type": "ack", "id": self.id, "status": status, **extra}
+        if self.pending and status == "ok":
+            obj["pending"] = True
+        self._reply(obj)
+
+    def defer(self):
+        """Marca el comando como pendiente. Devuelve done(status, **extra),
+           que se puede llamar desde cualquier hilo una sola vez.
+        """
+        self.pending = True
+        if self.id is None:
+            return _noop
+        sent = []
+        loop_thread = threading.get_ident()     # se crea dentro del bucle
+
+        def done(status: str = "ok", **extra):
+            if sent:
+                return
+            sent.append(True)
+            obj = {"type": "done", "id": self.id, "status": status, **extra}
+            if threading.get_ident() == loop_thread:
+                self._reply(obj)
+            else:
+                self._loop.call_soon_threadsafe(self._reply, obj)
+        return done
+
+def _noop(*args, **kwargs):
+    pass
+
+class CommandRegistry:
+    def __init__(self, on_echo=None):
+        self.handlers = {}      # (cmd, acción|None) -> (fn, campos, echo)
+        self.with_actions = set()
+        self.on_echo  = on_echo # f(msg) para los comandos aceptados con echo
+
+    def command(self, cmd: str, action: str = None, /, echo: bool = True, **fields):
+        """Registra un manejador. `echo` reenvía el comando aceptado a los
+           suscriptores del 6001 (tipo "commands"). `cmd` y `action` son
+           posicionales para que "action" pueda ser también un campo.
+        """
+        def deco(fn):
+            self.handlers[(cmd, action)] = (fn, fields, echo)
+            if action is not None:
+                self.with_actions.add(cmd)
+            return fn
+        return deco
+
+    def resolve(self, msg: dict):
+        """Devuelve (fn, kwargs, echo) o lanza CommandError."""
+        cmd = msg.get("cmd")
+        key = (cmd, msg.get("action") if cmd in self.with_actions else None)
+        entry = self.handlers.get(key)
+        if entry is None:
+            if cmd in self.with_actions:
+                raise CommandError(f"acción desconocida para {cmd!r}: {msg.get('action')!r}")
+            raise CommandError(f"comando desconocido: {cmd!r}")
+        fn, fields, echo = entry
+        kwargs = {}
+        for name, field in fields.items():
+            if name in msg and msg[name] is not None:
+                kwargs[name] = field.parse(name, msg[name])
+            elif field.default is REQUIRED:
+                raise CommandError(f"falta el campo {name!r}")
+            else:
+                kwargs[name] = field.default
+        return fn, kwargs, echo
+
+    async def dispatch(self, req: Request):
+        """Valida y ejecuta un comando. Si falla se acusa como "error" y se
+           relanza. Un manejador puede devolver un awaitable: se espera tras
+           el acuse y retiene los siguientes comandos de esa conexión.
+        """
+        try:
+            fn, kwargs, echo = self.resolve(req.msg)
+            hold = fn(req, **kwargs)
+        except (CommandError, KeyError, ValueError, TypeError, OSError) as e:
+            req.ack("error", error=str(e))
+            raise
+        req.ack("ok")
+        if echo and self.on_echo:
+            self.on_echo(req.msg)
+        if hold is not None:
+            await hold
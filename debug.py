@@ -1,7 +1,7 @@
-import socket
-import json
 import sys
 
+from client import CommandClient, CommandFailed
+
 if len(sys.argv) != 4:
     print("Uso: python3 debug.py <motor> <f|b> <pasos>")
     sys.exit(1)
@@ -12,9 +12,14 @@ steps = int(sys.argv[3])
 dir_flag = 1 if dir_char == 'f' else 0
 msg = {"cmd": "move", "eje": motor, "dir": dir_flag, "pasos": steps}
 
-# Enviar comando
-sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-sock.connect(("localhost", 6000))
-sock.sendall((json.dumps(msg) + '\n').encode())
-sock.close()
+# Enviar comando y esperar su acuse
+with CommandClient() as client:
+    try:
+        client.call(msg)
+    except CommandFailed as e:
+        print(f"Rechazado: {msg} ({e})")
+        sys.exit(1)
+    except OSError as e:
+        print(f"Sin conexión con el servidor: {e}")
+        sys.exit(1)
 print(f"Enviado: {msg}")
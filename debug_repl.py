@@ -1,55 +1,90 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+"""Consola de depuración de los puertos 6000/6001.
 
-import socket
+Uso:
+    python3 debug_repl.py                       interactivo
+    python3 debug_repl.py <script> [--states]   ejecuta un script (ver run_script)
+    python3 debug_repl.py load [opciones]       generador de carga (ver load_main)
+"""
+
+import argparse
+import asyncio
 import json
+import random
 import threading
 import sys
+import time
+
+from client import (CMD_HOST, CMD_PORT, STATE_PORT, AsyncCommandClient, AsyncStateClient,
+                    CommandClient, CommandFailed, StateClient)
+
+REPLY_TIMEOUT_S = 2.0
+DONE_TIMEOUT_S  = 120.0     # fin de script: espera máxima a los "done" pendientes
+
+# Una sola conexión para toda la sesión: cada comando ya no abre su socket
+client = CommandClient(CMD_HOST, CMD_PORT)
 
-CMD_HOST   = "localhost"
-CMD_PORT   = 6000
-STATE_PORT = 6001
+def report(payload, fut):
+    """Muestra el rechazo de un comando enviado sin esperar."""
+    exc = fut.exception()
+    if isinstance(exc, CommandFailed):
+        print(f"[ERROR] {payload}: {exc}")
+    elif exc is not None:
+        print(f"[ERROR] {payload}: sin conexión ({exc})")
 
-def send_cmd(payload):
-    s = socket.socket()
-    s.connect((CMD_HOST, CMD_PORT))
-    line = json.dumps(payload) + "\n"
-    s.sendall(line.encode())
-    s.close()
+def send_cmd(payload, expect_reply=False, wait_done=False):
+    """Envía y vuelve sin esperar (salvo consultas). Devuelve el futuro del
+       acuse (o del "done" con `wait_done`), o None para las consultas.
+    """
     print(f"[SEND] {payload}")
+    if expect_reply:
+        # Consultas: la respuesta llega por la misma conexión
+        try:
+            print(f"[REPLY] {json.dumps(client.call(payload, timeout=REPLY_TIMEOUT_S))}")
+        except CommandFailed as e:
+            print(f"[REPLY] {json.dumps(e.reply)}")
+        except OSError as e:
+            print(f"[ERROR] {payload}: {e}")
+        return None
+    fut = client.submit(payload, wait_done)
+    fut.add_done_callback(lambda f: report(payload, f))
+    return fut
 
 def state_listener():
-    s = socket.socket()
-    s.connect((CMD_HOST, STATE_PORT))
-    buf = ""
-    print("[STATE] Conectado.")
-    while True:
-        data = s.recv(1024).decode()
-        if not data:
-            break
-        buf += data
-        while "\n" in buf:
-            line, buf = buf.split("\n", 1)
-            if not line:
-                continue
-            try:
-                msg = json.loads(line)
-            except Exception:
-                print(f"[STATE?] {line}")
-                continue
+    states = StateClient(CMD_HOST, STATE_PORT, on_connect=lambda: print("[STATE] Conectado."))
+    for msg in states.messages():
+        # Muestras PBD (escaladas)
+        if msg.get("type") == "pbd_sample":
+            print(f"[PBD] axis={msg['axis']} raw={msg['pos_raw']} "
+                  f"rev={msg['rev']:.5f} steps={msg['steps']:.1f} deg={msg['deg']:.2f}")
+        # Cinemática de cada muestra (kinematics.py en main.py)
+        elif msg.get("type") == "kinematics":
+            flags = [f for f in ("stall", "overspeed") if msg.get(f)]
+            print(f"[KIN] axis={msg['axis']} deg={msg['deg']:.2f} vel={msg['vel']:.2f} "
+                  f"acc={msg['acc']:.1f} xyz={msg['xyz']}" + (f" {'+'.join(flags)}" if flags else ""))
+        else:
+            print(f"[STATE] {msg}")
 
-            # Muestras PBD (escaladas)
-            if msg.get("type") == "pbd_sample":
-                print(f"[PBD] axis={msg['axis']} raw={msg['pos_raw']} "
-                      f"rev={msg['rev']:.5f} steps={msg['steps']:.1f} deg={msg['deg']:.2f}")
-            else:
-                print(f"[STATE] {msg}")
-    s.close()
+def play_opts(tokens):
+    """x2 -> speed, 5hz -> rate_hz, linear|spline -> interp."""
+    opts = {}
+    for tok in tokens:
+        if tok.startswith("x"):
+            opts["speed"] = float(tok[1:])
+        elif tok.endswith("hz"):
+            opts["rate_hz"] = float(tok[:-2])
+        elif tok in ("linear", "spline"):
+            opts["interp"] = tok
+    return opts
 
-def parse_and_send(line):
+def parse_command(line):
+    """Línea del REPL -> (payload, espera_respuesta); None si está vacía.
+       ValueError si no es un comando válido.
+    """
     parts = line.strip().split()
     if not parts:
-        return
+        return None
     cmd = parts[0].lower()
 
     # ── Move existente ──
@@ -57,23 +92,38 @@ def parse_and_send(line):
         motor   = int(parts[1])
         dirflag = 1 if parts[2] == "f" else 0
         pasos   = int(parts[3])
-        send_cmd({"cmd": "move", "eje": motor, "dir": dirflag, "pasos": pasos})
+        return {"cmd": "move", "eje": motor, "dir": dirflag, "pasos": pasos}, False
 
     # ── PBD enter/exit ──
     elif cmd == "pbd" and len(parts) == 2 and parts[1] in ("enter","exit"):
-        send_cmd({"cmd":"pbd", "action": "enter" if parts[1]=="enter" else "exit"})
+        return {"cmd":"pbd", "action": "enter" if parts[1]=="enter" else "exit"}, False
+
+    # ── PBD control de reproducción ──
+    elif cmd == "pbd" and len(parts) == 2 and parts[1] in ("pause","resume","abort"):
+        return {"cmd":"pbd", "action": parts[1]}, False
+
+    # ── PBD biblioteca de demostraciones ──
+    elif cmd == "pbd" and len(parts) == 2 and parts[1] == "list":
+        return {"cmd":"pbd", "action":"list"}, True
+    elif cmd == "pbd" and len(parts) == 3 and parts[1] in ("save","load","delete"):
+        return {"cmd":"pbd", "action":parts[1], "name":parts[2]}, True
 
     # ── PBD recstart/recstop ──
-    elif cmd == "pbd" and len(parts) == 3 and parts[1] == "recstart":
-        axis = int(parts[2])
-        send_cmd({"cmd":"pbd", "action":"recstart", "axis":axis})
+    # Uso: pbd recstart <eje|ejes_csv> [hz]
+    elif cmd == "pbd" and len(parts) in (3, 4) and parts[1] == "recstart":
+        axes = [int(x) for x in parts[2].split(",") if x]
+        payload = {"cmd":"pbd", "action":"recstart", "axes":axes}
+        if len(parts) == 4:
+            payload["rate_hz"] = float(parts[3])
+        return payload, False
     elif cmd == "pbd" and len(parts) == 2 and parts[1] == "recstop":
-        send_cmd({"cmd":"pbd", "action":"recstop"})
+        return {"cmd":"pbd", "action":"recstop"}, False
 
     # ── PBD play / playrev (un eje) ──
-    elif cmd == "pbd" and len(parts) == 3 and parts[1] in ("play","playrev"):
+    # Opciones: x<velocidad> <N>hz linear|spline   p.ej. pbd play 1 x2 5hz spline
+    elif cmd == "pbd" and len(parts) >= 3 and parts[1] in ("play","playrev"):
         axis = int(parts[2])
-        send_cmd({"cmd":"pbd", "action":parts[1], "axis":axis})
+        return {"cmd":"pbd", "action":parts[1], "axis":axis, **play_opts(parts[3:])}, False
 
     # ── PBD play_all / playrev_all (varios ejes) ──
     # Uso:
@@ -81,11 +131,16 @@ def parse_and_send(line):
     #   pbd play_all 1,3
     #   pbd playrev_all
     #   pbd playrev_all 2,1
+    #   pbd play_all 1,2,3 seq   (uno tras otro en vez de simultáneos)
+    #   pbd play_all 1,2 x2 4hz  (opciones como en pbd play)
     elif cmd == "pbd" and len(parts) >= 2 and parts[1] in ("play_all","playrev_all"):
         axes = [1,2,3]
-        if len(parts) == 3:
-            axes = [int(x) for x in parts[2].split(",") if x]
-        send_cmd({"cmd":"pbd", "action":parts[1], "axes":axes})
+        seq  = "seq" in parts[2:]
+        args = [p for p in parts[2:] if p != "seq"]
+        if args and args[0][0].isdigit():
+            axes = [int(x) for x in args[0].split(",") if x]
+            args = args[1:]
+        return {"cmd":"pbd", "action":parts[1], "axes":axes, "seq":seq, **play_opts(args)}, False
 
     # ── PBD move por vueltas (con delay 5 s/vuelta) ──
     # Uso: pbd move <motor> <f|b> <vueltas>
@@ -93,41 +148,408 @@ def parse_and_send(line):
         motor   = int(parts[2])
         dirflag = 1 if parts[3] == "f" else 0
         revs    = float(parts[4])
-        send_cmd({"cmd":"pbd", "action":"move", "eje":motor, "dir":dirflag, "revs":revs})
+        return {"cmd":"pbd", "action":"move", "eje":motor, "dir":dirflag, "revs":revs}, False
 
     # ── Periféricos existentes ──
     elif cmd == "bomba" and len(parts) == 2 and parts[1] in ("on","off"):
-        send_cmd({"cmd": "bomba", "state": parts[1]})
+        return {"cmd": "bomba", "state": parts[1]}, False
 
     elif cmd == "solenoide" and len(parts) == 2 and parts[1] in ("on","off"):
-        send_cmd({"cmd": "solenoide", "state": parts[1]})
+        return {"cmd": "solenoide", "state": parts[1]}, False
 
     elif cmd == "efector" and len(parts) == 2 and parts[1] in ("open","close"):
-        send_cmd({"cmd": "efector", "action": parts[1]})
+        return {"cmd": "efector", "action": parts[1]}, False
 
     elif cmd == "rotarefector" and len(parts) == 2:
         angle = int(parts[1])
-        send_cmd({"cmd": "rotarEfector", "angle": angle})
+        return {"cmd": "rotarEfector", "angle": angle}, False
+
+    # ── Registro del servidor ──
+    # Uso: log <debug|info|warn|error> [líneas_por_s]
+    elif cmd == "log" and len(parts) in (2, 3):
+        payload = {"cmd": "log", "level": parts[1]}
+        if len(parts) == 3:
+            payload["rate"] = int(parts[2])
+        return payload, True
+
+    # ── Cinemática: geometría y último estado por eje ──
+    elif cmd == "kin" and len(parts) == 1:
+        return {"cmd": "kinematics"}, True
 
-    elif cmd == "exit":
+    raise ValueError(f"comando no válido: {line.strip()}")
+
+def usage():
+    print("Uso:")
+    print(" move <motor> <f|b> <pasos>")
+    print(" pbd enter | pbd exit")
+    print(" pbd recstart <axis|ejes_csv> [hz]")
+    print(" pbd recstop")
+    print(" pbd play <axis> [x<vel>] [<N>hz] [linear|spline]")
+    print(" pbd playrev <axis> [x<vel>] [<N>hz] [linear|spline]")
+    print(" pbd play_all [ejes_csv] [seq] [x<vel>] [<N>hz] [linear|spline]")
+    print(" pbd playrev_all [ejes_csv] [seq] [x<vel>] [<N>hz] [linear|spline]")
+    print(" pbd pause | pbd resume | pbd abort")
+    print(" pbd move <motor> <f|b> <vueltas>")
+    print(" pbd save <nombre> | pbd load <nombre> | pbd delete <nombre> | pbd list")
+    print(" bomba <on|off>")
+    print(" solenoide <on|off>")
+    print(" efector <open|close>")
+    print(" rotarEfector <ángulo>")
+    print(" log <debug|info|warn|error> [líneas_por_s]")
+    print(" kin")
+    print(" exit")
+
+def parse_and_send(line):
+    if line.strip().lower() == "exit":
         sys.exit(0)
+    try:
+        parsed = parse_command(line)
+    except ValueError:
+        usage()
+        return
+    if parsed is not None:
+        send_cmd(*parsed)
 
-    else:
-        print("Uso:")
-        print(" move <motor> <f|b> <pasos>")
-        print(" pbd enter | pbd exit")
-        print(" pbd recstart <axis>")
-        print(" pbd recstop")
-        print(" pbd play <axis>")
-        print(" pbd playrev <axis>")
-        print(" pbd play_all [ejes_csv]")
-        print(" pbd playrev_all [ejes_csv]")
-        print(" pbd move <motor> <f|b> <vueltas>")
-        print(" bomba <on|off>")
-        print(" solenoide <on|off>")
-        print(" efector <open|close>")
-        print(" rotarEfector <ángulo>")
-        print(" exit")
+# ===== Modo script =====
+# Un script son líneas del REPL más directivas de tiempo:
+#   # comentario
+#   wait <s>              pausa de s segundos
+#   wait done             espera el "done" de todo lo enviado hasta aquí
+#   at t=<s> [comando]    espera al instante s (desde el inicio del script, o
+#                         de la vuelta actual dentro de un repeat) y envía
+#   repeat <n>            repite n veces el bloque hasta su "end" (anidable)
+#   end
+# El script se valida entero antes de enviar nada.
+
+class ScriptError(ValueError):
+    def __init__(self, lineno: int, text: str):
+        super().__init__(f"línea {lineno}: {text}")
+        self.lineno = lineno
+
+def parse_script(lines):
+    """Líneas -> pasos: ("cmd", n, payload, consulta), ("wait", n, s),
+       ("wait_done", n), ("at", n, t) o ("repeat", n, veces, pasos).
+    """
+    root = []
+    stack = [(root, 0)]
+    for lineno, raw in enumerate(lines, 1):
+        line = raw.split("#", 1)[0].strip()
+        if not line:
+            continue
+        parts = line.split()
+        word = parts[0].lower()
+        steps = stack[-1][0]
+        try:
+            if word == "wait" and parts[1:] == ["done"]:
+                steps.append(("wait_done", lineno))
+            elif word == "wait" and len(parts) == 2:
+                steps.append(("wait", lineno, float(parts[1])))
+            elif word == "at" and len(parts) >= 2 and parts[1].startswith("t="):
+                steps.append(("at", lineno, float(parts[1][2:])))
+                if len(parts) > 2:
+                    steps.append(("cmd", lineno, *parse_command(" ".join(parts[2:]))))
+            elif word == "repeat" and len(parts) == 2:
+                body = []
+                steps.append(("repeat", lineno, int(parts[1]), body))
+                stack.append((body, lineno))
+            elif word == "end" and len(parts) == 1:
+                if len(stack) == 1:
+                    raise ScriptError(lineno, "end sin repeat")
+                stack.pop()
+            elif word == "exit":
+                raise ScriptError(lineno, "exit no se usa en scripts")
+            else:
+                steps.append(("cmd", lineno, *parse_command(line)))
+        except ScriptError:
+            raise
+        except ValueError:
+            raise ScriptError(lineno, f"no se entiende {line!r}") from None
+    if len(stack) > 1:
+        raise ScriptError(stack[-1][1], "repeat sin end")
+    return root
+
+def run_script(steps):
+    """Ejecuta los pasos; los comandos no esperan su acuse (van en tubería
+       por la misma conexión). Devuelve un resumen.
+    """
+    pending = []
+    summary = {"sent": 0, "failed": 0, "late_max_ms": 0.0}
+
+    def wait_done():
+        for fut in pending:
+            try:
+                fut.result(DONE_TIMEOUT_S)
+            except (CommandFailed, OSError):
+                summary["failed"] += 1     # ya se mostró en report()
+        pending.clear()
+
+    def run(steps, t0):
+        for step in steps:
+            kind = step[0]
+            if kind == "cmd":
+                fut = send_cmd(step[2], step[3], wait_done=True)
+                summary["sent"] += 1
+                if fut is not None:
+                    pending.append(fut)
+            elif kind == "wait":
+                time.sleep(step[2])
+            elif kind == "wait_done":
+                wait_done()
+            elif kind == "at":
+                delay = t0 + step[2] - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                elif -delay * 1000 > summary["late_max_ms"]:
+                    summary["late_max_ms"] = round(-delay * 1000, 1)
+            elif kind == "repeat":
+                for _ in range(step[2]):
+                    run(step[3], time.monotonic())
+
+    t0 = time.monotonic()
+    run(steps, t0)
+    wait_done()
+    summary["elapsed_s"] = round(time.monotonic() - t0, 3)
+    return summary
+
+def script_main(argv):
+    ap = argparse.ArgumentParser(prog="debug_repl.py", description="Ejecuta un script de comandos")
+    ap.add_argument("script", help="fichero de comandos ('-' = entrada estándar)")
+    ap.add_argument("--states", action="store_true", help="muestra también el puerto 6001")
+    args = ap.parse_args(argv)
+    f = sys.stdin if args.script == "-" else open(args.script)
+    with f:
+        try:
+            steps = parse_script(f.read().splitlines())
+        except ScriptError as e:
+            print(f"[SCRIPT] {args.script}: {e}")
+            sys.exit(2)
+    if args.states:
+        threading.Thread(target=state_listener, daemon=True).start()
+        time.sleep(0.2)
+    summary = run_script(steps)
+    print(f"[SCRIPT] {summary['sent']} comandos en {summary['elapsed_s']} s, "
+          f"{summary['failed']} fallidos, retraso máx de 'at' {summary['late_max_ms']} ms")
+    client.close()
+    sys.exit(1 if summary["failed"] else 0)
+
+# ===== Generador de carga =====
+# N clientes de comandos envían una mezcla de comandos a ritmo fijo (sin
+# esperar acuses, como un operador impaciente) y M suscriptores del 6001
+# miden cuánto tarda en llegarles el eco de cada uno. Todo en un proceso y
+# un bucle asyncio, con los clientes de client.py.
+# La mezcla por defecto no mueve el brazo: los move esperan en MotionQueue
+# (sin tope, uno a la vez) y contra el brazo real seguirían moviéndolo mucho
+# después de la prueba. Para incluirlos hace falta --allow-moves.
+LOAD_MIX        = "pbd=4,stats=2,ready=2,motion=2"
+LOAD_MOVE_STEPS = 10        # pasos por move: poco recorrido en el brazo real
+LOAD_DRAIN_S    = 2.0       # espera final a acuses y ecos rezagados
+# Consultas sin eco en el 6001 (solo cuentan para el acuse, no para el lag)
+LOAD_NO_ECHO    = frozenset(("stats", "ready", "motion"))
+LOAD_BACKLOG_WARN_S = 1.0   # moves aún en cola al terminar que merecen aviso
+
+def load_command(kind: str, rng):
+    if kind == "move":
+        return {"cmd": "move", "eje": rng.randint(1, 3), "dir": rng.randint(0, 1),
+                "pasos": LOAD_MOVE_STEPS}
+    if kind in ("bomba", "solenoide"):
+        return {"cmd": kind, "state": rng.choice(("on", "off"))}
+    if kind == "efector":
+        return {"cmd": "efector", "action": rng.choice(("open", "close"))}
+    if kind == "rotarEfector":
+        return {"cmd": "rotarEfector", "angle": rng.randint(0, 180)}
+    if kind == "pbd":
+        # Con eco (mide el lag) y sin efecto en el brazo: el modo PBD del
+        # firmware solo habilita "record start", y entrar dos veces no cambia nada
+        return {"cmd": "pbd", "action": "enter"}
+    if kind in LOAD_NO_ECHO:
+        return {"cmd": kind}                        # stats / ready (ping) / estado de motion
+    raise ValueError(f"tipo de comando desconocido en la mezcla: {kind}")
+
+def parse_mix(text: str):
+    kinds, weights = [], []
+    for item in text.split(","):
+        kind, _, weight = item.partition("=")
+        load_command(kind, random)      # valida el nombre
+        kinds.append(kind)
+        weights.append(float(weight or 1))
+    return kinds, weights
+
+def pct(values, p):
+    if not values:
+        return float("nan")
+    vals = sorted(values)
+    return vals[min(len(vals) - 1, int(round(p / 100.0 * (len(vals) - 1))))]
+
+async def load_commander(idx, rate, t_start, t_end, mix, sent, stats, rng):
+    client = AsyncCommandClient()
+    await client.call({"cmd": "ready"})     # conecta antes de medir
+    kinds, weights = mix
+    futs = []
+    seq = 0
+    next_t = t_start + rng.random() / rate  # escalonado entre clientes
+
+    def on_ack(fut, t_sent, echoed):
+        exc = fut.exception()
+        if exc is None:
+            stats["ack_ms"].append((time.perf_counter() - t_sent) * 1000)
+            stats["echoed"] += echoed
+        elif isinstance(exc, CommandFailed):
+            stats["rejected"] += 1
+        else:
+            stats["lost"] += 1
+
+    while next_t < t_end:
+        delay = next_t - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            stats["behind_ms"] = max(stats["behind_ms"], -delay * 1000)
+        kind = rng.choices(kinds, weights)[0]
+        payload = load_command(kind, rng)
+        payload["lg"] = [idx, seq]
+        t_sent = time.perf_counter()
+        sent[(idx, seq)] = t_sent
+        fut = await client.submit(payload)
+        fut.add_done_callback(lambda f, t=t_sent, e=kind not in LOAD_NO_ECHO: on_ack(f, t, e))
+        futs.append(fut)
+        stats["sent"] += 1
+        seq += 1
+        next_t += 1.0 / rate
+    if futs:
+        await asyncio.wait(futs, timeout=LOAD_DRAIN_S)
+    stats["lost"] += sum(1 for f in futs if not f.done())
+    await client.close()
+
+async def load_subscriber(idx, subscribe, sent, result, ready):
+    states = AsyncStateClient(subscribe=subscribe)
+    result.update(received=0, lag_ms=[], connects=0)
+    try:
+        async for msg in states.messages():
+            if msg.get("type") == "subscribed":
+                ready.set()
+                continue
+            lg = msg.get("lg")
+            if lg is None:
+                continue
+            t_sent = sent.get(tuple(lg))
+            if t_sent is not None:
+                result["received"] += 1
+                result["lag_ms"].append((time.perf_counter() - t_sent) * 1000)
+    finally:
+        result["connects"] = states.connects
+        states.close()
+
+async def run_load(clients, subscribers, rate, seconds, mix, subscribe, seed):
+    sent, stats = {}, {"sent": 0, "ack_ms": [], "echoed": 0, "rejected": 0, "lost": 0,
+                       "behind_ms": 0.0}
+    subs = [{} for _ in range(subscribers)]
+    ready = [asyncio.Event() for _ in range(subscribers)]
+    sub_tasks = [asyncio.create_task(load_subscriber(i, subscribe, sent, subs[i], ready[i]))
+                 for i in range(subscribers)]
+    if ready:
+        await asyncio.wait_for(asyncio.gather(*(e.wait() for e in ready)), 10.0)
+    t_start = time.perf_counter() + 0.2
+    t_end = t_start + seconds
+    await asyncio.gather(*(load_commander(i, rate / clients, t_start, t_end, mix, sent, stats,
+                                          random.Random(seed + i))
+                           for i in range(clients)))
+    await asyncio.sleep(0.2)        # ecos de los últimos acuses
+    for task in sub_tasks:
+        task.cancel()
+    await asyncio.gather(*sub_tasks, return_exceptions=True)
+    acked  = len(stats["ack_ms"])
+    echoed = stats["echoed"]         # comandos aceptados que tienen eco
+    backlog_s = 0.0
+    if "move" in mix[0]:
+        # Lo que queda en cola es movimiento del brazo después de la prueba
+        client = AsyncCommandClient()
+        try:
+            backlog_s = (await client.call({"cmd": "motion"})).get("queued_s", 0.0)
+        finally:
+            await client.close()
+    return {
+        "clients": clients, "subscribers": subscribers, "target_rate": rate,
+        "seconds": seconds, "sent": stats["sent"], "acked": acked,
+        "rejected": stats["rejected"], "lost": stats["lost"],
+        "throughput": round(acked / seconds, 1),
+        "motion_backlog_s": backlog_s,
+        "behind_ms_max": round(stats["behind_ms"], 1),
+        "ack_ms": {"p50": round(pct(stats["ack_ms"], 50), 2), "p95": round(pct(stats["ack_ms"], 95), 2),
+                   "p99": round(pct(stats["ack_ms"], 99), 2),
+                   "max": round(max(stats["ack_ms"], default=float("nan")), 2)},
+        "subs": [{"received": s["received"], "missing": max(0, echoed - s["received"]),
+                  "reconnects": max(0, s["connects"] - 1),
+                  "lag_ms": {"p50": round(pct(s["lag_ms"], 50), 2),
+                             "p95": round(pct(s["lag_ms"], 95), 2),
+                             "max": round(max(s["lag_ms"], default=float("nan")), 2)}}
+                 for s in subs],
+    }
+
+def print_load(res):
+    ack = res["ack_ms"]
+    print(f"[LOAD] {res['clients']} clientes, {res['subscribers']} suscriptores, "
+          f"objetivo {res['target_rate']:.1f} cmd/s durante {res['seconds']:.0f} s")
+    print(f"[LOAD] enviados {res['sent']}, acusados {res['acked']} ({res['throughput']:.1f}/s), "
+          f"rechazados {res['rejected']}, sin acuse {res['lost']}, "
+          f"retraso de envío máx {res['behind_ms_max']:.1f} ms")
+    print(f"[LOAD] acuse ms: p50 {ack['p50']:.2f}  p95 {ack['p95']:.2f}  "
+          f"p99 {ack['p99']:.2f}  max {ack['max']:.2f}")
+    if res["motion_backlog_s"] > LOAD_BACKLOG_WARN_S:
+        print(f"[LOAD] AVISO: quedan {res['motion_backlog_s']:.1f} s de moves en cola; "
+              f"el brazo sigue moviéndose (pbd abort no los para: use {{\"cmd\":\"motion\",\"clear\":0}})")
+    for i, s in enumerate(res["subs"]):
+        lag = s["lag_ms"]
+        print(f"[LOAD]   suscriptor {i + 1:3d}: recibidos {s['received']:6d}  perdidos {s['missing']:4d}  "
+              f"reconexiones {s['reconnects']}  lag ms p50 {lag['p50']:.2f}  p95 {lag['p95']:.2f}  "
+              f"max {lag['max']:.2f}")
+
+def load_main(argv):
+    ap = argparse.ArgumentParser(prog="debug_repl.py load",
+                                 description="Generador de carga para los puertos 6000/6001")
+    ap.add_argument("--clients", default="1",
+                    help="clientes de comandos; lista separada por comas para un barrido")
+    ap.add_argument("--subscribers", default="1",
+                    help="suscriptores del 6001 (uno o uno por valor de --clients)")
+    ap.add_argument("--rate", type=float, default=20.0, help="cmd/s en total")
+    ap.add_argument("--per-client", action="store_true", help="--rate es por cliente")
+    ap.add_argument("--seconds", type=float, default=10.0)
+    ap.add_argument("--mix", default=LOAD_MIX, help="tipo=peso,... (pbd, stats, ready, motion, "
+                                                    "bomba, solenoide, efector, rotarEfector, move)")
+    ap.add_argument("--allow-moves", action="store_true",
+                    help="permite 'move' en la mezcla: mueve el brazo real")
+    ap.add_argument("--sub-types", default="commands",
+                    help="tipos de la suscripción (commands,events,samples)")
+    ap.add_argument("--sub-format", default="json", choices=("json", "compact", "binary"))
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", action="store_true", help="resultado en JSON (una línea por ronda)")
+    args = ap.parse_args(argv)
+
+    clients = [int(x) for x in args.clients.split(",")]
+    subscribers = [int(x) for x in args.subscribers.split(",")]
+    if len(subscribers) == 1:
+        subscribers *= len(clients)
+    if len(subscribers) != len(clients):
+        ap.error("--subscribers: un valor o tantos como --clients")
+    mix = parse_mix(args.mix)
+    if "move" in mix[0] and not args.allow_moves:
+        ap.error("la mezcla incluye 'move': añada --allow-moves (mueve el brazo)")
+    subscribe = {"types": args.sub_types.split(","), "format": args.sub_format}
+    results = []
+    for n, m in zip(clients, subscribers):
+        rate = args.rate * n if args.per_client else args.rate
+        res = asyncio.run(run_load(n, m, rate, args.seconds, mix, subscribe, args.seed))
+        results.append(res)
+        if args.json:
+            print(json.dumps(res))
+        else:
+            print_load(res)
+    if len(results) > 1 and not args.json:
+        print("[LOAD] barrido: clientes suscriptores  cmd/s  acuse p95 ms  lag p95 ms (peor)  perdidos")
+        for r in results:
+            worst = max((s["lag_ms"]["p95"] for s in r["subs"]), default=float("nan"))
+            missing = sum(s["missing"] for s in r["subs"])
+            print(f"[LOAD]          {r['clients']:8d} {r['subscribers']:12d} {r['throughput']:6.1f} "
+                  f"{r['ack_ms']['p95']:13.2f} {worst:18.2f} {missing:9d}")
 
 def repl():
     threading.Thread(target=state_listener, daemon=True).start()
@@ -140,4 +562,9 @@ def repl():
             break
 
 if __name__ == "__main__":
-    repl()
+    if len(sys.argv) > 1 and sys.argv[1] == "load":
+        load_main(sys.argv[2:])
+    elif len(sys.argv) > 1:
+        script_main(sys.argv[1:])
+    else:
+        repl()
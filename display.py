@@ -1,39 +1,112 @@
 #!/usr/bin/env python3
-import socket
-import json
+import os
 import pygame
 import threading
 import time
-import Adafruit_BBIO.GPIO as GPIO
+
+try:
+    import Adafruit_BBIO.GPIO as GPIO
+except ImportError:     # fuera de la BeagleBone: sin buzzer
+    GPIO = None
+
+from boot import Boot
+from buzzer import Buzzer
+from client import StateClient
+from faces import FaceCache, process_rss
+from overlay import GlyphAtlas, OverlayStrip, Telemetry, TelemetryOverlay
+from pose import GazeAtlas, PoseTracker
+from statebus import ENC_COUNTS_PER_REV
 
 # ===== Config “blink” =====
 BLINK_INTERVAL = 2.0   # cada cuánto parpadea en reposo (s)
 BLINK_DURATION = 0.12  # duración del parpadeo (s)
 BLINK_DEBUG   = False  # prints opcionales
+FACE_HOLD_S    = 2.0   # tiempo en una cara de movimiento antes de volver a neutral
+
+# ===== Render =====
+# Solo se dibuja cuando cambia la cara; entre cambios el bucle duerme hasta
+# el próximo plazo (fin de blink, vuelta a neutral, próximo blink) o hasta
+# que llega un evento. Con DIRTY_RECTS se copian solo las zonas que difieren
+# entre la cara anterior y la nueva (ojos/boca) en lugar de las 800x480.
+DIRTY_RECTS    = os.environ.get("ROBOT_DISPLAY_DIRTY", "1") == "1"
+DIRTY_GAP      = 16     # px: zonas más cercanas que esto se dibujan juntas
+# pygame.event.wait() de SDL2 sondea cada ms en fbcon/dummy (~2 % de CPU sin
+# hacer nada); el bucle duerme en un threading.Event y mira el teclado como
+# mucho cada INPUT_POLL_S
+INPUT_POLL_S   = 0.25
+
+# ===== Modo de cara =====
+# faces -> caras fijas por cada eco de move (comportamiento histórico)
+# pose  -> la mirada sigue los ángulos reales de los encoders (pose.py);
+#          mientras se interpola entre muestras se dibuja a POSE_FPS
+FACE_MODE      = os.environ.get("ROBOT_DISPLAY_MODE", "faces")
+POSE_FPS       = 30
+POSE_MAX_RATE  = 30     # muestras/s por eje pedidas al 6001
+
+# ===== Telemetría =====
+# Línea con grados por eje, estado PBD y comandos/s en la franja de abajo
+# (overlay.py). Se repinta como mucho OVERLAY_HZ veces por segundo y solo en
+# los caracteres que cambian.
+OVERLAY          = os.environ.get("ROBOT_DISPLAY_OVERLAY", "0") == "1"
+OVERLAY_HZ       = 5
+OVERLAY_MAX_RATE = 10   # muestras/s por eje pedidas al 6001 (solo overlay)
 
 # Pines y constantes
 BUZZER_PIN = "P8_11"    # GPIO1_13, buzzer low-side
 # LOW  → buzzer ON
 # HIGH → buzzer OFF
 
-# Inicialización del buzzer
-GPIO.setup(BUZZER_PIN, GPIO.OUT)
-GPIO.output(BUZZER_PIN, GPIO.HIGH)  # asegurar OFF al arrancar
+SCREEN_SIZE = (800, 480)
+
+# Servidor de estados (main.py). Si no está, se reintenta sin bloquear la cara
+# (client.StateClient: espera exponencial entre STATE_RETRY_S y STATE_RETRY_MAX_S)
+STATE_HOST        = "localhost"
+STATE_PORT        = 6001
+STATE_RETRY_S     = 0.5
+STATE_RETRY_MAX_S = 5.0
+
+# Arranque: tiempo máximo hasta la primera cara en pantalla (medido en la
+# BeagleBone con bench/bench_startup.py; incluye intérprete e imports)
+COLD_START_TARGET_S = 4.0
+
+boot = Boot("display", COLD_START_TARGET_S)
+
+def init_gpio():
+    """Inicialización del buzzer."""
+    if GPIO is None:
+        return
+    GPIO.setup(BUZZER_PIN, GPIO.OUT)
+    GPIO.output(BUZZER_PIN, GPIO.HIGH)  # asegurar OFF al arrancar
 
-def beep():
-    """Hace dos pitidos de 200 ms cada uno (con 200 ms de silencio)."""
-    for _ in range(2):
-        GPIO.output(BUZZER_PIN, GPIO.LOW)
-        time.sleep(0.2)
-        GPIO.output(BUZZER_PIN, GPIO.HIGH)
-        time.sleep(0.2)
+def buzzer_output(on: bool):
+    GPIO.output(BUZZER_PIN, GPIO.LOW if on else GPIO.HIGH)
 
-# Inicializar Pygame
-pygame.init()
-screen = pygame.display.set_mode((800, 480), pygame.FULLSCREEN)
-pygame.mouse.set_visible(False)
+# Un solo hilo para todos los pitidos (ver buzzer.py)
+buzzer = Buzzer(buzzer_output if GPIO is not None else None)
 
-# Cargar imágenes
+# Patrón de buzzer para cada eco de comando (los de move van aparte)
+BEEP_KINDS = {"bomba": "tool", "solenoide": "tool", "efector": "tool",
+              "rotarEfector": "tool", "pbd": "pbd"}
+PBD_BEEP_ACTIONS = ("recstart", "recstop", "play", "playrev", "play_all", "playrev_all")
+
+def init_screen():
+    """Inicializar Pygame."""
+    pygame.init()
+    surface = pygame.display.set_mode(SCREEN_SIZE, pygame.FULLSCREEN)
+    pygame.mouse.set_visible(False)
+    return surface
+
+# Caras escaladas y comprimidas en disco (faces.py); arriba/abajo se usan
+# para dos ejes y se cargan una sola vez
+faces = FaceCache(SCREEN_SIZE)
+
+def load_face(path):
+    """Cara en el formato de la pantalla (si ya está abierta)."""
+    if screen is None:
+        return faces.load(path)
+    return faces.convert(path)
+
+# Caras de movimiento: se cargan en segundo plano tras mostrar la neutral
 face_paths = {
     'base_left':  'Cara izquierda.bmp',
     'base_right': 'Cara derecha.bmp',
@@ -42,28 +115,71 @@ face_paths = {
     'seg2_up':    'Cara arriba.bmp',
     'seg2_down':  'Cara abajo.bmp',
 }
-images = {k: pygame.transform.scale(pygame.image.load(p), (800, 480))
-          for k, p in face_paths.items()}
-neutral_image = pygame.transform.scale(pygame.image.load('Cara neutral.bmp'), (800, 480))
+NEUTRAL_PATH = 'Cara neutral.bmp'
+BLINK_PATH   = 'blink.bmp'      # imagen de parpadeo
+
+def load_neutral():
+    global neutral_image
+    neutral_image = load_face(NEUTRAL_PATH)
 
-# Imagen de parpadeo
-blink_image = pygame.transform.scale(pygame.image.load('blink.bmp'), (800, 480))
+def load_blink():
+    global blink_image
+    blink_image = load_face(BLINK_PATH)
+
+def load_motion_faces():
+    """Carga las caras de movimiento una a una; recv_states ignora las que
+       aún no estén (la neutral ya se ve)."""
+    for k, p in face_paths.items():
+        images[k] = load_face(p)
+    faces.save_index()
+    if FACE_MODE == "pose":
+        build_gaze_atlas()
+
+def init_overlay():
+    """Atlas de glifos y línea de telemetría (requiere la pantalla abierta)."""
+    global overlay
+    overlay = TelemetryOverlay(Telemetry(), OverlayStrip(GlyphAtlas()), OVERLAY_HZ)
+
+def build_gaze_atlas():
+    """Pre-renderiza los ojos para el modo pose (una vez, en segundo plano)."""
+    global gaze_atlas
+    t0 = time.perf_counter()
+    atlas = GazeAtlas(neutral_image)
+    print(f"[DISPLAY] Atlas de mirada: {atlas.levels}x{atlas.levels} celdas, "
+          f"{atlas.nbytes / 2**20:.1f} MB en {(time.perf_counter() - t0) * 1000:.0f} ms")
+    gaze_atlas = atlas
+    wake()
 
 # Estado compartido
+screen        = None
+images        = {}
+neutral_image = None
+blink_image   = None
 going = True
-current_image = neutral_image
+current_image = None
 last_change = time.time()
 change_lock = threading.Lock()
+wake_event  = threading.Event()     # show_face() -> run()
 
 # Temporizadores para blink
 blink_next_time = time.time() + BLINK_INTERVAL  # cuándo debe iniciar el próximo parpadeo
 blink_end_time  = 0.0                           # fin del parpadeo en curso (0 => no hay parpadeo activo)
 blink_active    = False
 
-# Conectar al servidor de estados
-debug_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-debug_sock.connect(("localhost", 6001))
-buffer = ""
+states = None       # client.StateClient
+
+# Modo pose: ángulos interpolados y ojos pre-renderizados
+pose       = PoseTracker()
+gaze_atlas = None
+
+# Telemetría sobre la cara (None si está desactivada)
+overlay = None
+
+# Lo que hay ahora en pantalla y zonas que cambian entre cada par de caras
+drawn_image  = None
+drawn_cell   = None     # celda del atlas dibujada sobre la neutral (modo pose)
+dirty_cache  = {}       # (id(origen), id(destino)) -> [Rect]
+render_stats = {"frames": 0, "partial": 0, "pixels": 0, "time": 0.0, "wakeups": 0}
 
 def cancel_blink(now=None):
     """Cancela un blink activo y programa el próximo."""
@@ -94,94 +210,272 @@ def finish_blink():
     if BLINK_DEBUG:
         print("[BLINK] end")
 
+def state_subscription():
+    """Suscripción al 6001 según el modo (se reenvía en cada reconexión)."""
+    if FACE_MODE == "pose" or OVERLAY:
+        # Ecos (para el beep) y muestras de encoder, sin campos derivados;
+        # el overlay necesita además los eventos (fin de reproducción)
+        types = ["commands", "samples"] + (["events"] if OVERLAY else [])
+        rate = POSE_MAX_RATE if FACE_MODE == "pose" else OVERLAY_MAX_RATE
+        return {"types": types, "format": "compact", "max_rate": rate}
+    # Solo nos interesan los ecos de comandos (cmd: move), no las muestras PBD
+    return {"types": ["commands"]}
+
+def wake():
+    """Despierta al bucle de render (seguro desde cualquier hilo)."""
+    wake_event.set()
+
+def show_face(key):
+    """Cambia a una cara de movimiento (desde cualquier hilo)."""
+    global current_image, last_change
+    now = time.time()
+    with change_lock:
+        # Si hay blink activo, cancélalo
+        cancel_blink(now)
+        # Cambia a imagen de movimiento
+        current_image = images[key]
+        last_change = now
+    wake()
+
 def recv_states():
-    """Lee mensajes JSON y actualiza la imagen + emite beep."""
-    global buffer, current_image, last_change
-    while going:
-        data = debug_sock.recv(1024).decode()
-        if not data:
+    """Lee mensajes del 6001 y actualiza la imagen + emite beep. Si main.py
+       se reinicia, StateClient vuelve a conectar."""
+    global states
+    states = StateClient(STATE_HOST, STATE_PORT, state_subscription(),
+                         on_connect=lambda: print(f"[DISPLAY] Conectado a {STATE_HOST}:{STATE_PORT}"),
+                         retry_min=STATE_RETRY_S, retry_max=STATE_RETRY_MAX_S)
+    for msg in states.messages():
+        if not going:
             break
-        buffer += data
-        while '\n' in buffer:
-            line, buffer = buffer.split('\n', 1)
-            try:
-                msg = json.loads(line)
-                if msg.get('cmd') == 'move':
-                    eje = msg['eje']
-                    dir_flag = msg['dir']
-                    if eje == 1:
-                        key = 'base_right' if dir_flag else 'base_left'
-                    elif eje == 2:
-                        key = 'seg1_up' if dir_flag else 'seg1_down'
-                    elif eje == 3:
-                        key = 'seg2_up' if dir_flag else 'seg2_down'
-                    else:
-                        key = None
-
-                    if key and key in images:
-                        now = time.time()
-                        with change_lock:
-                            # Si hay blink activo, cancélalo
-                            cancel_blink(now)
-                            # Cambia a imagen de movimiento
-                            current_image = images[key]
-                            last_change = now
-                        # Beep no bloqueante
-                        threading.Thread(target=beep, daemon=True).start()
-
-            except json.JSONDecodeError:
-                pass
-
-# Arrancar hilo de recepción
-threading.Thread(target=recv_states, daemon=True).start()
-
-# Bucle principal de Pygame
-try:
+        handle_state(msg)
+
+def handle_state(msg):
+    """Un mensaje del 6001 (ya decodificado)."""
+    if msg.get('type') == 'pbd_sample':
+        deg = msg['pos_raw'] / ENC_COUNTS_PER_REV * 360.0
+        if overlay is not None:
+            overlay.telemetry.sample(msg['axis'], deg)
+        if FACE_MODE == "pose":
+            pose.add_sample(msg['axis'], deg, time.time())
+        wake()
+        return
+    cmd = msg.get('cmd')
+    if overlay is not None:
+        if cmd is not None:
+            overlay.telemetry.command(msg, time.time())
+        else:
+            overlay.telemetry.event(msg)
+        wake()
+    if cmd == 'pbd':
+        if msg.get('action') in PBD_BEEP_ACTIONS:
+            buzzer.request('pbd')
+    elif cmd in BEEP_KINDS:
+        buzzer.request(BEEP_KINDS[cmd])
+    if cmd == 'move':
+        eje = msg['eje']
+        dir_flag = msg['dir']
+        if eje == 1:
+            key = 'base_right' if dir_flag else 'base_left'
+        elif eje == 2:
+            key = 'seg1_up' if dir_flag else 'seg1_down'
+        elif eje == 3:
+            key = 'seg2_up' if dir_flag else 'seg2_down'
+        else:
+            key = None
+
+        if key and key in images:
+            # En modo pose la mirada ya sigue al brazo
+            if gaze_atlas is None:
+                show_face(key)
+            # Beep no bloqueante; una ráfaga de moves se fusiona
+            buzzer.request('move')
+
+def start():
+    """Fases de arranque: pantalla, GPIO y caras base en paralelo. La cara
+       neutral se muestra en cuanto está; el resto se carga después."""
+    global screen, neutral_image, blink_image, current_image
+    # pygame.display debe iniciarse en el hilo principal; mientras tanto,
+    # los BMP base y el GPIO se preparan en otros hilos
+    loader = threading.Thread(target=lambda: boot.parallel(
+        gpio=init_gpio, neutral=load_neutral, blink=load_blink))
+    loader.start()
+    with boot.phase("screen"):
+        screen = init_screen()
+    loader.join()
+    if neutral_image is None or blink_image is None:
+        raise RuntimeError("no se pudieron cargar las caras base")
+    with boot.phase("convert"):
+        neutral_image = faces.convert(NEUTRAL_PATH)
+        blink_image   = faces.convert(BLINK_PATH)
+    current_image = neutral_image
+    if OVERLAY:
+        with boot.phase("overlay"):
+            init_overlay()
+    with boot.phase("first_frame"):
+        render(force=True)
+    boot.ready()
+    print(f"[DISPLAY] RSS {process_rss() / 2**20:.1f} MB, caras {faces.stats()}")
+    # Sin bloquear el arranque: caras de movimiento y conexión a main.py
+    threading.Thread(target=load_motion_faces, name="faces", daemon=True).start()
+    threading.Thread(target=recv_states, name="states", daemon=True).start()
+
+def merge_rects(rects, gap=DIRTY_GAP):
+    """Une rectángulos que se tocan o están a menos de `gap` px."""
+    rects = [r.inflate(gap, gap) for r in rects]
+    merged = True
+    while merged:
+        merged = False
+        out = []
+        for r in rects:
+            for i, o in enumerate(out):
+                if o.colliderect(r):
+                    out[i] = o.union(r)
+                    merged = True
+                    break
+            else:
+                out.append(r)
+        rects = out
+    return [r.inflate(-gap, -gap).clip(screen.get_rect()) for r in rects]
+
+def dirty_rects(old, new):
+    """Zonas que difieren entre dos caras (se calcula una vez por par)."""
+    key = (id(old), id(new))
+    rects = dirty_cache.get(key)
+    if rects is None:
+        # |old - new| por canal: dos restas con saturación sumadas
+        diff = old.copy()
+        diff.blit(new, (0, 0), special_flags=pygame.BLEND_RGB_SUB)
+        back = new.copy()
+        back.blit(old, (0, 0), special_flags=pygame.BLEND_RGB_SUB)
+        diff.blit(back, (0, 0), special_flags=pygame.BLEND_RGB_ADD)
+        diff.set_colorkey((0, 0, 0))
+        rects = merge_rects(pygame.mask.from_surface(diff).get_bounding_rects())
+        dirty_cache[key] = dirty_cache[(id(new), id(old))] = rects
+    return rects
+
+def render(force=False):
+    """Dibuja la cara actual si no es la que ya está en pantalla. En modo
+       pose, sobre la neutral van los ojos de la celda de mirada actual.
+    """
+    global drawn_image, drawn_cell
+    now = time.time()
+    image = current_image
+    cell = None
+    if gaze_atlas is not None and image is neutral_image:
+        cell = gaze_atlas.cell(*pose.gaze(now))
+    overlay_due = overlay is not None and overlay.next_due(now) <= now
+    if image is drawn_image and cell == drawn_cell and not force and not overlay_due:
+        return False
+    t0 = time.perf_counter()
+    full = force or not DIRTY_RECTS or drawn_image is None
+    rects = []
+    if full:
+        screen.blit(image, (0, 0))
+    elif image is not drawn_image:
+        rects = list(dirty_rects(drawn_image, image))
+        if drawn_cell is not None:
+            rects += gaze_atlas.rects       # borra los ojos desplazados
+        for r in rects:
+            screen.blit(image, r, r)
+    if cell is not None:
+        rects += gaze_atlas.blit(screen, cell)
+    if overlay is not None:
+        # Si la cara se pintó encima de la línea, se repinta entera
+        if full or overlay.rect.collidelist(rects) != -1:
+            overlay.invalidate()
+        rects += overlay.draw(screen, image, now)
+    if not full and not rects:
+        return False        # solo tocaba el overlay y su texto no cambió
+    if full:
+        pygame.display.flip()
+        render_stats["pixels"] += SCREEN_SIZE[0] * SCREEN_SIZE[1]
+    else:
+        pygame.display.update(rects)
+        render_stats["partial"] += 1
+        render_stats["pixels"]  += sum(r.w * r.h for r in rects)
+    drawn_image = image
+    drawn_cell  = cell
+    render_stats["frames"] += 1
+    render_stats["time"]   += time.perf_counter() - t0
+    return True
+
+def update_face(now):
+    """Aplica los plazos vencidos. Devuelve el próximo plazo (time.time())."""
+    global current_image, blink_next_time
+    with change_lock:
+        # (1) Si hay un blink activo y ya venció, terminarlo SIEMPRE,
+        #     independientemente de la imagen actual.
+        if blink_active and now >= blink_end_time:
+            finish_blink()
+
+        # (2) Volver a neutral tras FACE_HOLD_S desde el último cambio por
+        #     movimiento; el próximo blink cuenta desde aquí.
+        if (current_image is not neutral_image and
+            current_image is not blink_image and
+            (now - last_change) >= FACE_HOLD_S):
+            current_image = neutral_image
+            blink_next_time = now + BLINK_INTERVAL
+
+        # (3) Si estamos en neutral y no hay blink activo, ¿toca iniciar uno?
+        if (current_image is neutral_image and
+            not blink_active and
+            now >= blink_next_time):
+            try_start_blink(now)
+
+        # (4) Próximo plazo según la cara actual. En una cara de movimiento
+        #     no se parpadea: solo cuenta la vuelta a neutral.
+        if blink_active:
+            return blink_end_time
+        if current_image is neutral_image:
+            if gaze_atlas is not None and pose.moving(now):
+                return min(blink_next_time, now + 1.0 / POSE_FPS)
+            return blink_next_time
+        if current_image is blink_image:
+            # Caso borde: imagen de blink sin blink activo
+            finish_blink()
+            return blink_next_time
+        return last_change + FACE_HOLD_S
+
+def run():
+    """Bucle principal de Pygame: duerme hasta el próximo plazo o evento."""
+    global going
+    deadline = time.time()
     while going:
+        wake_event.wait(min(INPUT_POLL_S, max(0.0, deadline - time.time())))
+        wake_event.clear()
+        render_stats["wakeups"] += 1
+        force = False
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 going = False
             elif event.type == pygame.KEYDOWN and event.key in (pygame.K_ESCAPE, pygame.K_RETURN):
                 # Esc o Enter cierran la aplicación
                 going = False
+            elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                force = True
 
         now = time.time()
+        deadline = update_face(now)
+        if overlay is not None:
+            deadline = min(deadline, overlay.next_due(now))
+        render(force)
 
-        with change_lock:
-            # (1) Si hay un blink activo y ya venció, terminarlo SIEMPRE,
-            #     independientemente de la imagen actual.
-            if blink_active and now >= blink_end_time:
-                finish_blink()
-
-            # (2) Volver a neutral tras 2 s desde el último cambio por movimiento.
-            if (current_image is not neutral_image and
-                current_image is not blink_image and
-                (now - last_change) >= 2.0):
-                current_image = neutral_image
-
-            # (3) Si estamos en neutral y no hay blink activo, ¿toca iniciar uno?
-            if (current_image is neutral_image and
-                not blink_active and
-                now >= blink_next_time):
-                try_start_blink(now)
-
-            # (4) Si estamos en imagen de movimiento, aplaza el próximo blink para que
-            #     no intentemos iniciarlo durante la animación de movimiento.
-            if current_image is not neutral_image and current_image is not blink_image:
-                blink_next_time = now + BLINK_INTERVAL
-                # Caso borde: si, por alguna razón, hay blink activo y hemos cambiado a movimiento.
-                if blink_active:
-                    cancel_blink(now)
-
-        # Dibujar
-        screen.blit(current_image, (0, 0))
-        pygame.display.flip()
-        pygame.time.delay(50)   # 20 FPS para animación suave de blink
-
-finally:
-    # Al cerrar, apagar buzzer y liberar recursos
-    going = False
-    debug_sock.close()
-    pygame.quit()
-    GPIO.output(BUZZER_PIN, GPIO.HIGH)  # OFF
-    GPIO.cleanup()
+def main():
+    global going
+    try:
+        start()
+        run()
+    finally:
+        # Al cerrar, apagar buzzer y liberar recursos
+        going = False
+        boot.clear_ready()
+        if states is not None:
+            states.close()
+        pygame.quit()
+        buzzer.close()      # deja el buzzer en OFF
+        print(f"[DISPLAY] Buzzer {buzzer.stats()}")
+        if GPIO is not None:
+            GPIO.cleanup()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Caché de caras preprocesadas para display.py.
+
+Decodificar un BMP de 1.1 MB y escalarlo a la pantalla cuesta decenas de ms
+por cara en la BeagleBone. Aquí cada cara se procesa una sola vez y se guarda
+ya escalada y comprimida (zlib sobre los píxeles RGB) en
+
+    <caché>/<sha1 del BMP>-<ancho>x<alto>.face
+
+Si cambia el BMP cambia el hash, así una entrada vieja nunca se usa. Para no
+leer el BMP entero solo para hashearlo, <caché>/index.json recuerda el hash
+de cada ruta junto a su tamaño y mtime; mientras no cambien, arrancar lee
+solo las entradas comprimidas (~30 KB por cara en lugar de 1.1 MB). Dentro
+del proceso, dos rutas con el mismo contenido comparten la misma Surface, y
+`convert()` la pasa una vez al formato nativo de la pantalla para que los
+blits no conviertan píxeles en cada fotograma.
+
+Uso (pre-generar la caché, p.ej. al instalar):
+    python3 faces.py [--size 800x480] "Cara neutral.bmp" blink.bmp ...
+"""
+
+import hashlib
+import json
+import os
+import struct
+import threading
+import zlib
+
+import pygame
+
+CACHE_DIR   = os.environ.get("ROBOT_FACE_CACHE",
+                             os.path.join(os.path.dirname(os.path.abspath(__file__)), "face_cache"))
+CACHE_MAGIC = b"FACE"
+CACHE_HEAD  = struct.Struct("<4sHH")     # magia, ancho, alto; luego RGB comprimido
+ZLIB_LEVEL  = 6
+
+# pygame < 2.1.3 (el de Debian en la BeagleBone) solo tiene los nombres viejos
+_tobytes   = getattr(pygame.image, "tobytes", None) or pygame.image.tostring
+_frombytes = getattr(pygame.image, "frombytes", None) or pygame.image.fromstring
+
+def file_hash(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def process_rss() -> int:
+    """Memoria residente del proceso en bytes (0 si no hay /proc)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return 0
+
+class FaceCache:
+    """Caras escaladas a `size`, deduplicadas por contenido."""
+
+    def __init__(self, size, cache_dir: str = CACHE_DIR):
+        self.size      = tuple(size)
+        self.cache_dir = cache_dir
+        self.surfaces  = {}         # hash -> Surface
+        self.by_path   = {}         # ruta -> hash
+        self.lock      = threading.Lock()
+        self.converted = set()      # hashes ya en formato de pantalla
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.index     = self._load_index()     # ruta absoluta -> [tamaño, mtime_ns, hash]
+        self.index_dirty = False
+        # Contadores
+        self.hits   = 0
+        self.misses = 0
+        self.shared = 0
+
+    def _load_index(self) -> dict:
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+            return index if isinstance(index, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def save_index(self):
+        """Guarda el índice ruta -> hash si cambió (escritura atómica)."""
+        with self.lock:
+            if not self.index_dirty:
+                return
+            data = json.dumps(self.index, indent=0)
+            self.index_dirty = False
+        tmp = f"{self.index_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp, "w") as f:
+                f.write(data)
+            os.replace(tmp, self.index_path)
+        except OSError:
+            pass
+
+    def digest(self, path: str) -> str:
+        """Hash del contenido de `path`, sin leerlo si el índice está al día."""
+        key = os.path.abspath(path)
+        st = os.stat(path)
+        known = self.index.get(key)
+        if known and known[:2] == [st.st_size, st.st_mtime_ns]:
+            return known[2]
+        digest = file_hash(path)
+        with self.lock:
+            self.index[key] = [st.st_size, st.st_mtime_ns, digest]
+            self.index_dirty = True
+        return digest
+
+    def _entry(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, f"{digest}-{self.size[0]}x{self.size[1]}.face")
+
+    def _read(self, entry: str):
+        try:
+            with open(entry, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            magic, w, h = CACHE_HEAD.unpack_from(data)
+            if magic != CACHE_MAGIC or (w, h) != self.size:
+                return None
+            pixels = zlib.decompress(data[CACHE_HEAD.size:])
+            return _frombytes(pixels, self.size, "RGB")
+        except (struct.error, zlib.error, ValueError):
+            return None     # entrada corrupta: se regenera
+
+    def _write(self, entry: str, surface):
+        pixels = _tobytes(surface, "RGB")
+        data = CACHE_HEAD.pack(CACHE_MAGIC, *self.size) + zlib.compress(pixels, ZLIB_LEVEL)
+        tmp = f"{entry}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, entry)
+        except OSError:
+            # Sin caché en disco (p.ej. solo lectura): se sigue funcionando
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+    def load(self, path: str):
+        """Surface de la cara en `path`, escalada a `size`."""
+        digest = self.by_path.get(path) or self.digest(path)
+        with self.lock:
+            self.by_path[path] = digest
+            surface = self.surfaces.get(digest)
+            if surface is not None:
+                self.shared += 1
+                return surface
+        entry = self._entry(digest)
+        surface = self._read(entry)
+        if surface is None:
+            surface = pygame.transform.scale(pygame.image.load(path), self.size)
+            self._write(entry, surface)
+            self.misses += 1
+        else:
+            self.hits += 1
+        with self.lock:
+            # Si otro hilo cargó la misma cara a la vez, gana la primera
+            return self.surfaces.setdefault(digest, surface)
+
+    def convert(self, path: str):
+        """Como load(), pero en el formato de la pantalla (requiere
+           pygame.display.set_mode() previo). La conversión se hace una vez
+           por contenido y se comparte.
+        """
+        surface = self.load(path)
+        digest = self.by_path[path]
+        with self.lock:
+            if digest in self.converted:
+                return self.surfaces[digest]
+        native = surface.convert()
+        with self.lock:
+            if digest not in self.converted:
+                self.surfaces[digest] = native
+                self.converted.add(digest)
+            return self.surfaces[digest]
+
+    def stats(self) -> dict:
+        return {"faces": len(self.surfaces), "paths": len(self.by_path), "hits": self.hits,
+                "misses": self.misses, "shared": self.shared,
+                "bytes": sum(s.get_bytesize() * s.get_width() * s.get_height()
+                             for s in self.surfaces.values())}
+
+def main():
+    import argparse
+    ap = argparse.ArgumentParser(description="Pre-genera la caché de caras")
+    ap.add_argument("paths", nargs="+")
+    ap.add_argument("--size", default="800x480")
+    args = ap.parse_args()
+    w, h = (int(v) for v in args.size.lower().split("x"))
+    cache = FaceCache((w, h))
+    for p in args.paths:
+        cache.load(p)
+        print(f"[FACES] {p} -> {cache._entry(cache.by_path[p])}")
+    cache.save_index()
+    print(f"[FACES] {cache.stats()}")
+
+if __name__ == "__main__":
+    main()
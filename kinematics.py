@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Cinemática incremental de las muestras de encoder (la usa main.py).
+
+Por cada muestra {"axis":N,"pos":M} se calcula, en O(1):
+
+  - ángulo de la articulación (grados, con el cero de HOME_DEG);
+  - velocidad: pendiente entre la muestra nueva y la más antigua de una
+    ventana de KIN_WINDOW muestras del eje (media móvil de la derivada);
+  - aceleración: derivada de esa velocidad, filtrada con una media
+    exponencial (KIN_ACC_ALPHA);
+  - posición del efector (x, y, z en mm) por cinemática directa del brazo
+    de 3 ejes: base que gira en z, segmento 1 con pivote a LINKS_MM[0] de
+    altura, segmento 2 articulado en el extremo del 1.
+
+El seno y el coseno de cada eje se guardan con la posición en cuentas que
+los produjo: una muestra solo recalcula los del eje que se movió, y un eje
+parado no recalcula nada.
+
+Banderas por eje, evaluadas en cada muestra:
+
+  - overspeed: |velocidad| > max_vel;
+  - stall: desde la última vez que el eje avanzó STALL_MIN_DEG se le han
+    ordenado pasos por STALL_CMD_DEG o más (`commanded(axis)` da los pasos
+    ejecutados según la cola de movimientos) y el encoder no se ha movido.
+
+Durante un move solo hay muestras si el firmware las envía ("track <ms>",
+ver main.py); sin ellas las banderas no pueden aparecer en una reproducción.
+
+`on_flags(axis, flags, state)` se llama cuando aparece una bandera, en el
+mismo hilo que la muestra, así quien reproduce puede parar antes del siguiente
+paso.
+"""
+
+import math
+from collections import deque
+
+from statebus import ENC_COUNTS_PER_REV, STEPS_PER_REV
+
+# Geometría (configurable desde main.py con ROBOT_LINKS_MM / ROBOT_KIN_HOME_DEG)
+LINKS_MM  = (90.0, 150.0, 150.0)     # altura del hombro, segmento 1, segmento 2
+HOME_DEG  = (0.0, 90.0, -90.0)       # ángulo de cada eje con el encoder en 0
+
+KIN_WINDOW     = 4        # muestras por eje para la velocidad
+KIN_ACC_ALPHA  = 0.5      # media exponencial de la aceleración
+KIN_GAP_S      = 5.0      # hueco entre muestras que reinicia la ventana
+MAX_VEL_DEG_S  = 120.0    # moveMotor da ~94 °/s (1.2 ms por paso, 3200 pasos/vuelta)
+STALL_MIN_DEG  = 1.0      # avance del encoder que cuenta como movimiento
+STALL_CMD_DEG  = 5.0      # pasos ordenados (en grados) sin ese avance
+
+FLAG_STALL     = 1
+FLAG_OVERSPEED = 2
+FLAG_NAMES     = {FLAG_STALL: "stall", FLAG_OVERSPEED: "overspeed"}
+
+DEG_PER_COUNT = 360.0 / ENC_COUNTS_PER_REV
+DEG_PER_STEP  = 360.0 / STEPS_PER_REV
+
+def flag_names(flags: int):
+    return [name for bit, name in FLAG_NAMES.items() if flags & bit]
+
+class AxisTrack:
+    """Estado incremental de un eje."""
+    __slots__ = ("window", "deg", "vel", "acc", "flags", "last_ts",
+                 "anchor_deg", "anchor_cmd", "samples")
+
+    def __init__(self, window=KIN_WINDOW):
+        self.window     = deque(maxlen=window)   # (ts, deg)
+        self.deg        = None
+        self.vel        = 0.0
+        self.acc        = 0.0
+        self.flags      = 0
+        self.last_ts    = None
+        self.anchor_deg = None    # última posición en que se vio avance
+        self.anchor_cmd = 0.0     # pasos ejecutados en ese momento
+        self.samples    = 0
+
+    def as_dict(self) -> dict:
+        return {"deg": self.deg, "vel": round(self.vel, 3), "acc": round(self.acc, 3),
+                "flags": flag_names(self.flags), "samples": self.samples}
+
+class Kinematics:
+    """Etapa de cinemática. `update()` se llama desde el hilo del puerto
+       serie y devuelve (deg, vel, acc, flags, x, y, z) de la muestra.
+       `commanded(axis)` da los pasos ejecutados en el eje hasta ahora.
+    """
+    def __init__(self, links=LINKS_MM, home=HOME_DEG, axes=(1, 2, 3),
+                 max_vel=MAX_VEL_DEG_S, commanded=None, on_flags=None,
+                 window=KIN_WINDOW):
+        self.links     = tuple(float(v) for v in links)
+        self.home      = {ax: float(h) for ax, h in zip(axes, home)}
+        self.max_vel   = max_vel
+        self.commanded = commanded or (lambda axis: 0.0)
+        self.on_flags  = on_flags
+        self.tracks    = {ax: AxisTrack(window) for ax in axes}
+        # Cinemática directa con trigonometría cacheada por eje
+        self._counts   = {ax: 0 for ax in axes}           # cuentas de la última muestra
+        self._trig     = {ax: self._sincos(ax, 0) for ax in axes}
+        self._planar   = None                             # (r, z), depende de los ejes 2 y 3
+        self.trig_calls = 0
+
+    # ---------- cinemática directa ----------
+    def _joint_deg(self, axis: int, counts: int) -> float:
+        return self.home[axis] + counts * DEG_PER_COUNT
+
+    def _sincos(self, axis: int, counts: int):
+        a = math.radians(self._joint_deg(axis, counts))
+        return math.sin(a), math.cos(a)
+
+    def _set_counts(self, axis: int, counts: int):
+        if self._counts.get(axis) == counts:
+            return
+        self._counts[axis] = counts
+        self._trig[axis]   = self._sincos(axis, counts)
+        self.trig_calls   += 1
+        if axis != 1:
+            self._planar = None
+
+    def pose(self):
+        """(x, y, z) del efector en mm con las últimas posiciones."""
+        if self._planar is None:
+            h, l1, l2 = self.links
+            s2, c2 = self._trig[2]
+            s3, c3 = self._trig[3]
+            # ángulo del segmento 2 = eje 2 + eje 3 (relativo al segmento 1)
+            s23 = s2 * c3 + c2 * s3
+            c23 = c2 * c3 - s2 * s3
+            self._planar = (l1 * c2 + l2 * c23, h + l1 * s2 + l2 * s23)
+        r, z = self._planar
+        s1, c1 = self._trig[1]
+        return r * c1, r * s1, z
+
+    # ---------- muestras ----------
+    def update(self, axis: int, counts: int, ts: float):
+        tr = self.tracks.get(axis)
+        if tr is None:
+            return None
+        deg = self._joint_deg(axis, counts)
+        win = tr.window
+        if tr.last_ts is not None and not 0.0 < ts - tr.last_ts < KIN_GAP_S:
+            # Reloj hacia atrás o grabación nueva: no derivar entre sesiones
+            win.clear()
+            tr.vel = tr.acc = 0.0
+            tr.anchor_deg = None
+        if win:
+            t_old, d_old = win[0]
+            vel = (deg - d_old) / (ts - t_old)
+            if len(win) > 1:                      # hay una velocidad anterior
+                tr.acc += KIN_ACC_ALPHA * ((vel - tr.vel) / (ts - tr.last_ts) - tr.acc)
+            tr.vel = vel
+        win.append((ts, deg))
+        tr.deg     = deg
+        tr.last_ts = ts
+        tr.samples += 1
+        self._set_counts(axis, counts)
+
+        flags = FLAG_OVERSPEED if abs(tr.vel) > self.max_vel else 0
+        cmd = self.commanded(axis)
+        if tr.anchor_deg is None or abs(deg - tr.anchor_deg) >= STALL_MIN_DEG:
+            tr.anchor_deg, tr.anchor_cmd = deg, cmd
+        elif (cmd - tr.anchor_cmd) * DEG_PER_STEP >= STALL_CMD_DEG:
+            flags |= FLAG_STALL
+        x, y, z = self.pose()
+        state = (deg, tr.vel, tr.acc, flags, x, y, z)
+        if flags != tr.flags:
+            changed, tr.flags = flags ^ tr.flags, flags
+            if self.on_flags and flags & changed:
+                self.on_flags(axis, flags, state)
+        return state
+
+    def snapshot(self) -> dict:
+        x, y, z = self.pose()
+        return {"links_mm": list(self.links), "home_deg": self.home,
+                "max_vel": self.max_vel, "window": KIN_WINDOW,
+                "xyz": [round(x, 2), round(y, 2), round(z, 2)],
+                "axes": {ax: tr.as_dict() for ax, tr in self.tracks.items()},
+                "trig_calls": self.trig_calls}
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Registro por niveles fuera de los caminos calientes.
+
+Una llamada a `log.info(tag, msg, *args)` solo comprueba el nivel y mete
+una tupla en una cola; el formateo (`msg % args`) y la escritura en stdout
+los hace un hilo de fondo. Así un print lento (consola serie, journald) no
+añade latencia al UART ni jitter a la reproducción.
+
+El hilo limita cuántas veces por segundo se repite un mismo mensaje (misma
+etiqueta y misma plantilla, antes de aplicar los argumentos); lo que sobra
+se cuenta y se resume en una línea por mensaje al cerrar la ventana.
+Mensajes distintos de una etiqueta muy activa (SERIAL, MOTION) no se
+tapan entre sí. Nivel y límite se pueden cambiar en caliente.
+"""
+
+import sys
+import threading
+import time
+from collections import deque
+
+DEBUG, INFO, WARN, ERROR = 10, 20, 30, 40
+LEVELS   = {"debug": DEBUG, "info": INFO, "warn": WARN, "error": ERROR}
+PREFIXES = {DEBUG: "", INFO: "", WARN: "[WARN]", ERROR: "[ERR]"}
+
+QUEUE_MAX     = 4096     # registros pendientes; al llenarse se pierden los más viejos
+RATE_DEFAULT  = 50       # repeticiones/s de un mismo mensaje (0 = sin límite)
+SUMMARY_CHARS = 60       # plantilla mostrada en el resumen de suprimidos
+FLUSH_TIMEOUT = 0.5
+
+class Logger:
+    def __init__(self, level: str = "info", rate: int = RATE_DEFAULT, stream=None):
+        self.level   = LEVELS[level]
+        self.rate    = rate
+        self.stream  = stream or sys.stdout
+        self._queue  = deque(maxlen=QUEUE_MAX)
+        self._wake   = threading.Event()
+        self._stop   = False
+        self._thread = None
+        # Contadores (los escribe solo el hilo de fondo, salvo `queued`)
+        self.queued     = 0
+        self.written    = 0
+        self.suppressed = 0
+        self.lost       = 0
+        # Ventana del limitador: (etiqueta, plantilla) -> [líneas, suprimidas]
+        self._window    = {}
+        self._window_t0 = time.monotonic()
+
+    # ---------- configuración ----------
+    def set_level(self, level: str):
+        if level not in LEVELS:
+            raise ValueError(f"nivel inválido: {level!r} (use {', '.join(LEVELS)})")
+        self.level = LEVELS[level]
+
+    def set_rate(self, rate: int):
+        rate = int(rate)
+        if rate < 0:
+            raise ValueError(f"límite inválido: {rate}")
+        self.rate = rate
+
+    def enabled(self, level: int) -> bool:
+        return level >= self.level
+
+    def config(self) -> dict:
+        name = next(n for n, v in LEVELS.items() if v == self.level)
+        return {"level": name, "rate": self.rate, "queued": self.queued,
+                "written": self.written, "suppressed": self.suppressed, "lost": self.lost,
+                "pending": len(self._queue)}
+
+    # ---------- llamadas desde cualquier hilo ----------
+    def log(self, level: int, tag: str, msg: str, *args):
+        if level < self.level:
+            return
+        if len(self._queue) == QUEUE_MAX:
+            self.lost += 1
+        self._queue.append((time.monotonic(), level, tag, msg, args))
+        self.queued += 1
+        if self._thread is None:
+            self._drain()               # aún sin hilo (arranque): escribe directo
+        elif not self._wake.is_set():
+            self._wake.set()
+
+    def debug(self, tag, msg, *args):
+        self.log(DEBUG, tag, msg, *args)
+
+    def info(self, tag, msg, *args):
+        self.log(INFO, tag, msg, *args)
+
+    def warn(self, tag, msg, *args):
+        self.log(WARN, tag, msg, *args)
+
+    def error(self, tag, msg, *args):
+        self.log(ERROR, tag, msg, *args)
+
+    # ---------- hilo de escritura ----------
+    def _roll_window(self, now: float, out: list):
+        if now - self._window_t0 >= 1.0:
+            for (tag, msg), (_, dropped) in self._window.items():
+                if dropped:
+                    text = msg if len(msg) <= SUMMARY_CHARS else msg[:SUMMARY_CHARS] + "..."
+                    out.append(f"[LOG] {tag}: {dropped} repeticiones suprimidas en 1 s: {text}")
+            self._window.clear()
+            self._window_t0 = now
+
+    def _allow(self, tag: str, msg: str, now: float, out: list) -> bool:
+        self._roll_window(now, out)
+        if not self.rate:
+            return True
+        w = self._window.setdefault((tag, msg), [0, 0])
+        if w[0] >= self.rate:
+            w[1] += 1
+            self.suppressed += 1
+            return False
+        w[0] += 1
+        return True
+
+    def _format(self, level, tag, msg, args) -> str:
+        if args:
+            try:
+                msg = msg % args
+            except (TypeError, ValueError):
+                msg = f"{msg} {args!r}"
+        return f"{PREFIXES[level]}[{tag}] {msg}"
+
+    def _drain(self):
+        out = []
+        q = self._queue
+        while q:
+            try:
+                t, level, tag, msg, args = q.popleft()
+            except IndexError:
+                break
+            # Los errores no se limitan nunca
+            if level >= ERROR or self._allow(tag, msg, t, out):
+                out.append(self._format(level, tag, msg, args))
+        self._roll_window(time.monotonic(), out)
+        if out:
+            try:
+                self.stream.write("\n".join(out) + "\n")
+                self.stream.flush()
+            except (OSError, ValueError):
+                pass
+            self.written += len(out)
+
+    def _run(self):
+        while not self._stop:
+            self._wake.wait(FLUSH_TIMEOUT)
+            self._wake.clear()
+            self._drain()
+        self._drain()
+
+    def start(self):
+        if self._thread is None:
+            self._stop   = False
+            self._thread = threading.Thread(target=self._run, name="log", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Vacía lo pendiente y detiene el hilo."""
+        if self._thread is not None:
+            self._stop = True
+            self._wake.set()
+            self._thread.join(2.0)
+            self._thread = None
+        self._drain()
@@ -2,345 +2,1018 @@
 # -*- coding: utf-8 -*-
 
 import os
-import socket
+import math
+import asyncio
 import threading
 import json
 import serial
-import Adafruit_BBIO.UART as UART
-import subprocess
+import signal
 import time
 import traceback
+import queue
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import Adafruit_BBIO.UART as UART
+except ImportError:     # fuera de la BeagleBone (p.ej. contra arduino_sim.py)
+    UART = None
+
+from boot import Boot
+from commands import CommandError, CommandRegistry, Field, Request
+from kinematics import HOME_DEG, LINKS_MM, Kinematics, flag_names
+from logpipe import DEBUG, Logger
+from metrics import Registry
+from motion import MOVE_SETTLE_S, STEP_PERIOD_S, MotionQueue
+from playback import PlaybackEngine, merge_timelines
+from statebus import (ENC_COUNTS_PER_REV, KIND_COMMAND, KIND_EVENT, STEPS_PER_REV,
+                      StateBus, StateMessage)
+from trajectory import INTERP_METHODS, Trajectory, TrajectoryLibrary, compile_plan, serial_end
 
 # ===========================
 #  Constantes / Escalado PBD
 # ===========================
-ENC_COUNTS_PER_REV = 65536.0   # 1 vuelta encoder
-STEPS_PER_REV      = 3200.0    # 1 vuelta driver (comando move)
-REV_DELAY_SEC      = 5.0       # 1 vuelta = 5 s (para pbd move por vueltas)
+# ENC_COUNTS_PER_REV / STEPS_PER_REV: ver statebus.py
+
+# Grabación PBD
+RECORD_RATE_DEFAULT_HZ = 1.0      # sampleInterval histórico del firmware (1000 ms)
+RECORD_MIN_INTERVAL_MS = 10       # límite inferior aceptado por robot_arm.ino
+SERIAL_BAUD            = 38400
+SAMPLE_LINE_BYTES      = 26       # '{"axis":N,"pos":-NNNNNN}\r\n' en el peor caso
+# Muestras/s que caben en el UART dejando margen para comandos y respuestas
+RECORD_MAX_LINES_PER_S = 0.8 * SERIAL_BAUD / 10 / SAMPLE_LINE_BYTES
+COUNTS_PER_STEP    = ENC_COUNTS_PER_REV / STEPS_PER_REV   # 20.48 cuentas por paso
+
+# Compilador de trayectorias (ver trajectory.compile_plan)
+PLAN_TOLERANCE_COUNTS = 2 * COUNTS_PER_STEP   # desviación máxima al simplificar
+PLAN_MIN_STEPS        = 4                     # tramos menores se juntan con el siguiente
+
+# Reproducción escalada/remuestreada (play con "speed", "rate_hz", "interp")
+PLAY_SPEED_MAX   = 5.0      # factor de velocidad máximo
+PLAY_RATE_MAX_HZ = 10.0     # cada move cuesta ≥100 ms en el firmware
+
+def env_floats(name: str, default):
+    """Variable de entorno "a,b,c" como tupla de floats (o `default`)."""
+    value = os.environ.get(name)
+    if not value:
+        return tuple(default)
+    values = tuple(float(v) for v in value.split(","))
+    if len(values) != len(default):
+        raise ValueError(f"{name} necesita {len(default)} valores: {value!r}")
+    return values
+
+# Cinemática (kinematics.py): geometría del brazo en mm, ángulo de cada eje
+# con el encoder en 0, y qué hace la reproducción ante stall/overspeed
+KIN_LINKS_MM     = env_floats("ROBOT_LINKS_MM", LINKS_MM)
+KIN_HOME_DEG     = env_floats("ROBOT_KIN_HOME_DEG", HOME_DEG)
+KIN_FAULT_ACTION = os.environ.get("ROBOT_KIN_FAULT", "abort")   # abort | pause | off
+# ms entre muestras que el firmware envía durante un move ("track <ms>"):
+# sin ellas stall/overspeed no se ven en una reproducción. 0 = no se pide
+KIN_TRACK_MS     = max(0, int(os.environ.get("ROBOT_KIN_TRACK_MS", "100")))
+if KIN_FAULT_ACTION == "off":
+    KIN_TRACK_MS = 0
+
+# Coste de cada move en el firmware además de sus pasos y el delay(100): la
+# línea "move" y su {"done":N} por el UART, la muestra final de "track" y el
+# despacho de MotionQueue. Con "track" los pasos van algo más lentos: cada
+# KIN_TRACK_MS se para a leer el encoder y enviar la muestra
+PLAN_DISPATCH_S      = 0.002
+SAMPLE_LINE_S        = SAMPLE_LINE_BYTES * 10.0 / SERIAL_BAUD
+PLAN_MOVE_OVERHEAD_S = (PLAN_DISPATCH_S + (len("move 1 1000 f\n") + len('{"done":1}\r\n')) * 10.0
+                        / SERIAL_BAUD + (SAMPLE_LINE_S if KIN_TRACK_MS else 0.0))
+PLAN_STEP_RATE       = 1.0 / STEP_PERIOD_S
+if KIN_TRACK_MS:
+    PLAN_STEP_RATE *= KIN_TRACK_MS / (KIN_TRACK_MS + SAMPLE_LINE_S * 1000.0)
+PLAY_OVERRUN_WARN    = 1.10     # aviso si el firmware no puede seguir el plan
+
+# Puertos TCP
+CMD_PORT   = 6000   # comandos (JSON por línea)
+STATE_PORT = 6001   # difusión de estado
+
+# Arranque: tiempo máximo hasta "listo" (medido en la BeagleBone con
+# bench/bench_startup.py; incluye intérprete e imports)
+COLD_START_TARGET_S = 2.0
+
+# Registro: nivel inicial (debug|info|warn|error) y repeticiones/s de un mismo mensaje.
+# Se cambian en caliente con {"cmd":"log","level":...,"rate":...}
+LOG_LEVEL = os.environ.get("ROBOT_LOG_LEVEL", "info")
+LOG_RATE  = 50
+log  = Logger(LOG_LEVEL, LOG_RATE).start()
+boot = Boot("main", COLD_START_TARGET_S)
 
 # ==================================
 #  UART hacia Arduino (BeagleBone)
 # ==================================
 # UART4 en P9_11/P9_13  -> /dev/ttyS4
-UART.setup("UART4")
-ser = serial.Serial(port="/dev/ttyS4", baudrate=38400, timeout=1)
-ser.close()
-ser.open()
-time.sleep(0.1)
-ser.reset_input_buffer()
-ser.reset_output_buffer()
-print("[UART] Abierto /dev/ttyS4 @38400")
+# ROBOT_SERIAL_PORT permite usar otro puerto, p.ej. el pty de arduino_sim.py
+SERIAL_PORT = os.environ.get("ROBOT_SERIAL_PORT", "/dev/ttyS4")
+ser = None      # se abre en open_uart(), durante el arranque
+
+def open_uart():
+    """Configura UART4 (overlay del BeagleBone) y abre el puerto serie."""
+    global ser
+    if UART is not None and SERIAL_PORT == "/dev/ttyS4":
+        UART.setup("UART4")
+    port = serial.Serial(port=SERIAL_PORT, baudrate=SERIAL_BAUD, timeout=1)
+    time.sleep(0.1)
+    port.reset_input_buffer()
+    port.reset_output_buffer()
+    ser = port
+    uart_writer.port = port
+    log.info("UART", "Abierto %s @%d", SERIAL_PORT, SERIAL_BAUD)
+    return port
+
+# ==================================
+#  Bucle asyncio y ejecutores
+# ==================================
+# Un único bucle de eventos atiende los puertos 6000/6001. La lectura del
+# UART corre en un ejecutor de un solo hilo y la escritura en UartWriter.
+loop          = None                      # se asigna en serve()
+stop_event    = threading.Event()         # detiene serial_reader al salir
+serial_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="serial")
+
+# ==================================
+#  Instrumentación (sondas de latencia)
+# ==================================
+# Histogramas de cubetas fijas por etapa; se consultan con {"cmd":"stats"}
+probes = Registry()
+H_SERIAL_CHUNK   = probes.histogram("serial.chunk")       # procesar un bloque leído
+H_SERIAL_PARSE   = probes.histogram("serial.parse")       # parsear una línea
+H_BROADCAST      = probes.histogram("broadcast.fanout")   # encolar en todos los suscriptores
+H_STATE_WAIT     = probes.histogram("state.queue_wait")   # espera en la cola del suscriptor
+H_CMD_DISPATCH   = probes.histogram("command.dispatch")   # ejecutar un comando del 6000
+H_UART_QUEUE     = probes.histogram("uart.queue")         # de encolar a salir por el cable
+H_UART_WRITE     = probes.histogram("uart.write")         # write + flush de un lote
+H_PLAY_LATE      = probes.histogram("play.late")          # retraso de cada paso de reproducción
+H_KINEMATICS     = probes.histogram("kinematics.update")  # velocidad/aceleración/pose de una muestra
+C_SERIAL_LINES   = probes.counter("serial.lines")
+C_STATE_MESSAGES = probes.counter("state.messages")
+C_COMMANDS       = probes.counter("command.count")
+C_UART_COMMANDS  = probes.counter("uart.commands")
 
 # ==================================
 #  Clientes suscritos al estado
 # ==================================
-state_clients = []
-state_lock    = threading.Lock()
+# Mensajes, suscriptores y política de desborde viven en statebus.py
+state_bus = StateBus(on_wait=H_STATE_WAIT.record, log=log)
+
+def broadcast(message, kind: str = KIND_COMMAND):
+    """Envía `message` (str JSON o StateMessage) a los clientes suscritos
+       (puerto 6001) que lo acepten. Se puede llamar desde cualquier hilo;
+       solo encola, nunca toca la red.
+    """
+    t0 = time.perf_counter()
+    if not isinstance(message, StateMessage):
+        message = StateMessage(kind, text=message)
+    state_bus.publish(message)
+    H_BROADCAST.record(time.perf_counter() - t0)
+    C_STATE_MESSAGES.add()
+
+# ==================================
+#  Escritor del UART
+# ==================================
+# Prioridades de la cola (menor = antes)
+PRIO_URGENT = 0     # bomba/solenoide, pbd start/stop, record start/stop
+PRIO_NORMAL = 1     # comandos de GUI / jog
+PRIO_BULK   = 2     # movimientos (uno en vuelo, ver MotionQueue)
+_PRIO_STOP  = 99    # centinela: se procesa después de todo lo pendiente
+
+UART_BATCH_MAX_BYTES = 64   # buffer de recepción del Arduino
+
+class UartWriter:
+    """Único dueño de la escritura en `ser`. Toma comandos de una cola con
+       prioridad, junta los que estén pendientes en una sola escritura y mide
+       el tiempo desde que se encolan hasta que salen por el cable.
+    """
+    def __init__(self, port):
+        self.port   = port
+        self.queue  = queue.PriorityQueue()
+        self._seq   = itertools.count()
+        self.thread = threading.Thread(target=self.run, name="uart-writer", daemon=True)
+        # Contadores
+        self.commands       = 0
+        self.batches        = 0
+        self.bytes          = 0
+        self.errors         = 0
+        self.latency_last   = 0.0
+        self.latency_max    = 0.0
+        self.latency_total  = 0.0
 
-def broadcast(message: str):
-    """Envía `message` (str) a todos los clientes suscritos (puerto 6001)."""
-    with state_lock:
-        for client in state_clients[:]:
+    def start(self):
+        self.thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        """Escribe lo pendiente y termina el hilo."""
+        if self.thread.is_alive():
+            self.queue.put((_PRIO_STOP, next(self._seq), 0.0, None, None))
+            self.thread.join(timeout)
+
+    def submit(self, line: str, prio: int = PRIO_NORMAL, on_sent=None):
+        """Encola `line` (sin '\\n'). No bloquea; seguro desde cualquier hilo.
+           `on_sent(error)` se llama desde el hilo escritor cuando la línea
+           sale por el cable (error=None) o falla la escritura.
+        """
+        self.queue.put((prio, next(self._seq), time.perf_counter(), line, on_sent))
+
+    def _next_batch(self):
+        """Bloquea hasta el primer comando y añade los pendientes que quepan."""
+        first = self.queue.get()
+        if first[3] is None:
+            return None
+        batch = [first]
+        size  = len(first[3]) + 1
+        while True:
             try:
-                client.sendall((message + "\n").encode())
-            except Exception:
-                try:
-                    client.close()
-                except Exception:
-                    pass
-                state_clients.remove(client)
-
-def send_uart(line: str):
-    """Envía un comando al Arduino por UART (agrega '\\n')."""
-    try:
-        msg = (line + "\n").encode()
-        ser.reset_output_buffer()
-        ser.write(msg)
-        ser.flush()
-        print(f"[UART->ARD] {line}")
-    except Exception as e:
-        print(f"[ERR][UART send] {e}")
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item[3] is None or size + len(item[3]) + 1 > UART_BATCH_MAX_BYTES:
+                self.queue.put(item)    # conserva su orden (prio, seq)
+                break
+            batch.append(item)
+            size += len(item[3]) + 1
+        return batch
+
+    def run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            lines = [item[3] for item in batch]
+            data  = ("\n".join(lines) + "\n").encode()
+            t_write = time.perf_counter()
+            try:
+                self.port.write(data)
+                self.port.flush()
+            except Exception as e:
+                self.errors += 1
+                log.error("UART", "send: %s", e)
+                for item in batch:
+                    if item[4]:
+                        item[4](str(e))
+                continue
+            now = time.perf_counter()
+            H_UART_WRITE.record(now - t_write)
+            C_UART_COMMANDS.add(len(batch))
+            for item in batch:
+                lat = now - item[2]
+                H_UART_QUEUE.record(lat)
+                self.latency_total += lat
+                if lat > self.latency_max:
+                    self.latency_max = lat
+                if item[4]:
+                    item[4](None)
+            self.latency_last = now - batch[-1][2]
+            self.commands += len(batch)
+            self.batches  += 1
+            self.bytes    += len(data)
+            if log.enabled(DEBUG):
+                log.debug("UART->ARD", " | ".join(lines))
+
+    def stats(self) -> dict:
+        return {
+            "depth":          self.queue.qsize(),
+            "commands":       self.commands,
+            "batches":        self.batches,
+            "bytes":          self.bytes,
+            "errors":         self.errors,
+            "latency_last_ms": round(self.latency_last * 1000, 3),
+            "latency_avg_ms":  round(self.latency_total / self.commands * 1000, 3) if self.commands else 0.0,
+            "latency_max_ms":  round(self.latency_max * 1000, 3),
+        }
+
+uart_writer = UartWriter(None)      # el puerto se asigna en open_uart()
+
+def send_uart(line: str, prio: int = PRIO_NORMAL, on_sent=None):
+    """Envía un comando al Arduino por UART (agrega '\\n').
+       No bloquea: lo encola en `uart_writer` con la prioridad dada.
+    """
+    uart_writer.submit(line, prio, on_sent)
+
+# Movimientos: uno en vuelo a la vez (el firmware bloquea loop() durante
+# el move), el resto en la cola de su eje. Los fines se difunden en el 6001.
+def motion_event(ev: dict):
+    if ev["event"] == "backlog":
+        log.warn("MOTION", "%d moves en cola, %.1fs de movimiento pendiente",
+                 ev["queued"], ev["queued_s"])
+    broadcast(json.dumps(ev), KIND_EVENT)
+
+motion = MotionQueue(lambda line: send_uart(line, PRIO_BULK), on_event=motion_event,
+                     line_time=lambda line: (len(line) + 1) * 10.0 / SERIAL_BAUD)
 
 # ==================================
 #  Estado PBD y trayectoria
 # ==================================
 pbd_is_recording = False
-pbd_record_axis  = None
-pbd_traj = {1: [], 2: [], 3: []}   # cada eje: lista de [t_rel, pos_encoder]
-pbd_t0   = {1: None, 2: None, 3: None}
+pbd_record_axes  = frozenset()     # ejes que se graban a la vez
+pbd_record_rate  = 1.0             # Hz por eje pedidos al Arduino
+pbd_record_t0    = None            # t0 común a todos los ejes grabados
+pbd_traj = {1: Trajectory(), 2: Trajectory(), 3: Trajectory()}   # columnas t_rel / pos_encoder
 
-def counts_to_steps(delta_counts: int) -> int:
-    """Convierte delta de cuentas de encoder a pasos de driver (firma preserva signo)."""
-    return int(round(delta_counts / ENC_COUNTS_PER_REV * STEPS_PER_REV))
+# Biblioteca de demostraciones con nombre (persistente entre reinicios)
+PBD_LIBRARY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pbd_library")
+pbd_library = TrajectoryLibrary(PBD_LIBRARY_DIR)
 
 # ==================================
 #  Lector del puerto serie (Arduino)
 # ==================================
+SERIAL_READ_MAX  = 4096     # bytes máximos por lectura
+SERIAL_LINE_MAX  = 512      # una línea más larga se descarta como basura
+SAMPLE_PREFIX    = b'{"axis":'
+SAMPLE_POS_SEP   = b',"pos":'
+
+class IngestStats:
+    """Contadores de ingesta del UART. Solo los actualiza serial_reader."""
+    def __init__(self):
+        self.bytes        = 0
+        self.lines        = 0
+        self.samples      = 0
+        self.slow_path    = 0     # líneas que necesitaron json.loads
+        self.parse_errors = 0
+        self.bytes_per_s  = 0.0
+        self.lines_per_s  = 0.0
+        self._t_last      = time.monotonic()
+        self._bytes_last  = 0
+        self._lines_last  = 0
+
+    def tick(self, now: float):
+        """Recalcula las tasas como mucho una vez por segundo."""
+        dt = now - self._t_last
+        if dt < 1.0:
+            return
+        self.bytes_per_s = (self.bytes - self._bytes_last) / dt
+        self.lines_per_s = (self.lines - self._lines_last) / dt
+        self._t_last     = now
+        self._bytes_last = self.bytes
+        self._lines_last = self.lines
+
+    def as_dict(self) -> dict:
+        return {
+            "bytes":        self.bytes,
+            "lines":        self.lines,
+            "samples":      self.samples,
+            "slow_path":    self.slow_path,
+            "parse_errors": self.parse_errors,
+            "bytes_per_s":  round(self.bytes_per_s, 1),
+            "lines_per_s":  round(self.lines_per_s, 1),
+        }
+
+ingest_stats = IngestStats()
+
+def parse_sample(line: bytes):
+    """Parser rápido para la forma exacta {"axis":N,"pos":M} que emite el
+       Arduino. Devuelve (axis, pos) o None si la línea tiene otra forma.
+    """
+    if not (line.startswith(SAMPLE_PREFIX) and line.endswith(b"}")):
+        return None
+    sep = line.find(SAMPLE_POS_SEP, len(SAMPLE_PREFIX))
+    if sep < 0:
+        return None
+    try:
+        return int(line[len(SAMPLE_PREFIX):sep]), int(line[sep + len(SAMPLE_POS_SEP):-1])
+    except ValueError:
+        return None
+
+def handle_sample(axis: int, pos: int, ts: float):
+    """Difunde una muestra de encoder y su cinemática, y la guarda si se
+       está grabando ese eje.
+    """
+    global pbd_record_t0
+    # Muestra escalada (rev, steps, deg): se codifica solo en los
+    # formatos que pidan los suscriptores
+    broadcast(StateMessage.sample(axis, ts, pos))
+
+    # Velocidad, aceleración y pose del efector (O(1); puede parar la reproducción)
+    t0 = time.perf_counter()
+    kin_state = kinematics.update(axis, pos, ts)
+    H_KINEMATICS.record(time.perf_counter() - t0)
+    if kin_state is not None:
+        broadcast(StateMessage.kinematics(axis, ts, kin_state))
+
+    # Si estamos grabando este eje, guardamos trayectoria
+    if pbd_is_recording and axis in pbd_record_axes:
+        if pbd_record_t0 is None:
+            pbd_record_t0 = ts
+            log.info("PBD", "t0 ejes %s = %.3f", sorted(pbd_record_axes), pbd_record_t0)
+        traj = pbd_traj[axis]
+        traj.append(ts - pbd_record_t0, pos)
+        # Como mucho un aviso por segundo y eje, sin importar la frecuencia
+        if len(traj) % max(10, int(pbd_record_rate)) == 0:
+            log.debug("PBD", "eje %d: %d muestras almacenadas", axis, len(traj))
+
+def handle_serial_line(line: bytes):
+    """Procesa una línea completa (sin '\\n') recibida del Arduino."""
+    stats = ingest_stats
+    stats.lines += 1
+    C_SERIAL_LINES.add()
+    t0 = time.perf_counter()
+    line = line.strip()
+    # Esperamos líneas JSON válidas desde Arduino (solo datos correctos)
+    if not line.startswith(b"{"):
+        # Puedes ver otras notificaciones aquí si las hubiera
+        return
+    parsed = parse_sample(line)
+    if parsed is None:
+        # Camino lento: cualquier otro JSON ({"record":"start"}, etc.)
+        stats.slow_path += 1
+        try:
+            obj = json.loads(line)
+        except ValueError:
+            stats.parse_errors += 1
+            log.warn("SERIAL", "Línea no JSON: %r", line)
+            return
+        if isinstance(obj, dict) and "done" in obj:
+            motion.notify_done(int(obj["done"]))     # fin de un move
+            return
+        if not (isinstance(obj, dict) and "axis" in obj and "pos" in obj):
+            return
+        parsed = (int(obj["axis"]), int(obj["pos"]))   # pos puede ser negativo
+    H_SERIAL_PARSE.record(time.perf_counter() - t0)
+    stats.samples += 1
+    handle_sample(parsed[0], parsed[1], time.time())
+
 def serial_reader():
-    """Lee líneas JSON del Arduino: {'axis':X,'pos':N} y:
-       - difunde muestra escalada (rev, steps, deg)
+    """Lee el UART en bloque y enmarca líneas de forma incremental:
+       - difunde cada muestra {'axis':X,'pos':N} escalada (rev, steps, deg)
        - si está en grabación PBD para ese eje, guarda trayectoria (t_rel, pos)
     """
-    print("[SERIAL] Hilo de lectura iniciado.")
-    while True:
+    log.info("SERIAL", "Hilo de lectura iniciado.")
+    buf   = bytearray()
+    stats = ingest_stats
+    while not stop_event.is_set():
         try:
-            raw = ser.readline().decode(errors="ignore").strip()
-            if not raw:
-                continue
-            # Esperamos líneas JSON válidas desde Arduino (solo datos correctos)
-            if not raw.startswith("{"):
-                # Puedes ver otras notificaciones aquí si las hubiera
+            # Drena todo lo disponible; si no hay nada, espera 1 byte (timeout 1 s)
+            chunk = ser.read(min(ser.in_waiting, SERIAL_READ_MAX) or 1)
+            stats.tick(time.monotonic())
+            if not chunk:
                 continue
-
-            obj = json.loads(raw)
-            if "axis" in obj and "pos" in obj:
-                axis = int(obj["axis"])
-                pos  = int(obj["pos"])     # puede ser negativo
-                ts   = time.time()
-
-                rev   = pos / ENC_COUNTS_PER_REV
-                steps = rev * STEPS_PER_REV
-                deg   = rev * 360.0
-
-                sample = {
-                    "type":    "pbd_sample",
-                    "ts":      ts,
-                    "axis":    axis,
-                    "pos_raw": pos,
-                    "rev":     rev,
-                    "steps":   steps,
-                    "deg":     deg
-                }
-                broadcast(json.dumps(sample))
-
-                # Si estamos grabando este eje, guardamos trayectoria
-                if pbd_is_recording and axis == pbd_record_axis:
-                    if pbd_t0[axis] is None:
-                        pbd_t0[axis] = ts
-                        print(f"[PBD] t0 eje {axis} = {pbd_t0[axis]:.3f}")
-                    t_rel = ts - pbd_t0[axis]
-                    pbd_traj[axis].append([t_rel, pos])
-                    if len(pbd_traj[axis]) % 10 == 0:
-                        print(f"[PBD] eje {axis}: {len(pbd_traj[axis])} muestras almacenadas")
-        except json.JSONDecodeError:
-            print(f"[WARN][SERIAL] Línea no JSON: {raw}")
+            t_chunk = time.perf_counter()
+            stats.bytes += len(chunk)
+            buf += chunk
+            start = 0
+            while True:
+                nl = buf.find(b"\n", start)
+                if nl < 0:
+                    break
+                handle_serial_line(bytes(buf[start:nl]))
+                start = nl + 1
+            if start:
+                del buf[:start]
+            H_SERIAL_CHUNK.record(time.perf_counter() - t_chunk)
+            if len(buf) > SERIAL_LINE_MAX:
+                stats.parse_errors += 1
+                log.warn("SERIAL", "%d bytes sin fin de línea, descartados", len(buf))
+                buf.clear()
         except Exception as e:
-            print(f"[ERR][SERIAL] {e}")
-            traceback.print_exc()
+            log.error("SERIAL", "%s\n%s", e, traceback.format_exc().rstrip())
 
 # ==================================
 #  Reproducción (playback)
 # ==================================
-def play_axis(axis: int, reverse: bool = False):
-    """Reproduce trayectoria del eje `axis`. Si reverse=True, la recorre al revés.
-       Mantiene los intervalos temporales originales (t_rel). Secuencial/bloqueante por eje.
+# (eje, reverso, velocidad, rate_hz, interp, ejes_a_la_vez) -> (trayectoria, n_muestras, MovePlan)
+pbd_plans = {}
+
+def get_plan(axis: int, reverse: bool = False, speed: float = 1.0,
+             rate_hz: float = None, interp: str = "linear", concurrent: int = 1):
+    """Plan compilado del eje. Se compila una vez por grabación/carga y
+       opciones de reproducción, y se reutiliza mientras la trayectoria no
+       cambie. Ningún tramo pide más pasos/s de los que da moveMotor, y con
+       `concurrent` ejes a la vez cada uno usa solo su parte del firmware.
     """
-    traj = pbd_traj.get(axis, [])
-    if len(traj) < 2:
-        print(f"[PLAY] eje {axis}: sin datos suficientes")
-        return
+    key    = (axis, reverse, speed, rate_hz, interp if rate_hz else None, concurrent)
+    traj   = pbd_traj.get(axis)
+    cached = pbd_plans.get(key)
+    if cached and cached[0] is traj and cached[1] == len(traj):
+        return cached[2]
+    plan = compile_plan(traj, COUNTS_PER_STEP, reverse=reverse,
+                        tolerance=PLAN_TOLERANCE_COUNTS, min_steps=PLAN_MIN_STEPS,
+                        speed=speed, rate_hz=rate_hz, method=interp,
+                        max_step_rate=PLAN_STEP_RATE, settle_s=MOVE_SETTLE_S,
+                        axes=concurrent, overhead_s=PLAN_MOVE_OVERHEAD_S)
+    pbd_plans[key] = (traj, len(traj), plan)
+    st = plan.stats
+    opts = f" x{speed:g}" + (f" @{rate_hz:g}Hz {interp}" if rate_hz else "") + \
+        (f" ({concurrent} ejes a la vez)" if concurrent > 1 else "")
+    log.info("PLAN", "eje %d%s%s: %d puntos -> %d tras simplificar, %d comandos (%d menos), "
+             "%d pasos aplazados por velocidad, error final %d cuentas (sin compilar: %d)",
+             axis, " (REVERSO)" if reverse else "", opts, st["points"], st["kept"],
+             st["commands"], st["removed"], st["capped_steps"], st["final_error_counts"],
+             st["naive_error_counts"])
+    broadcast(json.dumps({"type": "plan_compiled", "axis": axis, "reverse": reverse,
+                          "speed": speed, "rate_hz": rate_hz, "interp": interp,
+                          "concurrent": concurrent, "duration_s": round(plan.duration, 3), **st}),
+              KIND_EVENT)
+    return plan
 
-    print(f"[PLAY] eje {axis} {'(REVERSO)' if reverse else ''} - {len(traj)} puntos")
-    if not reverse:
-        idxs = range(1, len(traj))
-    else:
-        idxs = range(len(traj)-1, 0, -1)
-
-    for i in idxs:
-        i_prev = i-1 if not reverse else i
-        i_curr = i   if not reverse else i-1
-        t_prev, p_prev = traj[i_prev]
-        t_curr, p_curr = traj[i_curr]
-
-        delta_counts = p_curr - p_prev      # firma conserva dirección
-        steps = counts_to_steps(delta_counts)
-        dir_char = 'f' if steps >= 0 else 'b'
-        pasos    = abs(steps)
-
-        if pasos > 0:
-            cmd = f"move {axis} {pasos} {dir_char}"
-            print(f"[PLAY]-> {cmd}  (dt={max(0.0, t_curr - t_prev):.3f}s)")
-            send_uart(cmd)
-        else:
-            print(f"[PLAY] eje {axis}: delta 0 -> sin movimiento")
+def invalidate_plans(axis: int):
+    for key in [k for k in pbd_plans if k[0] == axis]:
+        del pbd_plans[key]
 
-        time.sleep(max(0.0, t_curr - t_prev))
+def axis_timeline(axis: int, reverse: bool = False, **opts):
+    """Convierte el plan compilado del eje en pasos (t_rel, eje, (eje, pasos)).
+       Cada movimiento se envía al inicio de su intervalo original. En reverso
+       los tiempos se reflejan (t' = t_fin - t) para conservar los intervalos.
+    """
+    traj = pbd_traj.get(axis)
+    if traj is None or len(traj) < 2:
+        log.info("PLAY", "eje %d: sin datos suficientes", axis)
+        return []
+    plan  = get_plan(axis, reverse, **opts)
+    steps = [(t_rel, axis, (axis, n)) for t_rel, n in plan.moves]
+    # Paso final sin comando: marca el fin del último intervalo
+    steps.append((plan.duration, axis, None))
+    return steps
+
+play_waiter   = None   # done() del comando que lanzó la reproducción en curso
+play_draining = None   # informe del motor mientras terminan sus moves en cola
+play_expected = 0.0    # cuándo acabará el firmware la reproducción en curso (s)
 
-    print(f"[PLAY] eje {axis} {'(REVERSO)' if reverse else ''} FIN")
+def play_busy() -> bool:
+    """Reproducción en marcha: el motor envía pasos o sus moves aún corren."""
+    return playback.is_busy() or play_draining is not None
 
-def play_axes_seq(axes, reverse: bool = False):
-    """Reproduce secuencialmente los ejes dados (lista). Si reverse=True:
-       - reproduce cada eje en reverso
-       - y el orden de ejes también se invierte (3→2→1 si pasas [1,2,3]).
+def play_label() -> str:
+    report = play_draining
+    return report["label"] if report is not None else playback.label
+
+def play_report(report: dict):
+    """El motor envió su último paso. Los moves "play" siguen en MotionQueue
+       (uno en vuelo a la vez): el informe y el done() del comando esperan a
+       que terminen, así "fin" es cuando el brazo se para.
     """
+    global play_draining
+    play_draining = report
+    if report["aborted"]:
+        motion.clear(tag="play")    # un paso enviado justo al abortar
+    t_end = time.monotonic()
+    motion.when_idle("play", lambda: play_finished(report, t_end))
+
+def play_finished(report: dict, t_end: float):
+    """Ya no quedan moves de la reproducción: informe final."""
+    global play_waiter, play_draining
+    play_draining = None
+    report["drain_s"]   = round(time.monotonic() - t_end, 3)
+    report["elapsed_s"] = round(report["elapsed_s"] + report["drain_s"], 3)
+    report["expected_s"] = round(play_expected, 3)
+    done, play_waiter = play_waiter, None
+    if done:
+        done("aborted" if report["aborted"] else "ok", report=report)
+    reason = f" ({report['reason']})" if report.get("reason") else ""
+    log.info("PLAY", "%s %s%s - %d comandos, %.3fs (plan %.3fs, previsto %.3fs), jitter=%.2fms "
+             "max=%.2fms deriva=%.2fms cola_tras_fin=%.3fs",
+             report["label"], "ABORTADA" if report["aborted"] else "FIN", reason,
+             report["commands"], report["elapsed_s"], report["planned_s"], report["expected_s"],
+             report["jitter_ms"], report["max_late_ms"], report["drift_ms"], report["drain_s"])
+    broadcast(json.dumps(report), KIND_EVENT)
+
+def abort_play(reason: str = None) -> bool:
+    """Para la reproducción: el motor si sigue enviando pasos y, en todo
+       caso, los moves "play" en cola. False si no había nada que parar.
+    """
+    ok = playback.abort(reason)
+    report = play_draining
+    # Se marca antes de vaciar: clear() puede cerrar el informe en el acto
+    if report is not None and motion.pending("play") and not report["aborted"]:
+        report["aborted"] = True
+        report["reason"]  = reason
+    cleared = motion.clear(tag="play")
+    return ok or cleared > 0
+
+def play_step(move):
+    axis, n = move
+    log.debug("PLAY", "-> eje %d %+d pasos", axis, n)
+    motion.submit(axis, abs(n), 'f' if n > 0 else 'b', tag="play")
+
+playback = PlaybackEngine(play_step, on_done=play_report, on_step=H_PLAY_LATE.record)
+
+# ==================================
+#  Cinemática (velocidad, aceleración, pose)
+# ==================================
+def axis_progress(axis: int) -> float:
+    """Pasos ejecutados en `axis` según la cola de movimientos (para el stall)."""
+    return motion.progress(axis)
+
+def kin_fault(axis: int, flags: int, state):
+    """Aparece stall/overspeed en un eje. Corre en el hilo del puerto serie,
+       así la reproducción se detiene antes de enviar su siguiente paso.
+    """
+    names  = "+".join(flag_names(flags))
+    deg, vel = state[0], state[1]
+    log.warn("KIN", "eje %d: %s deg=%.1f vel=%.1f°/s", axis, names, deg, vel)
+    action = None
+    if KIN_FAULT_ACTION != "off":
+        # Los moves "play" en cola se descartan siempre, aunque el motor ya
+        # haya enviado su último paso; el motor se para solo si sigue
+        if KIN_FAULT_ACTION == "pause":
+            ok = motion.clear(tag="play") > 0
+            ok = playback.pause() or ok
+        else:
+            ok = abort_play(f"{names} eje {axis}")
+        if ok:
+            action = KIN_FAULT_ACTION
+            log.info("PLAY", "%s eje %d: %s estado=%s", names, axis, action, playback.state)
+    broadcast(json.dumps({"type": "kin_fault", "axis": axis, "flags": flag_names(flags),
+                          "deg": round(deg, 3), "vel": round(vel, 3), "playback": action}),
+              KIND_EVENT)
+
+kinematics = Kinematics(KIN_LINKS_MM, KIN_HOME_DEG, commanded=axis_progress,
+                        on_flags=kin_fault)
+
+def start_playback(axes, reverse: bool = False, sequential: bool = False,
+                   on_done=None, **opts) -> bool:
+    """Reproduce los ejes dados. Por defecto todos a la vez sobre una línea
+       de tiempo común; con sequential=True uno tras otro (en reverso el orden
+       de ejes también se invierte: 3→2→1 si pasas [1,2,3]).
+       `opts` (speed, rate_hz, interp) se pasan a get_plan.
+       `on_done(status, report=...)` se llama al terminar.
+    """
+    global play_waiter, play_expected
     axes = [int(ax) for ax in axes if int(ax) in (1,2,3)]
     if not axes:
-        print("[PLAY_ALL] Sin ejes válidos")
-        return
+        log.info("PLAY_ALL", "Sin ejes válidos")
+        return False
     order = axes if not reverse else list(reversed(axes))
-    print(f"[PLAY_ALL] Orden: {order}  Modo: {'REVERSO' if reverse else 'NORMAL'}")
-    for ax in order:
-        play_axis(ax, reverse=reverse)
+    # Los ejes simultáneos se reparten el firmware (un move en vuelo a la vez)
+    concurrent = 1 if sequential else max(1, sum(1 for ax in order if len(pbd_traj[ax]) >= 2))
+    steps = merge_timelines([axis_timeline(ax, reverse, concurrent=concurrent, **opts)
+                             for ax in order], sequential)
+    if not steps:
+        return False
+    label = f"ejes {order}{' REVERSO' if reverse else ''}{' SEQ' if sequential else ''}"
+    if opts.get("speed", 1.0) != 1.0:
+        label += f" x{opts['speed']:g}"
+    if opts.get("rate_hz"):
+        label += f" @{opts['rate_hz']:g}Hz"
+    if play_busy():
+        log.info("PLAY", "Reproducción en curso (%s); se ignora %s", play_label(), label)
+        return False
+    # Un move a la vez: lo que no quepa en su tramo retrasa a los siguientes
+    planned  = steps[-1][0]
+    expected = max(planned, serial_end([(t, cmd[1]) for t, _, cmd in steps if cmd],
+                                       PLAN_STEP_RATE, MOVE_SETTLE_S + PLAN_MOVE_OVERHEAD_S))
+    play_waiter, play_expected = on_done, expected
+    if not playback.start(steps, label):
+        play_waiter = None
+        log.info("PLAY", "Reproducción en curso (%s); se ignora %s", play_label(), label)
+        return False
+    log.info("PLAY", "%s - %d pasos, %.3fs (firmware hasta %.3fs)", label, len(steps),
+             planned, expected)
+    if expected > planned * PLAY_OVERRUN_WARN:
+        log.warn("PLAY", "%s pide más movimiento del que da el firmware: %.1fs en vez de %.1fs",
+                 label, expected, planned)
+    return True
+
+def pbd_library_action(action: str, name: str = None, axes=None) -> dict:
+    """Acciones save/load/list/delete sobre la biblioteca de demostraciones."""
+    if action == "list":
+        return {"items": pbd_library.list()}
+    if action == "save":
+        axes  = axes or [1,2,3]
+        trajs = {ax: pbd_traj[ax] for ax in axes if ax in pbd_traj}
+        if not any(len(tr) for tr in trajs.values()):
+            raise ValueError("no hay trayectorias grabadas para guardar")
+        info = pbd_library.save(name, trajs)
+        log.info("PBD", "Guardada '%s': %s", name, info["axes"])
+        return info
+    if action == "load":
+        if pbd_is_recording:
+            raise ValueError("no se puede cargar durante una grabación")
+        loaded = pbd_library.load(name)
+        for axis, traj in loaded.items():
+            pbd_traj[axis] = traj
+            invalidate_plans(axis)
+        log.info("PBD", "Cargada '%s': %s", name, {ax: len(tr) for ax, tr in loaded.items()})
+        return pbd_library.info(name)
+    if action == "delete":
+        pbd_library.delete(name)
+        log.info("PBD", "Borrada '%s'", name)
+        return {"name": name}
+    raise ValueError(f"acción desconocida: {action}")
 
 # ==================================
 #  Servidores TCP (comandos/estado)
 # ==================================
-def handle_command_client(conn, addr):
-    global pbd_is_recording, pbd_record_axis
-    print(f"[COMMAND] Conexión desde {addr}")
-    buffer = ""
-    with conn:
+# ----- Comandos del puerto 6000 -----
+# Cada manejador recibe la petición y los campos ya validados. Los comandos
+# con "echo" (por defecto) se reenvían a los suscriptores del 6001.
+commands = CommandRegistry(on_echo=lambda msg: broadcast(json.dumps(msg)))
+
+AXIS      = Field(int, lo=1, hi=3)
+AXES      = Field(list, item=int, lo=1, hi=3, default=None)
+DIR       = Field(int, choices=(0, 1))
+ON_OFF    = Field(str, choices=("on", "off"))
+
+def uart_command(req, line: str, prio: int = PRIO_NORMAL):
+    """Encola `line`; si la petición lleva id, su "done" llega al salir por el cable."""
+    done = req.defer() if req.id is not None else None
+    send_uart(line, prio, (lambda err: done("error", error=err) if err else done())
+                          if done else None)
+
+def motion_command(req, axis: int, steps: int, direction: str, tag: str):
+    """Encola un movimiento; el "done" de la petición llega cuando termina."""
+    done = req.defer()
+    motion.submit(axis, steps, direction, tag=tag,
+                  on_done=lambda status, **info: done(status, **info))
+
+# ===== Comandos existentes =====
+@commands.command("move", eje=AXIS, dir=DIR, pasos=Field(int, lo=0))
+def cmd_move(req, eje, dir, pasos):
+    motion_command(req, eje, pasos, 'f' if dir else 'b', tag="move")
+
+@commands.command("bomba", state=ON_OFF)
+def cmd_bomba(req, state):
+    uart_command(req, f"bomba {state}", PRIO_URGENT)
+
+@commands.command("solenoide", state=ON_OFF)
+def cmd_solenoide(req, state):
+    uart_command(req, f"solenoide {state}", PRIO_URGENT)
+
+@commands.command("efector", action=Field(str, choices=("open", "close")))
+def cmd_efector(req, action):
+    uart_command(req, f"efector {action}")
+
+@commands.command("rotarEfector", angle=Field(int, lo=0, hi=180))
+def cmd_rotar_efector(req, angle):
+    uart_command(req, f"rotarEfector {angle}")
+
+# ===== Consultas =====
+@commands.command("stats", echo=False, reset=Field(bool, default=False))
+def cmd_stats(req, reset):
+    snap = probes.snapshot()
+    n_clients = len(state_bus)
+    req.reply({"type": "stats", **snap, "ingest": ingest_stats.as_dict(),
+               "uart": uart_writer.stats(), "state_clients": n_clients})
+    if reset:
+        probes.reset()
+
+@commands.command("log", echo=False, level=Field(str, default=None),
+                  rate=Field(int, lo=0, default=None))
+def cmd_log(req, level, rate):
+    # {"cmd":"log","level":"debug","rate":100} -> ajusta y responde la config
+    if level is not None:
+        log.set_level(level)
+    if rate is not None:
+        log.set_rate(rate)
+    req.reply({"type": "log", **log.config()})
+
+@commands.command("ingest", echo=False)
+def cmd_ingest(req):
+    req.reply({"type": "ingest", **ingest_stats.as_dict()})
+
+@commands.command("uart", echo=False)
+def cmd_uart(req):
+    req.reply({"type": "uart", **uart_writer.stats()})
+
+@commands.command("motion", echo=False, clear=Field(int, lo=0, hi=3, default=None))
+def cmd_motion(req, clear):
+    # {"cmd":"motion"} -> estado de las colas; "clear": eje (0 = todos)
+    dropped = motion.clear(clear or None) if clear is not None else 0
+    req.reply({"type": "motion", **motion.stats(), "cleared": dropped})
+
+@commands.command("kinematics", echo=False)
+def cmd_kinematics(req):
+    # Geometría, último estado por eje y pose del efector
+    req.reply({"type": "kinematics_state", **kinematics.snapshot()})
+
+@commands.command("ready", echo=False)
+def cmd_ready(req):
+    # Sonda de disponibilidad: fases y tiempo de arranque
+    req.reply({"type": "ready", **boot.report()})
+
+@commands.command("clients", echo=False)
+def cmd_clients(req):
+    req.reply({"type": "clients", "clients": [s.stats() for s in state_bus.subscribers()]})
+
+# ===== PBD =====
+@commands.command("pbd", "enter")
+def pbd_enter(req):
+    log.info("PBD", "ENTER")
+    uart_command(req, "pbd start", PRIO_URGENT)
+
+@commands.command("pbd", "exit")
+def pbd_exit(req):
+    log.info("PBD", "EXIT")
+    uart_command(req, "pbd stop", PRIO_URGENT)
+
+@commands.command("pbd", "recstart", axis=Field(int, lo=1, hi=3, default=None), axes=AXES,
+                  rate_hz=Field(float, default=RECORD_RATE_DEFAULT_HZ))
+def pbd_recstart(req, axis, axes, rate_hz):
+    # {"axis": N} (un eje) o {"axes": [1,2,3]}, con "rate_hz" opcional
+    global pbd_is_recording, pbd_record_axes, pbd_record_rate, pbd_record_t0
+    if axes is None:
+        if axis is None:
+            raise CommandError("falta 'axis' o 'axes'")
+        axes = [axis]
+    axes = sorted(set(axes))
+    if not axes:
+        raise CommandError("'axes' vacío")
+    rate = min(rate_hz, 1000.0 / RECORD_MIN_INTERVAL_MS, RECORD_MAX_LINES_PER_S / len(axes))
+    if rate <= 0:
+        raise CommandError(f"frecuencia inválida: {rate_hz}")
+    interval_ms = max(RECORD_MIN_INTERVAL_MS, int(math.ceil(1000.0 / rate - 1e-9)))
+    pbd_is_recording = True
+    pbd_record_axes  = frozenset(axes)
+    pbd_record_rate  = 1000.0 / interval_ms
+    pbd_record_t0    = None
+    for ax in axes:
+        pbd_traj[ax] = Trajectory()   # nueva: no toca una cargada/mapeada
+        invalidate_plans(ax)
+    log.info("PBD", "REC START ejes %s @ %.1f Hz (%d ms)", axes, pbd_record_rate, interval_ms)
+    uart_command(req, f"record start {','.join(map(str, axes))} {interval_ms}", PRIO_URGENT)
+
+@commands.command("pbd", "recstop")
+def pbd_recstop(req):
+    global pbd_is_recording
+    pbd_is_recording = False
+    counts = {ax: len(pbd_traj[ax]) for ax in sorted(pbd_record_axes)}
+    log.info("PBD", "REC STOP ejes %s - muestras %s", sorted(pbd_record_axes), counts)
+    uart_command(req, "record stop", PRIO_URGENT)
+
+# Opciones comunes de play/playrev/play_all/playrev_all
+PLAY_FIELDS = {
+    "speed":   Field(float, lo=0.1, hi=PLAY_SPEED_MAX, default=1.0),
+    "rate_hz": Field(float, lo=0.1, hi=PLAY_RATE_MAX_HZ, default=None),
+    "interp":  Field(str, choices=INTERP_METHODS, default="linear"),
+}
+
+def pbd_play(req, axes, reverse, seq=False, **opts):
+    done = req.defer()
+    if not start_playback(axes, reverse=reverse, sequential=seq, on_done=done, **opts):
+        raise CommandError("no se pudo iniciar la reproducción "
+                           f"({'en curso: ' + play_label() if play_busy() else 'sin datos'})")
+
+@commands.command("pbd", "play", axis=AXIS, **PLAY_FIELDS)
+def pbd_play_one(req, axis, **opts):
+    log.info("PBD", "PLAY eje %d", axis)
+    pbd_play(req, [axis], reverse=False, **opts)
+
+@commands.command("pbd", "playrev", axis=AXIS, **PLAY_FIELDS)
+def pbd_playrev_one(req, axis, **opts):
+    log.info("PBD", "PLAY REV eje %d", axis)
+    pbd_play(req, [axis], reverse=True, **opts)
+
+@commands.command("pbd", "play_all", axes=AXES, seq=Field(bool, default=False), **PLAY_FIELDS)
+def pbd_play_all(req, axes, seq, **opts):
+    axes = axes or [1,2,3]
+    log.info("PBD", "play_all ejes=%s", axes)
+    pbd_play(req, axes, reverse=False, seq=seq, **opts)
+
+@commands.command("pbd", "playrev_all", axes=AXES, seq=Field(bool, default=False), **PLAY_FIELDS)
+def pbd_playrev_all(req, axes, seq, **opts):
+    axes = axes or [1,2,3]
+    log.info("PBD", "playrev_all ejes=%s", axes)
+    pbd_play(req, axes, reverse=True, seq=seq, **opts)
+
+def pbd_library_command(action):
+    def handler(req, name=None, axes=None):
+        try:
+            result = pbd_library_action(action, name, axes)
+        except (ValueError, OSError) as e:
+            log.warn("PBD", "%s falló: %s", action, e)
+            req.reply({"type": "pbd_library", "action": action, "ok": False, "error": str(e)})
+            raise CommandError(str(e)) from None
+        req.reply({"type": "pbd_library", "action": action, "ok": True, **result})
+    return handler
+
+NAME = Field(str)
+commands.command("pbd", "list", echo=False)(pbd_library_command("list"))   # consulta
+commands.command("pbd", "save", name=NAME, axes=AXES)(pbd_library_command("save"))
+commands.command("pbd", "load", name=NAME)(pbd_library_command("load"))
+commands.command("pbd", "delete", name=NAME)(pbd_library_command("delete"))
+
+def pbd_transport(action):
+    def handler(req):
+        if action == "abort":
+            ok = abort_play()           # motor y moves de la reproducción aún en cola
+        else:
+            ok = getattr(playback, action)()
+        log.info("PBD", "%s %s estado=%s", action.upper(), "ok" if ok else "(sin efecto)",
+                 playback.state)
+        if not ok:
+            raise CommandError(f"{action} sin efecto (estado={playback.state})")
+    return handler
+
+for _action in ("pause", "resume", "abort"):
+    commands.command("pbd", _action)(pbd_transport(_action))
+
+@commands.command("pbd", "move", eje=AXIS, dir=Field(int, choices=(0, 1), default=1),
+                  revs=Field(float, lo=0))
+def pbd_move(req, eje, dir, revs):
+    dir_char = 'f' if dir else 'b'
+    pasos    = int(round(revs * STEPS_PER_REV))
+    log.info("PBD", "MOVE por vueltas: eje=%s revs=%s -> pasos=%d dir=%s", eje, revs, pasos, dir_char)
+    motion_command(req, eje, pasos, dir_char, tag="pbd")
+
+async def process_command(msg: dict, reply):
+    """Ejecuta un comando JSON recibido por el puerto 6000.
+       `reply(obj)` responde en la misma conexión (consultas y acuses).
+    """
+    req = Request(msg, reply, loop)
+    t0 = time.perf_counter()
+    try:
+        await commands.dispatch(req)
+    except (CommandError, KeyError, ValueError, TypeError, OSError) as e:
+        log.warn("COMMAND", "Comando inválido %s: %s", msg, e)
+    H_CMD_DISPATCH.record(time.perf_counter() - t0)
+    C_COMMANDS.add()
+
+async def handle_command_client(reader, writer):
+    """Una línea es un comando JSON o un array de comandos (se ejecutan en
+       orden). Con "id" cada comando recibe su acuse en esta conexión.
+    """
+    addr = writer.get_extra_info("peername")
+    log.info("COMMAND", "Conexión desde %s", addr)
+
+    def reply(obj):
+        if not writer.is_closing():
+            writer.write((json.dumps(obj) + "\n").encode())
+
+    try:
         while True:
-            data = conn.recv(1024).decode()
-            if not data:
+            line = await reader.readline()
+            if not line:
                 break
-            buffer += data
-            while "\n" in buffer:
-                line, buffer = buffer.split("\n", 1)
-                try:
-                    msg = json.loads(line)
-                except json.JSONDecodeError:
+            try:
+                msg = json.loads(line)
+            except json.JSONDecodeError:
+                log.warn("COMMAND", "Línea no JSON de %s: %r", addr, line[:80])
+                continue
+            batch = msg if isinstance(msg, list) else [msg]
+            for item in batch:
+                if not isinstance(item, dict):
+                    log.warn("COMMAND", "Elemento no objeto de %s: %r", addr, item)
                     continue
+                await process_command(item, reply)
+            # Cede el bucle entre líneas: una ráfaga en el buffer no debe
+            # acaparar a los escritores de estado
+            await asyncio.sleep(0)
+    except (ConnectionError, ValueError):
+        # ValueError: línea más larga que el límite del StreamReader
+        pass
+    finally:
+        writer.close()
+
+def scan_library():
+    names = pbd_library.names()
+    log.info("PBD", "Biblioteca %s: %d demostraciones", PBD_LIBRARY_DIR, len(names))
+    return names
 
-                uart_cmd = None
-
-                # ===== Comandos existentes =====
-                if msg.get("cmd") == "move":
-                    eje     = int(msg["eje"])
-                    dir_char= 'f' if int(msg["dir"]) else 'b'
-                    pasos   = int(msg["pasos"])
-                    uart_cmd = f"move {eje} {pasos} {dir_char}"
-
-                elif msg.get("cmd") == "bomba":
-                    uart_cmd = f"bomba {msg['state']}"
-
-                elif msg.get("cmd") == "solenoide":
-                    uart_cmd = f"solenoide {msg['state']}"
-
-                elif msg.get("cmd") == "efector":
-                    uart_cmd = f"efector {msg['action']}"
-
-                elif msg.get("cmd") == "rotarEfector":
-                    uart_cmd = f"rotarEfector {msg['angle']}"
-
-                # ===== PBD =====
-                elif msg.get("cmd") == "pbd":
-                    action = msg.get("action")
-
-                    if action == "enter":
-                        print("[PBD] ENTER")
-                        send_uart("pbd start")
-                        broadcast(json.dumps(msg))
-                        continue
-
-                    if action == "exit":
-                        print("[PBD] EXIT")
-                        send_uart("pbd stop")
-                        broadcast(json.dumps(msg))
-                        continue
-
-                    if action == "recstart":
-                        axis = int(msg["axis"])
-                        if axis not in (1,2,3):
-                            print(f"[PBD] recstart eje inválido: {axis}")
-                            continue
-                        pbd_is_recording = True
-                        pbd_record_axis  = axis
-                        pbd_traj[axis].clear()
-                        pbd_t0[axis] = None
-                        print(f"[PBD] REC START eje {axis}")
-                        send_uart(f"record start {axis}")
-                        broadcast(json.dumps(msg))
-                        continue
-
-                    if action == "recstop":
-                        pbd_is_recording = False
-                        print(f"[PBD] REC STOP eje {pbd_record_axis} - {len(pbd_traj.get(pbd_record_axis, []))} muestras")
-                        send_uart("record stop")
-                        broadcast(json.dumps(msg))
-                        continue
-
-                    if action == "play":
-                        axis = int(msg["axis"])
-                        print(f"[PBD] PLAY eje {axis}")
-                        threading.Thread(target=play_axis, args=(axis, False), daemon=True).start()
-                        broadcast(json.dumps(msg))
-                        continue
-
-                    if action == "playrev":
-                        axis = int(msg["axis"])
-                        print(f"[PBD] PLAY REV eje {axis}")
-                        threading.Thread(target=play_axis, args=(axis, True), daemon=True).start()
-                        broadcast(json.dumps(msg))
-                        continue
-
-                    if action in ("play_all","playrev_all"):
-                        axes = msg.get("axes", [1,2,3])
-                        print(f"[PBD] {action} ejes={axes}")
-                        threading.Thread(
-                            target=play_axes_seq,
-                            args=(axes, action == "playrev_all"),
-                            daemon=True
-                        ).start()
-                        broadcast(json.dumps(msg))
-                        continue
-
-                    if action == "move":
-                        eje     = int(msg["eje"])
-                        dir_char= 'f' if int(msg.get("dir",1)) else 'b'
-                        revs    = float(msg["revs"])
-                        pasos   = int(round(revs * STEPS_PER_REV))
-                        print(f"[PBD] MOVE por vueltas: eje={eje} revs={revs} -> pasos={pasos} dir={dir_char}")
-                        send_uart(f"move {eje} {pasos} {dir_char}")
-                        broadcast(json.dumps(msg))
-                        time.sleep(abs(revs) * REV_DELAY_SEC)
-                        continue
-
-                # Enviar comando UART si corresponde
-                if uart_cmd:
-                    send_uart(uart_cmd)
-                    broadcast(json.dumps(msg))
-
-
-def command_server():
-    srv = socket.socket()
-    srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    srv.bind(("0.0.0.0", 6000))
-    srv.listen()
-    print("[COMMAND] Escuchando en puerto 6000")
-    while True:
-        conn, addr = srv.accept()
-        threading.Thread(target=handle_command_client, args=(conn, addr), daemon=True).start()
-
-def handle_state_client(conn, addr):
-    print(f"[STATE] Cliente suscrito desde {addr}")
-    with state_lock:
-        state_clients.append(conn)
-
-def state_server():
-    srv = socket.socket()
-    srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    srv.bind(("0.0.0.0", 6001))
-    srv.listen()
-    print("[STATE] Escuchando en puerto 6001")
-    while True:
-        conn, addr = srv.accept()
-        threading.Thread(target=handle_state_client, args=(conn, addr), daemon=True).start()
+def timed(name: str, fn):
+    """Envuelve `fn` para medirla como fase de arranque."""
+    def run():
+        with boot.phase(name):
+            return fn()
+    return run
+
+async def serve():
+    """Arranca ambos servidores y el lector serie en un único bucle asyncio.
+       El UART y la biblioteca se preparan en hilos mientras se abren los
+       puertos TCP; el aviso de listo se da cuando todo está en marcha.
+    """
+    global loop
+    loop = asyncio.get_running_loop()
+    uart_fut    = loop.run_in_executor(None, timed("uart", open_uart))
+    library_fut = loop.run_in_executor(None, timed("library", scan_library))
+    with boot.phase("servers"):
+        cmd_srv = await asyncio.start_server(
+            handle_command_client, "0.0.0.0", CMD_PORT, reuse_address=True)
+        log.info("COMMAND", "Escuchando en puerto %d", CMD_PORT)
+        state_srv = await asyncio.start_server(
+            state_bus.handle_client, "0.0.0.0", STATE_PORT, reuse_address=True)
+        log.info("STATE", "Escuchando en puerto %d", STATE_PORT)
+    # Los comandos que lleguen antes de abrir el UART esperan en la cola
+    await asyncio.gather(uart_fut, library_fut)
+
+    with boot.phase("workers"):
+        uart_writer.start()
+        motion.start()
+        if KIN_TRACK_MS:
+            # Muestras durante los moves; un firmware sin "track" lo ignora
+            send_uart(f"track {KIN_TRACK_MS}", PRIO_URGENT)
+        reader_fut = loop.run_in_executor(serial_executor, serial_reader)
+    boot.ready(lambda text: log.info("BOOT", text))
+    log.info("MAIN", "Servidor corriendo. Ctrl+C para salir.")
+    async with cmd_srv, state_srv:
+        await asyncio.gather(cmd_srv.serve_forever(),
+                             state_srv.serve_forever(),
+                             reader_fut)
 
 def main():
     # Si quisieras lanzar display.py en framebuffer, descomenta:
     # display_proc = launch_display()
 
-    threading.Thread(target=serial_reader, daemon=True).start()
-    threading.Thread(target=command_server, daemon=True).start()
-    threading.Thread(target=state_server,   daemon=True).start()
-    print("[MAIN] Servidor corriendo. Ctrl+C para salir.")
+    # systemd/supervisor paran con SIGTERM: misma salida limpia que Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
     try:
-        while True:
-            time.sleep(1)
+        asyncio.run(serve())
     except KeyboardInterrupt:
         pass
     finally:
+        stop_event.set()
+        serial_executor.shutdown(wait=True)
+        motion.stop()
+        uart_writer.stop()
+        boot.clear_ready()
         try:
             ser.close()
         except Exception:
@@ -349,7 +1022,8 @@ def main():
         #     display_proc.terminate()
         # except Exception:
         #     pass
-        print("[MAIN] Salida limpia.")
+        log.info("MAIN", "Salida limpia.")
+        log.stop()
 
 if __name__ == "__main__":
     main()
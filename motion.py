@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Cola de movimientos por eje con control de finalización.
+
+`moveMotor` en robot_arm.ino bloquea todo loop() durante pasos x 1.2 ms más
+un delay(100): mientras tanto el Arduino no lee el puerto serie y lo que
+pase de 64 bytes se pierde. Por eso aquí solo hay un movimiento en vuelo a
+la vez: los demás esperan en la cola de su eje y se envían, en orden de
+llegada, cuando termina el anterior.
+
+El fin de un movimiento se detecta por la respuesta {"done":N} del firmware.
+Con un firmware que no la envía se usa el modelo de tiempos; si el firmware
+ya respondió alguna vez, el modelo solo sirve de plazo máximo de seguridad.
+El "done" de un move que venció ese plazo puede llegar cuando ya hay otro en
+vuelo en el mismo eje: se descarta si llega antes de lo que el nuevo puede
+tardar como mínimo, para no enviar el siguiente con el firmware aún ocupado.
+"""
+
+import threading
+import time
+from collections import deque
+
+STEP_PERIOD_S   = 1.2e-3    # delayMicroseconds(600) alto + 600 bajo
+MOVE_SETTLE_S   = 0.100     # delay(100) tras cada move
+MODEL_MARGIN_S  = 0.020     # holgura sobre el modelo cuando no hay "done"
+DONE_TIMEOUT_S  = 1.0       # plazo extra esperando "done" antes de darlo por hecho
+DONE_TIMEOUT_K  = 1.5       # ... sobre el modelo multiplicado por este factor
+DONE_MIN_K      = 0.8       # un "done" antes de esta fracción del modelo no es del move en vuelo
+BACKLOG_WARN_S  = 5.0       # tiempo de firmware en cola que dispara el aviso "backlog"
+
+def move_duration(steps: int) -> float:
+    """Tiempo que el firmware tiene bloqueado loop() para `steps` pasos."""
+    return abs(steps) * STEP_PERIOD_S + MOVE_SETTLE_S
+
+class Move:
+    __slots__ = ("ticket", "axis", "steps", "dir", "tag", "on_done",
+                 "t_queued", "t_start", "deadline")
+
+    def __init__(self, ticket, axis, steps, direction, tag, on_done):
+        self.ticket   = ticket
+        self.axis     = axis
+        self.steps    = steps
+        self.dir      = direction
+        self.tag      = tag
+        self.on_done  = on_done
+        self.t_queued = time.monotonic()
+        self.t_start  = 0.0
+        self.deadline = 0.0
+
+    @property
+    def line(self) -> str:
+        return f"move {self.axis} {self.steps} {self.dir}"
+
+class MotionQueue:
+    """Colas FIFO por eje y un único movimiento en vuelo.
+       `send(line)` encola el comando en el UART; `on_event(dict)` recibe los
+       eventos de fin ("done") y de descarte ("dropped").
+    """
+    def __init__(self, send, on_event=None, axes=(1, 2, 3), line_time=None,
+                 backlog_warn_s=BACKLOG_WARN_S):
+        self.send      = send
+        self.on_event  = on_event
+        self.line_time = line_time or (lambda line: 0.0)   # tiempo en el cable
+        self.queues    = {ax: deque() for ax in axes}
+        self.active    = None
+        self.done_supported = False     # el firmware responde {"done":N}
+        self._cond     = threading.Condition()
+        self._ticket   = 0
+        self._stop     = False
+        self._thread   = None
+        self._idle_waiters = []         # (tag, fn) esperando a que se vacíe esa etiqueta
+        self._late     = {ax: 0 for ax in axes}   # "done" aún por llegar de moves vencidos
+        # La cola no tiene tope (una reproducción la llena a propósito), pero
+        # se avisa cuando lo encolado pasa de backlog_warn_s de movimiento
+        self.backlog_warn_s = backlog_warn_s
+        self.queued_s  = 0.0            # move_duration() de todo lo que espera
+        self._backlog  = False          # aviso dado, pendiente de bajar a la mitad
+        # Contadores
+        self.completed = {ax: 0 for ax in axes}
+        self.executed  = {ax: 0 for ax in axes}   # pasos de los moves terminados
+        self.dropped   = 0
+        self.timeouts  = 0
+        self.late_done = 0              # "done" tardíos descartados
+        self.last_exec = {ax: 0.0 for ax in axes}
+
+    # ---------- API (cualquier hilo) ----------
+    def submit(self, axis: int, steps: int, direction: str, on_done=None, tag: str = "") -> int:
+        """Encola un movimiento. `on_done(status, **info)` se llama al terminar
+           (status "ok") o al descartarse ("dropped"). Devuelve el ticket.
+        """
+        if axis not in self.queues:
+            raise ValueError(f"eje inválido: {axis}")
+        with self._cond:
+            self._ticket += 1
+            mv = Move(self._ticket, axis, abs(int(steps)), direction, tag, on_done)
+            self.queues[axis].append(mv)
+            self.queued_s += move_duration(mv.steps)
+            warn = self._check_backlog()
+            self._cond.notify()
+        if warn and self.on_event:
+            self.on_event(warn)
+        return mv.ticket
+
+    def notify_done(self, axis: int):
+        """Llega {"done":N} del firmware (hilo lector serie)."""
+        with self._cond:
+            self.done_supported = True
+            mv = self.active
+            late = self._late.get(axis, 0)
+            if late:
+                self._late[axis] = late - 1
+            if mv is None or mv.axis != axis:
+                return
+            if late and time.monotonic() - mv.t_start < DONE_MIN_K * self._model(mv):
+                self.late_done += 1         # es el del move que venció el plazo
+                return
+            self.active = None
+            self._cond.notify()
+        self._finish(mv, "done")
+
+    def clear(self, axis: int = None, tag: str = None) -> int:
+        """Descarta lo pendiente (de un eje y/o una etiqueta). El movimiento
+           en vuelo no se puede cancelar: el firmware ya lo está ejecutando.
+        """
+        removed = []
+        with self._cond:
+            for ax, q in self.queues.items():
+                if axis is not None and ax != axis:
+                    continue
+                keep = deque()
+                for mv in q:
+                    (removed if tag is None or mv.tag == tag else keep).append(mv)
+                self.queues[ax] = keep
+            self.dropped += len(removed)
+            self.queued_s = max(0.0, self.queued_s - sum(move_duration(mv.steps) for mv in removed))
+            self._check_backlog()
+        for mv in removed:
+            self._emit(mv, "dropped")
+        if removed:
+            self._check_idle()
+        return len(removed)
+
+    def pending(self, tag: str = None) -> int:
+        """Movimientos en cola o en vuelo (de una etiqueta, si se da)."""
+        with self._cond:
+            return self._pending(tag)
+
+    def when_idle(self, tag: str, fn):
+        """Llama a `fn()` cuando no quede ningún movimiento `tag` en cola ni
+           en vuelo: enseguida si ya no hay, o desde el hilo que termine o
+           descarte el último.
+        """
+        with self._cond:
+            if self._pending(tag):
+                self._idle_waiters.append((tag, fn))
+                return
+        fn()
+
+    def progress(self, axis: int) -> float:
+        """Pasos ejecutados en `axis`: los de sus moves terminados más, si
+           tiene uno en vuelo, los que le da el modelo de tiempos desde que
+           se envió (para el stall de kinematics.py).
+        """
+        with self._cond:
+            steps = self.executed.get(axis, 0)
+            mv = self.active
+            if mv is not None and mv.axis == axis:
+                ran = (time.monotonic() - mv.t_start) / STEP_PERIOD_S
+                steps += min(mv.steps, max(0.0, ran))
+            return steps
+
+    def busy(self) -> bool:
+        with self._cond:
+            return self.active is not None or any(self.queues.values())
+
+    def stats(self) -> dict:
+        with self._cond:
+            active = self.active
+            return {
+                "done_supported": self.done_supported,
+                "active":   {"axis": active.axis, "steps": active.steps, "ticket": active.ticket}
+                            if active else None,
+                "axes":     {ax: {"queued": len(q), "busy": bool(active and active.axis == ax),
+                                  "completed": self.completed[ax],
+                                  "last_exec_ms": round(self.last_exec[ax] * 1000, 1)}
+                             for ax, q in self.queues.items()},
+                "queued_s": round(self.queued_s, 3),
+                "dropped":  self.dropped,
+                "timeouts": self.timeouts,
+                "late_done": self.late_done,
+            }
+
+    def _model(self, mv: Move) -> float:
+        """Duración mínima de `mv` según el modelo: línea + pasos + pausa."""
+        return self.line_time(mv.line) + move_duration(mv.steps)
+
+    def _pending(self, tag) -> int:
+        n = sum(1 for q in self.queues.values() for mv in q if tag is None or mv.tag == tag)
+        if self.active is not None and (tag is None or self.active.tag == tag):
+            n += 1
+        return n
+
+    def _check_backlog(self):
+        """Con el lock tomado. Devuelve el evento de aviso al cruzar el umbral."""
+        if self._backlog:
+            if self.queued_s < self.backlog_warn_s / 2:
+                self._backlog = False
+            return None
+        if self.backlog_warn_s and self.queued_s > self.backlog_warn_s:
+            self._backlog = True
+            return {"type": "motion", "event": "backlog", "queued_s": round(self.queued_s, 3),
+                    "queued": sum(len(q) for q in self.queues.values())}
+        return None
+
+    def _check_idle(self):
+        with self._cond:
+            if not self._idle_waiters:
+                return
+            ready = [(t, fn) for t, fn in self._idle_waiters if not self._pending(t)]
+            self._idle_waiters = [w for w in self._idle_waiters if w not in ready]
+        for _, fn in ready:
+            fn()
+
+    # ---------- hilo despachador ----------
+    def _next(self):
+        """Cabeza de cola más antigua entre todos los ejes."""
+        best = None
+        for q in self.queues.values():
+            if q and (best is None or q[0].ticket < best[0].ticket):
+                best = q
+        return best.popleft() if best else None
+
+    def _emit(self, mv: Move, status: str, source: str = None):
+        now = time.monotonic()
+        info = {"axis": mv.axis, "steps": mv.steps, "dir": mv.dir, "ticket": mv.ticket}
+        if status != "dropped":
+            info.update(source=source,
+                        wait_ms=round((mv.t_start - mv.t_queued) * 1000, 1),
+                        exec_ms=round((now - mv.t_start) * 1000, 1))
+        if self.on_event:
+            self.on_event({"type": "motion", "event": status if status == "dropped" else "done",
+                           "tag": mv.tag, **info})
+        if mv.on_done:
+            mv.on_done("ok" if status != "dropped" else "dropped", **info)
+
+    def _finish(self, mv: Move, source: str):
+        self.completed[mv.axis] += 1
+        self.executed[mv.axis]  += mv.steps
+        self.last_exec[mv.axis] = time.monotonic() - mv.t_start
+        self._emit(mv, "ok", source)
+        self._check_idle()
+
+    def _run(self):
+        while True:
+            expired = None
+            with self._cond:
+                while not self._stop:
+                    now = time.monotonic()
+                    if self.active is not None:
+                        remaining = self.active.deadline - now
+                        if remaining > 0:
+                            self._cond.wait(remaining)
+                            continue
+                        expired, self.active = self.active, None
+                        if self.done_supported:
+                            self._late[expired.axis] += 1
+                        break
+                    mv = self._next()
+                    if mv is None:
+                        self._cond.wait()
+                        continue
+                    self.queued_s = max(0.0, self.queued_s - move_duration(mv.steps))
+                    self._check_backlog()
+                    model = self._model(mv)
+                    if self.done_supported:
+                        mv.deadline = now + model * DONE_TIMEOUT_K + DONE_TIMEOUT_S
+                    else:
+                        mv.deadline = now + model + MODEL_MARGIN_S
+                    mv.t_start  = now
+                    self.active = mv
+                    self.send(mv.line)
+                if self._stop:
+                    return
+            if self.done_supported:
+                self.timeouts += 1
+                self._finish(expired, "timeout")
+            else:
+                self._finish(expired, "model")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="motion", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(1.0)
+            self._thread = None
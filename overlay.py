@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Línea de telemetría sobre la cara (ROBOT_DISPLAY_OVERLAY=1 en display.py).
+
+Muestra los grados de cada eje (pbd_sample), el estado PBD (grabando,
+reproduciendo, en pausa) y los comandos por segundo, en la franja negra de
+abajo de las caras.
+
+El texto no se renderiza con la fuente en cada fotograma: `GlyphAtlas`
+dibuja una vez cada carácter en una celda de ancho fijo de una sola
+Surface, y escribir es un blit por carácter. Como todas las celdas miden lo
+mismo, `OverlayStrip` compara el texto nuevo con el que hay en pantalla
+carácter a carácter y solo repinta los tramos que cambian (fondo de la cara
++ glifos); el resto de la pantalla no se toca.
+"""
+
+import threading
+from collections import deque
+
+import pygame
+
+OVERLAY_FONT_SIZE = 20
+OVERLAY_COLOR     = (200, 200, 200)
+OVERLAY_POS       = (16, 455)       # franja negra de las caras (y >= 448)
+OVERLAY_CHARS     = 64              # ancho de la línea en caracteres
+# Solo lo que escribe Telemetry.text(): la celda mide lo que el glifo más ancho
+OVERLAY_CHARSET   = " 0123456789+-.:/|ABCDELMPRSUYs"
+RATE_WINDOW_S     = 5.0             # ventana de la tasa de comandos
+
+# Eje -> etiqueta corta
+AXIS_LABELS = {1: "B", 2: "S1", 3: "S2"}
+
+class GlyphAtlas:
+    """Glifos de `charset` pre-renderizados en celdas de ancho fijo."""
+
+    def __init__(self, size=OVERLAY_FONT_SIZE, color=OVERLAY_COLOR,
+                 charset=OVERLAY_CHARSET, font_path=None):
+        font = pygame.font.Font(font_path, size)
+        self.cell_w = max(font.size(c)[0] for c in charset)
+        self.cell_h = font.get_linesize()
+        self.index  = {c: i for i, c in enumerate(charset)}
+        sheet = pygame.Surface((len(charset) * self.cell_w, self.cell_h), pygame.SRCALPHA)
+        sheet.fill((0, 0, 0, 0))
+        for c, i in self.index.items():
+            glyph = font.render(c, True, color)
+            # centrado en su celda: los números quedan alineados en columna
+            sheet.blit(glyph, (i * self.cell_w + (self.cell_w - glyph.get_width()) // 2, 0))
+        try:
+            sheet = sheet.convert_alpha()
+        except pygame.error:
+            pass                # sin pantalla (benchmarks): formato propio
+        self.sheet = sheet
+
+    def draw(self, dest, text: str, pos):
+        """Escribe `text` en `pos`; los caracteres fuera del atlas quedan en blanco."""
+        x, y = pos
+        area = pygame.Rect(0, 0, self.cell_w, self.cell_h)
+        for c in text:
+            i = self.index.get(c)
+            if i is not None and c != " ":
+                area.x = i * self.cell_w
+                dest.blit(self.sheet, (x, y), area)
+            x += self.cell_w
+
+class OverlayStrip:
+    """Una línea de `chars` caracteres en `pos` que se repinta por tramos."""
+
+    def __init__(self, atlas: GlyphAtlas, pos=OVERLAY_POS, chars=OVERLAY_CHARS):
+        self.atlas = atlas
+        self.chars = chars
+        self.rect  = pygame.Rect(pos, (chars * atlas.cell_w, atlas.cell_h))
+        self.shown = None       # texto en pantalla (None = hay que pintarlo entero)
+
+    def invalidate(self):
+        """La cara se redibujó debajo: la próxima vez se pinta todo."""
+        self.shown = None
+
+    def draw(self, dest, background, text: str):
+        """Pinta lo que cambió respecto a lo que hay en pantalla. Devuelve
+           los rectángulos tocados (vacío si el texto es el mismo).
+        """
+        text = text[:self.chars].ljust(self.chars)
+        old = self.shown
+        rects = []
+        i = 0
+        while i < self.chars:
+            if old is not None and old[i] == text[i]:
+                i += 1
+                continue
+            j = i + 1
+            while j < self.chars and (old is None or old[j] != text[j]):
+                j += 1
+            cw = self.atlas.cell_w
+            r = pygame.Rect(self.rect.x + i * cw, self.rect.y, (j - i) * cw, self.rect.h)
+            dest.blit(background, r, r)
+            self.atlas.draw(dest, text[i:j], r.topleft)
+            rects.append(r)
+            i = j
+        self.shown = text
+        return rects
+
+class Telemetry:
+    """Estado mostrado en la línea. Se alimenta desde el hilo de red y se
+       lee desde el de render; `version` cambia con cada dato nuevo.
+    """
+    def __init__(self, axes=AXIS_LABELS, window=RATE_WINDOW_S):
+        self.labels   = dict(axes)
+        self.deg      = {ax: None for ax in self.labels}
+        self.pbd      = False
+        self.rec      = False
+        self.playing  = False
+        self.paused   = False
+        self.window   = window
+        self.cmd_times = deque()
+        self.version  = 0
+        self.lock     = threading.Lock()
+
+    def sample(self, axis: int, deg: float):
+        if axis not in self.deg:
+            return
+        with self.lock:
+            self.deg[axis] = deg
+            self.version += 1
+
+    def command(self, msg: dict, now: float):
+        """Eco de un comando aceptado (tipo "commands" del 6001)."""
+        action = msg.get("action") if msg.get("cmd") == "pbd" else None
+        with self.lock:
+            self.cmd_times.append(now)
+            if action == "enter":
+                self.pbd = True
+            elif action == "exit":
+                self.pbd = self.rec = False
+            elif action == "recstart":
+                self.rec = True
+            elif action == "recstop":
+                self.rec = False
+            elif action in ("play", "playrev", "play_all", "playrev_all"):
+                self.playing, self.paused = True, False
+            elif action == "pause":
+                self.paused = True
+            elif action == "resume":
+                self.paused = False
+            self.version += 1
+
+    def event(self, msg: dict):
+        """Eventos del servidor: el fin de una reproducción llega como play_report."""
+        if msg.get("type") == "play_report":
+            with self.lock:
+                self.playing = self.paused = False
+                self.version += 1
+
+    def pending(self) -> bool:
+        """¿Cambia la tasa con el tiempo (hay comandos dentro de la ventana)?"""
+        with self.lock:
+            return bool(self.cmd_times)
+
+    def text(self, now: float) -> str:
+        with self.lock:
+            times = self.cmd_times
+            while times and now - times[0] > self.window:
+                times.popleft()
+            rate = len(times) / self.window
+            axes = "  ".join(f"{label:>2} {self._deg(ax):>7}" for ax, label in self.labels.items())
+            if self.rec:
+                mode = "REC"
+            elif self.playing:
+                mode = "PAUSE" if self.paused else "PLAY"
+            elif self.pbd:
+                mode = "PBD"
+            else:
+                mode = "-"
+        return f"{axes}   | {mode:<5} | CMD {rate:4.1f}/s"
+
+    def _deg(self, axis: int) -> str:
+        deg = self.deg[axis]
+        return "---" if deg is None else f"{deg:+.1f}"
+
+class TelemetryOverlay:
+    """Telemetría + línea, limitada a `hz` repintados por segundo."""
+
+    def __init__(self, telemetry: Telemetry, strip: OverlayStrip, hz: float):
+        self.telemetry = telemetry
+        self.strip     = strip
+        self.period    = 1.0 / hz
+        self.drawn_t   = 0.0
+        self.drawn_version = None
+
+    @property
+    def rect(self):
+        return self.strip.rect
+
+    def invalidate(self):
+        self.strip.invalidate()
+
+    def next_due(self, now: float) -> float:
+        """Próximo instante en que hay que repintar (inf si nada cambia)."""
+        if (self.strip.shown is not None and self.drawn_version == self.telemetry.version
+                and not self.telemetry.pending()):
+            return float("inf")
+        return max(now, self.drawn_t + self.period)
+
+    def draw(self, dest, background, now: float, force: bool = False):
+        if not force and self.strip.shown is not None and now < self.next_due(now):
+            return []
+        self.drawn_version = self.telemetry.version
+        self.drawn_t = now
+        return self.strip.draw(dest, background, self.telemetry.text(now))
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Motor de reproducción PBD guiado por plazos absolutos.
+
+Cada paso de la línea de tiempo es (t_rel, eje, comando). El motor espera
+hasta t0 + t_rel en el reloj monotónico, así el tiempo que se tarda en
+enviar un comando no se acumula como deriva en los pasos siguientes.
+"""
+
+import math
+import threading
+import time
+
+class TimingStats:
+    """Error de temporización por paso: retraso respecto al plazo."""
+    def __init__(self):
+        self.n        = 0
+        self.sum      = 0.0
+        self.sum_sq   = 0.0
+        self.max_late = 0.0
+        self.last     = 0.0
+
+    def add(self, late: float):
+        self.n      += 1
+        self.sum    += late
+        self.sum_sq += late * late
+        self.last    = late
+        if late > self.max_late:
+            self.max_late = late
+
+    def as_dict(self) -> dict:
+        mean   = self.sum / self.n if self.n else 0.0
+        var    = self.sum_sq / self.n - mean * mean if self.n else 0.0
+        return {
+            "steps":        self.n,
+            "mean_late_ms": round(mean * 1000, 3),
+            "jitter_ms":    round(math.sqrt(max(0.0, var)) * 1000, 3),
+            "max_late_ms":  round(self.max_late * 1000, 3),
+            "drift_ms":     round(self.last * 1000, 3),   # retraso del último paso
+        }
+
+def merge_timelines(timelines, sequential: bool = False):
+    """Une las líneas de tiempo de varios ejes en una sola ordenada por t.
+       Con sequential=True cada eje empieza cuando termina el anterior.
+    """
+    merged = []
+    offset = 0.0
+    for steps in timelines:
+        if not steps:
+            continue
+        if sequential:
+            merged.extend((offset + t, axis, cmd) for t, axis, cmd in steps)
+            offset += steps[-1][0]
+        else:
+            merged.extend(steps)
+    merged.sort(key=lambda s: s[0])
+    return merged
+
+class PlaybackEngine:
+    """Reproduce una línea de tiempo en un hilo propio con pausa, reanudación
+       y aborto. `send(cmd)` envía un comando; `on_done(report)` recibe el
+       informe de temporización al terminar y `on_step(late)` el retraso de
+       cada paso (s).
+    """
+    def __init__(self, send, on_done=None, on_step=None):
+        self.send     = send
+        self.on_done  = on_done
+        self.on_step  = on_step
+        self.state    = "idle"          # idle | playing | paused
+        self.label    = None
+        self._lock    = threading.Lock()
+        self._thread  = None
+        self._wake    = threading.Event()   # interrumpe la espera del plazo
+        self._paused  = False
+        self._abort   = False
+        self._reason  = None            # motivo del aborto (None = a petición)
+
+    def is_busy(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, steps, label: str = "") -> bool:
+        """Lanza la reproducción. Devuelve False si ya hay una en curso."""
+        with self._lock:
+            if self.is_busy():
+                return False
+            self._paused = False
+            self._abort  = False
+            self._reason = None
+            self._wake.clear()
+            self.state   = "playing"
+            self.label   = label
+            self._thread = threading.Thread(target=self._run, args=(list(steps), label),
+                                            name="playback", daemon=True)
+            self._thread.start()
+            return True
+
+    def pause(self) -> bool:
+        with self._lock:
+            if not self.is_busy() or self._paused:
+                return False
+            self._paused = True
+            self.state   = "paused"
+            self._wake.set()
+            return True
+
+    def resume(self) -> bool:
+        with self._lock:
+            if not self.is_busy() or not self._paused:
+                return False
+            self._paused = False
+            self.state   = "playing"
+            self._wake.set()
+            return True
+
+    def abort(self, reason: str = None) -> bool:
+        """Detiene la reproducción antes del siguiente paso; `reason` va al
+           informe (p.ej. una bandera de kinematics.py).
+        """
+        with self._lock:
+            if not self.is_busy():
+                return False
+            if not self._abort:
+                self._reason = reason       # el primer motivo es el que cuenta
+            self._abort = True
+            self._wake.set()
+            return True
+
+    def _wait_until(self, deadline: float) -> float:
+        """Espera hasta `deadline` atendiendo pausa/aborto. Devuelve cuánto
+           tiempo estuvo en pausa (para desplazar los plazos siguientes).
+        """
+        paused_for = 0.0
+        while not self._abort:
+            if self._paused:
+                t_pause = time.monotonic()
+                while self._paused and not self._abort:
+                    self._wake.wait()
+                    self._wake.clear()
+                paused_for += time.monotonic() - t_pause
+                deadline   += time.monotonic() - t_pause
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._wake.wait(remaining)
+            self._wake.clear()
+        return paused_for
+
+    def _run(self, steps, label):
+        timing   = TimingStats()
+        t_start  = time.monotonic()
+        t0       = t_start
+        sent     = 0
+        for t_rel, axis, cmd in steps:
+            t0 += self._wait_until(t0 + t_rel)
+            if self._abort:
+                break
+            late = time.monotonic() - (t0 + t_rel)
+            if cmd:
+                self.send(cmd)
+                sent += 1
+            timing.add(late)
+            if self.on_step:
+                self.on_step(late)
+        planned = steps[-1][0] if steps else 0.0
+        report  = {
+            "type":       "play_report",
+            "label":      label,
+            "aborted":    self._abort,
+            "reason":     self._reason,
+            "commands":   sent,
+            "planned_s":  round(planned, 3),
+            "elapsed_s":  round(time.monotonic() - t_start, 3),
+            **timing.as_dict(),
+        }
+        with self._lock:
+            self.state = "idle"
+            self.label = None
+        if self.on_done:
+            self.on_done(report)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Mirada que sigue la pose real del brazo (modo "pose" de display.py).
+
+Las caras de movimiento solo desplazan las pupilas unos 8 px dentro del ojo.
+Aquí ese desplazamiento es continuo: el eje 1 (base) mueve la mirada en
+horizontal y los ejes 2 y 3 (segmentos) en vertical.
+
+`GazeAtlas` pre-renderiza, al arrancar, cada ojo con la pupila desplazada a
+GAZE_LEVELS x GAZE_LEVELS posiciones en una sola Surface; dibujar una
+mirada es un blit por ojo desde su celda, sin escalar ni componer nada.
+
+`PoseTracker` interpola entre muestras de encoder: cada muestra nueva se
+alcanza en el tiempo medio entre muestras, así a 1 Hz la mirada se desliza
+durante el segundo siguiente en lugar de saltar (a cambio de una muestra
+de retraso).
+"""
+
+import threading
+
+import pygame
+
+# Geometría de los ojos en las BMP de 800x480 (se escala con la pantalla)
+BASE_SIZE    = (800, 480)
+EYE_CENTERS  = ((250, 184), (550, 184))
+EYE_RADIUS   = 76       # interior blanco del ojo (dentro del aro negro)
+PUPIL_RADIUS = 66       # pupila negra con sus brillos
+GAZE_MAX_PX  = 8        # desplazamiento de las caras izquierda/derecha/arriba/abajo
+GAZE_LEVELS  = 9        # posiciones por eje: pasos de 2 px
+
+# Ángulo (grados desde el arranque del encoder) que lleva la mirada al tope
+POSE_RANGE_DEG = {1: 90.0, 2: 60.0, 3: 60.0}
+SAMPLE_PERIOD_MIN_S = 1 / 30.0  # interpolación mínima (muestreo rápido)
+SAMPLE_PERIOD_MAX_S = 1.5       # una pausa larga no alarga el tramo
+PERIOD_ALPHA        = 0.3       # suavizado del periodo entre muestras
+
+def _clamp(v, lo=-1.0, hi=1.0):
+    return lo if v < lo else hi if v > hi else v
+
+class GazeAtlas:
+    """Celdas pre-renderizadas de cada ojo indexadas por (ix, iy)."""
+
+    def __init__(self, face, levels: int = GAZE_LEVELS):
+        sx = face.get_width() / BASE_SIZE[0]
+        sy = face.get_height() / BASE_SIZE[1]
+        s = min(sx, sy)
+        self.levels  = levels
+        self.radius  = round(EYE_RADIUS * s)
+        self.pupil   = round(PUPIL_RADIUS * s)
+        self.max_px  = GAZE_MAX_PX * s
+        self.size    = 2 * self.radius
+        self.centers = [(round(cx * sx), round(cy * sy)) for cx, cy in EYE_CENTERS]
+        self.rects   = [pygame.Rect(cx - self.radius, cy - self.radius, self.size, self.size)
+                        for cx, cy in self.centers]
+        self.sheets  = [self._build(face, rect) for rect in self.rects]
+
+    def offset(self, ix: int, iy: int):
+        """Desplazamiento (dx, dy) en px de la celda. En diagonal se limita
+           a max_px para que la pupila no pise el aro del ojo.
+        """
+        n = self.levels - 1
+        dx = (2 * ix / n - 1) * self.max_px
+        dy = (2 * iy / n - 1) * self.max_px
+        norm = (dx * dx + dy * dy) ** 0.5
+        if norm > self.max_px:
+            dx, dy = dx * self.max_px / norm, dy * self.max_px / norm
+        return round(dx), round(dy)
+
+    def _build(self, face, rect):
+        eye = face.subsurface(rect).copy()
+        r, p = self.radius, self.pupil
+        # Pupila recortada en círculo (alfa 0 fuera) para moverla sobre blanco
+        sprite = pygame.Surface((2 * p, 2 * p), pygame.SRCALPHA)
+        sprite.fill((0, 0, 0, 0))
+        pygame.draw.circle(sprite, (255, 255, 255, 255), (p, p), p)
+        sprite.blit(eye, (0, 0), pygame.Rect(r - p, r - p, 2 * p, 2 * p),
+                    special_flags=pygame.BLEND_RGBA_MIN)
+        white = eye.get_at((r, r - p - (r - p) // 2))   # entre pupila y aro
+        empty = eye.copy()
+        pygame.draw.circle(empty, white, (r, r), r - 1)
+
+        sheet = pygame.Surface((self.levels * self.size, self.levels * self.size))
+        for iy in range(self.levels):
+            for ix in range(self.levels):
+                x, y = ix * self.size, iy * self.size
+                dx, dy = self.offset(ix, iy)
+                sheet.blit(empty, (x, y))
+                sheet.blit(sprite, (x + r - p + dx, y + r - p + dy))
+        try:
+            return sheet.convert()
+        except pygame.error:
+            return sheet        # sin pantalla (benchmarks): formato propio
+
+    def cell(self, gx: float, gy: float):
+        """Celda para una mirada en [-1, 1] x [-1, 1]."""
+        n = self.levels - 1
+        return (round((_clamp(gx) + 1) * n / 2), round((_clamp(gy) + 1) * n / 2))
+
+    def blit(self, screen, cell):
+        """Dibuja los dos ojos en `cell`. Devuelve los rectángulos tocados."""
+        ix, iy = cell
+        area = pygame.Rect(ix * self.size, iy * self.size, self.size, self.size)
+        for sheet, rect in zip(self.sheets, self.rects):
+            screen.blit(sheet, rect, area)
+        return self.rects
+
+    @property
+    def nbytes(self) -> int:
+        return sum(s.get_bytesize() * s.get_width() * s.get_height() for s in self.sheets)
+
+class _AxisTrack:
+    __slots__ = ("start", "target", "t0", "dur", "last_t", "period")
+
+    def __init__(self):
+        self.start  = None
+        self.target = None
+        self.t0     = 0.0
+        self.dur    = 0.0
+        self.last_t = None
+        self.period = SAMPLE_PERIOD_MAX_S
+
+    def value(self, now: float):
+        if self.target is None:
+            return 0.0
+        if self.dur <= 0 or now >= self.t0 + self.dur:
+            return self.target
+        return self.start + (self.target - self.start) * (now - self.t0) / self.dur
+
+    def add(self, deg: float, now: float):
+        if self.target is None:
+            self.start = self.target = deg
+            self.last_t = now
+            return
+        if self.last_t is not None:
+            dt = now - self.last_t
+            self.period += PERIOD_ALPHA * (dt - self.period)
+        self.start  = self.value(now)
+        self.target = deg
+        self.t0     = now
+        self.dur    = min(SAMPLE_PERIOD_MAX_S, max(SAMPLE_PERIOD_MIN_S, self.period))
+        self.last_t = now
+
+class PoseTracker:
+    """Ángulos interpolados de los tres ejes y mirada resultante.
+       `add_sample()` se llama desde el hilo de red; el resto, desde el
+       bucle de render.
+    """
+    def __init__(self, ranges=None):
+        self.ranges = dict(POSE_RANGE_DEG if ranges is None else ranges)
+        self.axes   = {ax: _AxisTrack() for ax in self.ranges}
+        self.lock   = threading.Lock()
+        self.samples = 0
+
+    def add_sample(self, axis: int, deg: float, now: float):
+        track = self.axes.get(axis)
+        if track is None:
+            return
+        with self.lock:
+            track.add(deg, now)
+            self.samples += 1
+
+    def moving(self, now: float) -> bool:
+        with self.lock:
+            return any(t.target is not None and now < t.t0 + t.dur for t in self.axes.values())
+
+    def angles(self, now: float) -> dict:
+        with self.lock:
+            return {ax: t.value(now) for ax, t in self.axes.items()}
+
+    def gaze(self, now: float):
+        """(gx, gy) en [-1, 1]: +x derecha (base), -y arriba (segmentos)."""
+        a = self.angles(now)
+        gx = a.get(1, 0.0) / self.ranges.get(1, 1.0)
+        up = [a[ax] / self.ranges[ax] for ax in (2, 3) if ax in a]
+        gy = -sum(up) / len(up) if up else 0.0
+        return _clamp(gx), _clamp(gy)
@@ -40,20 +40,27 @@ Adafruit_NeoPixel pixels(NUM_PIXELS, PIXEL_PIN, NEO_GRB + NEO_KHZ800);
 
 // ——— Grabación de encoders ———
 bool recording = false;
-byte recordAxis = 0;                   // 1 o 2
+byte recordAxes[3];                    // ejes que se muestrean, en orden
+byte numRecordAxes = 0;
 unsigned long lastSample = 0;
-const unsigned long sampleInterval = 1000; // ms entre muestras
+unsigned long sampleInterval = 1000;   // ms entre rondas de muestras (record start ... <ms>)
+const unsigned long minSampleInterval = 10;
+// Muestras durante un move (track <ms>): cada trackInterval ms mientras se
+// dan pasos y una al final, antes del {"done":N}. 0 = sin muestras (defecto)
+unsigned long trackInterval = 0;
 
 // ——— Modo PBD ———
 bool pbdMode = false;  // Programación por demostración activa?
 
 // Prototipos\ void processCommand(const String &cmd);
-void moveMotor(int, int, int, char, int);
+void moveMotor(int, int, int, char, int, byte);
 void startAxis(int);
 void endAxis(int);
 void moveScreen(int, char);
 void disableAxis(int);
 void enableAxis(int);
+void sendSample(byte);
+void stopRecording();
 
 void setup() {
 
@@ -107,21 +114,41 @@ void loop() {
   }
 
   // — Muestreo en grabación dentro de PBD —
+  // Cada intervalo se leen por turno todos los ejes seleccionados.
   if (pbdMode && recording && (millis() - lastSample >= sampleInterval)) {
-    lastSample = millis();
-    long pos = LONG_MIN;
-    if (recordAxis == 1) pos = servo1.getCurrentPosition(ID1);
-    else if (recordAxis == 2) pos = servo2.getCurrentPosition(ID2);
-    else if (recordAxis == 3) pos = servo3.getCurrentPosition(ID3);
-    if (pos != LONG_MIN) {
-      // Enviar al BeagleBone y debug JSON
-      String js = String("{\"axis\":") + recordAxis
-                  + ",\"pos\":" + pos + "}";
-      Serial.println(js);
+    lastSample += sampleInterval;
+    // Si vamos atrasados más de un intervalo, no intentar recuperar
+    if (millis() - lastSample >= sampleInterval) lastSample = millis();
+    for (byte i = 0; i < numRecordAxes; i++) {
+      sendSample(recordAxes[i]);
     }
   }
 }
 
+void sendSample(byte axis) {
+  long pos = LONG_MIN;
+  if (axis == 1) pos = servo1.getCurrentPosition(ID1);
+  else if (axis == 2) pos = servo2.getCurrentPosition(ID2);
+  else if (axis == 3) pos = servo3.getCurrentPosition(ID3);
+  if (pos != LONG_MIN) {
+    // Enviar al BeagleBone: {"axis":N,"pos":M} (sin String para no fragmentar el heap)
+    Serial.print(F("{\"axis\":"));
+    Serial.print(axis);
+    Serial.print(F(",\"pos\":"));
+    Serial.print(pos);
+    Serial.println('}');
+  }
+}
+
+void stopRecording() {
+  for (byte i = 0; i < numRecordAxes; i++) {
+    enableAxis(recordAxes[i]);
+    endAxis(recordAxes[i]);
+  }
+  recording = false;
+  numRecordAxes = 0;
+}
+
 void processCommand(const String &cmd) {
 
   if (cmd == "pbd start") {
@@ -130,8 +157,7 @@ void processCommand(const String &cmd) {
   }
   if (cmd == "pbd stop") {
     pbdMode = false;
-    recording = false;
-    endAxis(recordAxis);
+    if (recording) stopRecording();
     return;
   }
 
@@ -145,44 +171,87 @@ void processCommand(const String &cmd) {
     startAxis(motor);
     moveScreen(motor, dir);
     switch (motor) {
-      case 1: moveMotor(stepPin1, dirPin1, enablePin1, dir, steps); break;
-      case 2: moveMotor(stepPin2, dirPin2, enablePin2, dir, steps); break;
-      case 3: moveMotor(stepPin3, dirPin3, enablePin3, dir, steps); break;
+      case 1: moveMotor(stepPin1, dirPin1, enablePin1, dir, steps, 1); break;
+      case 2: moveMotor(stepPin2, dirPin2, enablePin2, dir, steps, 2); break;
+      case 3: moveMotor(stepPin3, dirPin3, enablePin3, dir, steps, 3); break;
     }
     delay(100);
     endAxis(motor);
     if (motor==1) screenServo.write(restAngle);
     if (motor==2) segmentServo.write(restAngle);
     if (motor==3) segmentServo.write(restAngle);
+    // Aviso de fin para la cola de movimientos del BeagleBone: {"done":N}
+    if (motor >= 1 && motor <= 3) {
+      Serial.print(F("{\"done\":"));
+      Serial.print(motor);
+      Serial.println('}');
+    }
+  }
+  else if (cmd.startsWith("track")) {
+    // Formato: track <ms>   (track 0 las desactiva)
+    long ms = cmd.substring(5).toInt();
+    trackInterval = (ms <= 0) ? 0 : max((unsigned long)ms, minSampleInterval);
   }
   else if (cmd.startsWith("record start")) {
-    byte m = cmd.substring(cmd.lastIndexOf(' ') + 1).toInt();
-    if ((m==1||m==2||m==3) && pbdMode) {
-      recordAxis = m;
-      recording = true;
-      lastSample = millis();
-      disableAxis(m);
-      startAxis(m);
-      Serial.println(F("{\"record\":\"start\"}"));
+    // Formato: record start <ejes> [intervalo_ms]
+    //   record start 2          -> eje 2 cada 1000 ms (compatible)
+    //   record start 1,2,3 50   -> ejes 1, 2 y 3 cada 50 ms
+    if (!pbdMode) return;
+    String args = cmd.substring(12);
+    args.trim();
+    int space = args.indexOf(' ');
+    String axesStr = (space > 0) ? args.substring(0, space) : args;
+    unsigned long interval = (space > 0) ? (unsigned long)args.substring(space + 1).toInt() : 1000;
+    if (interval < minSampleInterval) interval = minSampleInterval;
+
+    byte axes[3];
+    byte n = 0;
+    int from = 0;
+    while (from < (int)axesStr.length() && n < 3) {
+      int comma = axesStr.indexOf(',', from);
+      if (comma < 0) comma = axesStr.length();
+      byte m = axesStr.substring(from, comma).toInt();
+      bool dup = false;
+      for (byte i = 0; i < n; i++) if (axes[i] == m) dup = true;
+      if ((m==1||m==2||m==3) && !dup) axes[n++] = m;
+      from = comma + 1;
     }
+    if (n == 0) return;
+
+    if (recording) stopRecording();
+    for (byte i = 0; i < n; i++) {
+      recordAxes[i] = axes[i];
+      disableAxis(axes[i]);
+      startAxis(axes[i]);
+    }
+    numRecordAxes = n;
+    sampleInterval = interval;
+    recording = true;
+    lastSample = millis();
+    Serial.println(F("{\"record\":\"start\"}"));
   }
   else if (cmd == "record stop") {
     if (recording && pbdMode) {
-      recording = false;
-      enableAxis(recordAxis);
-      endAxis(recordAxis);
+      stopRecording();
       Serial.println(F("{\"record\":\"stop\"}"));
     }
   }
 }
 
-void moveMotor(int stepPin, int dirPin, int enablePin, char dir, int steps) {
+void moveMotor(int stepPin, int dirPin, int enablePin, char dir, int steps, byte axis) {
   digitalWrite(enablePin, enableActive);
   digitalWrite(dirPin, dir=='f' ? HIGH : LOW);
+  unsigned long lastTrack = millis();
   for (int i = 0; i < steps; i++) {
     digitalWrite(stepPin, HIGH); delayMicroseconds(600);
     digitalWrite(stepPin, LOW);  delayMicroseconds(600);
+    // Leer el encoder para unos ms el tren de pasos (~3% con track 100)
+    if (trackInterval && millis() - lastTrack >= trackInterval) {
+      lastTrack = millis();
+      sendSample(axis);
+    }
   }
+  if (trackInterval) sendSample(axis);
 }
 
 void startAxis(int m) {
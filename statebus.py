@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Difusión de estado del puerto 6001: mensajes, suscriptores y bus.
+
+La usan main.py (estado en vivo) y staterec.py (reproducción de una
+grabación), así un cliente no distingue una fuente de la otra: mismos
+formatos, mismos filtros de suscripción y misma política de desborde.
+"""
+
+import asyncio
+import json
+import struct
+import threading
+import time
+from collections import deque
+
+# Escala de las muestras de encoder (campos derivados rev/steps/deg)
+ENC_COUNTS_PER_REV = 65536.0   # 1 vuelta encoder
+STEPS_PER_REV      = 3200.0    # 1 vuelta driver (comando move)
+
+# Cada suscriptor tiene su propia cola acotada y su propio escritor, así un
+# cliente lento o colgado nunca frena a quien publica ni al resto.
+STATE_QUEUE_MAX     = 256             # mensajes pendientes por suscriptor
+STATE_OVERFLOW      = "drop_oldest"   # política por defecto al llenarse la cola
+OVERFLOW_POLICIES   = ("drop_oldest", "drop_newest", "disconnect")
+STATE_WRITE_BUFFER  = 16 * 1024       # bytes en el socket antes de esperar drain()
+
+# Tipos de mensaje a los que se puede suscribir un cliente
+KIND_SAMPLE  = "samples"    # pbd_sample del encoder
+KIND_COMMAND = "commands"   # eco de comandos recibidos en el puerto 6000
+KIND_EVENT   = "events"     # resto de notificaciones del servidor
+KIND_KINEMATICS = "kinematics"   # velocidad/aceleración/pose por muestra (kinematics.py)
+STATE_KINDS  = (KIND_SAMPLE, KIND_COMMAND, KIND_EVENT, KIND_KINEMATICS)
+PER_AXIS_KINDS = (KIND_SAMPLE, KIND_KINEMATICS)   # admiten axes/decimate/max_rate
+
+# Formatos de salida:
+#   json    -> una línea JSON por mensaje (formato histórico)
+#   compact -> JSON sin los campos derivados rev/steps/deg de las muestras
+#   binary  -> tramas [tipo u8][largo u16][payload], little-endian:
+#              tipo 1 = muestra, payload <B d i> (eje, ts, pos_raw), 16 bytes fijos
+#              tipo 2 = JSON (ecos, eventos y cinemática), payload UTF-8
+STATE_FORMATS     = ("json", "compact", "binary")
+FRAME_HEADER      = struct.Struct("<BH")
+FRAME_SAMPLE      = struct.Struct("<BHBdi")
+SAMPLE_PAYLOAD    = struct.Struct("<Bdi")
+FRAME_TYPE_SAMPLE = 1
+FRAME_TYPE_JSON   = 2
+FRAME_MAX_PAYLOAD = 0xFFFF          # el largo va en un u16
+
+class StateMessage:
+    """Mensaje del puerto 6001. Cada formato se codifica una sola vez, la
+       primera vez que algún suscriptor lo pide, y se comparte entre todos.
+    """
+    __slots__ = ("kind", "axis", "ts", "pos", "text", "kin", "_enc")
+
+    def __init__(self, kind, text=None, axis=None, ts=None, pos=None, kin=None):
+        self.kind = kind
+        self.text = text
+        self.axis = axis
+        self.ts   = ts
+        self.pos  = pos
+        self.kin  = kin
+        self._enc = {}
+
+    @classmethod
+    def sample(cls, axis: int, ts: float, pos: int):
+        return cls(KIND_SAMPLE, axis=axis, ts=ts, pos=pos)
+
+    @classmethod
+    def kinematics(cls, axis: int, ts: float, kin):
+        """`kin` = (deg, vel, acc, flags, x, y, z) de Kinematics.update();
+           deg es el ángulo de la articulación (con su cero HOME_DEG).
+        """
+        return cls(KIND_KINEMATICS, axis=axis, ts=ts, kin=kin)
+
+    def _kin_text(self, compact: bool) -> str:
+        deg, vel, acc, flags, x, y, z = self.kin
+        c, k = (",", ":") if compact else (", ", ": ")     # separadores de json.dumps
+        return (f'{{"type"{k}"kinematics"{c}"ts"{k}{self.ts!r}{c}"axis"{k}{self.axis}{c}'
+                f'"deg"{k}{deg:.3f}{c}"vel"{k}{vel:.3f}{c}"acc"{k}{acc:.3f}{c}'
+                f'"stall"{k}{"true" if flags & 1 else "false"}{c}'
+                f'"overspeed"{k}{"true" if flags & 2 else "false"}{c}'
+                f'"xyz"{k}[{x:.2f}{c}{y:.2f}{c}{z:.2f}]}}')
+
+    def _encode(self, fmt: str) -> bytes:
+        if self.kind == KIND_SAMPLE:
+            if fmt == "binary":
+                return FRAME_SAMPLE.pack(FRAME_TYPE_SAMPLE, FRAME_SAMPLE.size - FRAME_HEADER.size,
+                                         self.axis, self.ts, self.pos)
+            # Plantillas equivalentes a json.dumps (repr de float) sin crear dicts
+            if fmt == "json":
+                rev = self.pos / ENC_COUNTS_PER_REV
+                return (f'{{"type": "pbd_sample", "ts": {self.ts!r}, "axis": {self.axis}, '
+                        f'"pos_raw": {self.pos}, "rev": {rev!r}, '
+                        f'"steps": {rev * STEPS_PER_REV!r}, "deg": {rev * 360.0!r}}}\n').encode()
+            return (f'{{"type":"pbd_sample","ts":{self.ts!r},"axis":{self.axis},'
+                    f'"pos_raw":{self.pos}}}\n').encode()
+        if self.kin is not None:
+            payload = self._kin_text(fmt == "compact").encode()
+        else:
+            payload = self.text.encode()
+        if fmt == "binary":
+            if len(payload) > FRAME_MAX_PAYLOAD:
+                # No cabe en una trama: el suscriptor binario recibe un error
+                payload = json.dumps({"type": "error", "error": "mensaje demasiado grande "
+                                      "para el formato binario", "kind": self.kind,
+                                      "bytes": len(payload)}).encode()
+            return FRAME_HEADER.pack(FRAME_TYPE_JSON, len(payload)) + payload
+        return payload + b"\n"
+
+    def encode(self, fmt: str) -> bytes:
+        data = self._enc.get(fmt)
+        if data is None:
+            data = self._enc[fmt] = self._encode(fmt)
+        return data
+
+class StateSubscriber:
+    """Suscriptor del puerto 6001 con cola de salida acotada.
+       `offer()` se llama desde cualquier hilo y nunca bloquea; `run()` es la
+       corrutina que vacía la cola hacia el socket.
+    """
+    def __init__(self, writer, addr, loop, maxlen=STATE_QUEUE_MAX, policy=STATE_OVERFLOW,
+                 on_wait=None, log=None):
+        self.writer    = writer
+        self.addr      = addr
+        self.loop      = loop
+        self.maxlen    = maxlen
+        self.policy    = policy
+        self.on_wait   = on_wait      # f(s) con la espera en cola de cada lote
+        self.log       = log
+        self.queue     = deque()
+        self.oldest_t  = 0.0          # perf_counter del mensaje más antiguo en cola
+        self.lock      = threading.Lock()
+        self.wakeup    = asyncio.Event()
+        self.closed    = False
+        # Suscripción (por defecto: todo, en JSON)
+        self.format       = "json"
+        self.types        = None      # None = todos los tipos
+        self.axes         = None      # None = todos los ejes
+        self.decimate     = 1
+        self.min_interval = 0.0       # s entre muestras del mismo eje (max_rate)
+        self._dec_count   = {}
+        self._last_ts     = {}
+        # Contadores
+        self.sent      = 0
+        self.dropped   = 0
+        self.max_depth = 0
+
+    def subscribe(self, msg: dict):
+        """Aplica un mensaje {"cmd":"subscribe", ...} recibido del cliente."""
+        fmt = msg.get("format", "json")
+        if fmt not in STATE_FORMATS:
+            raise ValueError(f"formato desconocido: {fmt}")
+        types = msg.get("types")
+        if types is not None:
+            types = frozenset(types)
+            if not types <= set(STATE_KINDS):
+                raise ValueError(f"tipos desconocidos: {sorted(types - set(STATE_KINDS))}")
+        axes = msg.get("axes")
+        if axes is not None:
+            axes = frozenset(int(a) for a in axes)
+        decimate = max(1, int(msg.get("decimate", 1)))
+        max_rate = float(msg.get("max_rate", 0) or 0)
+        policy   = msg.get("policy", self.policy)
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"política desconocida: {policy}")
+
+        self.format       = fmt
+        self.types        = types
+        self.axes         = axes
+        self.decimate     = decimate
+        self.min_interval = 1.0 / max_rate if max_rate > 0 else 0.0
+        self.policy       = policy
+        self.maxlen       = max(1, int(msg.get("queue", self.maxlen)))
+        self._dec_count   = {}
+        self._last_ts     = {}
+
+    def wants(self, m: StateMessage) -> bool:
+        """Filtro de suscripción. Cambia los contadores de decimate/max_rate:
+           se llama con el lock del bus tomado (StateBus.publish).
+        """
+        if self.types is not None and m.kind not in self.types:
+            return False
+        axis = m.axis
+        if m.kind not in PER_AXIS_KINDS or axis is None:
+            return True
+        if self.axes is not None and axis not in self.axes:
+            return False
+        # Contadores separados para muestras y cinemática del mismo eje
+        key = axis if m.kind == KIND_SAMPLE else (m.kind, axis)
+        if self.decimate > 1:
+            n = self._dec_count.get(key, 0)
+            self._dec_count[key] = n + 1
+            if n % self.decimate:
+                return False
+        if self.min_interval:
+            last = self._last_ts.get(key)
+            if last is not None and m.ts - last < self.min_interval:
+                return False
+            self._last_ts[key] = m.ts
+        return True
+
+    def _wake(self):
+        try:
+            in_loop = asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            in_loop = False
+        if in_loop:
+            self.wakeup.set()
+        else:
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+
+    def offer(self, data: bytes):
+        """Encola `data` aplicando la política de desborde."""
+        if self.closed:
+            return
+        with self.lock:
+            if len(self.queue) >= self.maxlen:
+                self.dropped += 1
+                if self.policy == "drop_newest":
+                    return
+                if self.policy == "disconnect":
+                    self.closed = True
+                    self.queue.clear()
+                    wake = True
+                else:
+                    self.queue.popleft()
+            if not self.closed:
+                self.queue.append(data)
+                depth = len(self.queue)
+                if depth > self.max_depth:
+                    self.max_depth = depth
+                wake = depth == 1
+                if wake:
+                    self.oldest_t = time.perf_counter()
+        if wake:
+            self._wake()
+
+    def event(self, obj: dict):
+        """Envía un evento solo a este suscriptor (respuestas, errores)."""
+        self.offer(StateMessage(KIND_EVENT, text=json.dumps(obj)).encode(self.format))
+
+    async def run(self):
+        """Escritor del suscriptor: vuelca la cola en lotes."""
+        self.writer.transport.set_write_buffer_limits(high=STATE_WRITE_BUFFER)
+        try:
+            while not self.closed:
+                await self.wakeup.wait()
+                self.wakeup.clear()
+                with self.lock:
+                    n = len(self.queue)
+                    batch = b"".join(self.queue)
+                    self.queue.clear()
+                    oldest = self.oldest_t
+                if batch:
+                    if self.on_wait:
+                        self.on_wait(time.perf_counter() - oldest)
+                    self.writer.write(batch)
+                    await self.writer.drain()
+                    self.sent += n
+            if self.policy == "disconnect" and self.dropped and self.log:
+                self.log.info("STATE", "%s desconectado por cola llena", self.addr)
+        except ConnectionError:
+            pass
+        finally:
+            self.closed = True
+            self.writer.close()
+
+    def stats(self) -> dict:
+        return {
+            "addr":      f"{self.addr[0]}:{self.addr[1]}" if self.addr else None,
+            "format":    self.format,
+            "types":     sorted(self.types) if self.types is not None else None,
+            "axes":      sorted(self.axes) if self.axes is not None else None,
+            "decimate":  self.decimate,
+            "policy":    self.policy,
+            "depth":     len(self.queue),
+            "max_depth": self.max_depth,
+            "maxlen":    self.maxlen,
+            "sent":      self.sent,
+            "dropped":   self.dropped,
+        }
+
+class StateBus:
+    """Suscriptores activos del puerto 6001.
+       `publish()` se puede llamar desde cualquier hilo; solo encola, nunca
+       toca la red. `on_command(sub, msg)` recibe las líneas del cliente que
+       no son "subscribe" (p.ej. el control de staterec.py).
+    """
+    def __init__(self, on_wait=None, log=None, on_command=None):
+        self.on_wait    = on_wait
+        self.log        = log
+        self.on_command = on_command
+        self.clients    = []
+        self.lock       = threading.Lock()
+
+    def __len__(self):
+        with self.lock:
+            return len(self.clients)
+
+    def subscribers(self):
+        with self.lock:
+            return self.clients[:]
+
+    def publish(self, message: StateMessage):
+        # Publican el lector serie, la reproducción y el bucle: el filtro
+        # (contadores por eje) va bajo el lock; codificar y encolar, fuera
+        with self.lock:
+            targets = [sub for sub in self.clients if sub.wants(message)]
+        for sub in targets:
+            sub.offer(message.encode(sub.format))
+
+    def close(self):
+        """Cierra todas las conexiones; sus handle_client terminan solos."""
+        for sub in self.subscribers():
+            sub.closed = True
+            sub.writer.close()
+
+    def _log(self, msg: str, *args):
+        if self.log:
+            self.log.info("STATE", msg, *args)
+
+    async def handle_client(self, reader, writer):
+        addr = writer.get_extra_info("peername")
+        self._log("Cliente suscrito desde %s", addr)
+        sub = StateSubscriber(writer, addr, asyncio.get_running_loop(),
+                              on_wait=self.on_wait, log=self.log)
+        with self.lock:
+            self.clients.append(sub)
+        writer_task = asyncio.create_task(sub.run())
+        try:
+            # El cliente puede enviar {"cmd":"subscribe", ...} en cualquier momento
+            while not sub.closed:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    msg = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if not isinstance(msg, dict):
+                    continue
+                if msg.get("cmd") != "subscribe":
+                    if self.on_command:
+                        self.on_command(sub, msg)
+                    continue
+                try:
+                    with self.lock:
+                        sub.subscribe(msg)
+                except (ValueError, TypeError) as e:
+                    sub.event({"type": "error", "error": str(e)})
+                    continue
+                self._log("%s suscripción: %s", addr, sub.stats())
+                sub.event({"type": "subscribed", **sub.stats()})
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            with self.lock:
+                self.clients.remove(sub)
+            sub.closed = True
+            writer_task.cancel()
+            writer.close()
+            self._log("Cliente desconectado %s (enviados=%d descartados=%d)",
+                      addr, sub.sent, sub.dropped)
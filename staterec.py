@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Grabación y reproducción del flujo de estado del puerto 6001.
+
+`record` se suscribe a main.py en formato binario y guarda todo (muestras,
+ecos de comandos y eventos) con la hora de llegada. Pide la política
+"disconnect": si su cola se llena, main.py corta la conexión en lugar de
+descartar mensajes en silencio. `replay` sirve una
+grabación en su propio puerto 6001 con el mismo protocolo que main.py
+(subscribe, formatos, filtros), a 1x, Nx o tan rápido como se pueda, así
+display.py, debug_repl.py o un panel se prueban sin el brazo.
+
+Fichero .srec (little-endian):
+
+    cabecera  b"RBTSREC1" + u32 largo + JSON {"source", "started"}
+    registro  <d B H> (t desde el inicio, tipo, largo) + payload
+              tipo 1 = muestra, payload <B d i> (eje, ts, pos_raw)
+              tipo 2 = eco de comando, tipo 3 = evento, tipo 4 = cinemática;
+              payload JSON UTF-8
+
+Al lado va <fichero>.idx con pares <d Q> (t, offset) cada INDEX_INTERVAL_S;
+si falta o está incompleto se reconstruye leyendo la grabación.
+
+Control de la reproducción desde cualquier cliente del puerto:
+
+    {"cmd":"replay"}                          estado
+    {"cmd":"replay","speed":4}                velocidad (0 = sin esperas)
+    {"cmd":"replay","seek":12.5}              saltar a t = 12.5 s
+    {"cmd":"replay","pause":true}             pausar / reanudar
+
+Uso:
+    python3 staterec.py record sesion.srec [--host H] [--duration S]
+    python3 staterec.py replay sesion.srec [--speed 4] [--seek 30] [--loop] [--wait N]
+    python3 staterec.py info sesion.srec
+"""
+
+import argparse
+import asyncio
+import json
+import mmap
+import signal
+import socket
+import struct
+import time
+from bisect import bisect_right
+
+from logpipe import Logger
+from statebus import (FRAME_HEADER, FRAME_TYPE_JSON, FRAME_TYPE_SAMPLE, KIND_COMMAND,
+                      KIND_EVENT, KIND_KINEMATICS, KIND_SAMPLE, SAMPLE_PAYLOAD, StateBus,
+                      StateMessage)
+
+MAGIC            = b"RBTSREC1"
+META_LEN         = struct.Struct("<I")
+REC_HEADER       = struct.Struct("<dBH")
+INDEX_ENTRY      = struct.Struct("<dQ")
+INDEX_INTERVAL_S = 1.0
+KIND_CODES       = {KIND_SAMPLE: 1, KIND_COMMAND: 2, KIND_EVENT: 3, KIND_KINEMATICS: 4}
+CODE_KINDS       = {v: k for k, v in KIND_CODES.items()}
+
+STATE_HOST     = "localhost"
+STATE_PORT     = 6001
+RECORD_QUEUE   = 4096     # cola pedida a main.py
+RECORD_POLICY  = "disconnect"   # la grabación no debe perder nada: si la cola se
+                                # llena, main.py corta y la pérdida se ve
+RECORD_LINE_LIMIT = 1 << 20     # líneas JSON antes de que se aplique la suscripción
+REPLAY_BATCH   = 256      # registros entre cesiones del bucle a velocidad máxima
+REPLAY_SLEEP_MIN_S = 0.001
+
+# ==================================
+#  Escritura
+# ==================================
+class StateRecorder:
+    """Escribe registros en un .srec y su índice, ambos solo por el final."""
+
+    def __init__(self, path: str, source: str = ""):
+        self.path  = path
+        self.f     = open(path, "wb")
+        self.idx   = open(path + ".idx", "wb")
+        meta = json.dumps({"source": source, "started": time.time()}).encode()
+        self.f.write(MAGIC + META_LEN.pack(len(meta)) + meta)
+        self.offset  = self.f.tell()
+        self.t0      = time.monotonic()
+        self.next_ix = 0.0
+        self.counts  = {k: 0 for k in KIND_CODES}
+
+    def write(self, kind: str, payload: bytes, t: float = None):
+        if t is None:
+            t = time.monotonic() - self.t0
+        if t >= self.next_ix:
+            self.idx.write(INDEX_ENTRY.pack(t, self.offset))
+            self.next_ix = t + INDEX_INTERVAL_S
+        rec = REC_HEADER.pack(t, KIND_CODES[kind], len(payload)) + payload
+        self.f.write(rec)
+        self.offset += len(rec)
+        self.counts[kind] += 1
+
+    def close(self):
+        self.f.close()
+        self.idx.close()
+
+def classify(payload: bytes):
+    """Tipo de un JSON del 6001: eco si trae "cmd", cinemática o evento.
+       Devuelve None para las respuestas a la propia suscripción del grabador.
+    """
+    try:
+        obj = json.loads(payload)
+    except ValueError:
+        return KIND_EVENT
+    if not isinstance(obj, dict):
+        return KIND_EVENT
+    if "cmd" in obj:
+        return KIND_COMMAND
+    if obj.get("type") == "subscribed":
+        return None
+    if obj.get("type") == "kinematics":
+        return KIND_KINEMATICS
+    return KIND_EVENT
+
+async def read_message(reader):
+    """(tipo de trama, payload) del siguiente mensaje del 6001.
+       main.py publica en JSON hasta que lee la línea de suscripción, así que
+       lo primero pueden ser líneas JSON; luego llegan tramas binarias. Se
+       distinguen por el primer byte, como en client.StateFramer.
+    """
+    while True:
+        first = await reader.readexactly(1)
+        if first == b"\n":
+            continue
+        if first == b"{":
+            line = await reader.readuntil(b"\n")
+            return FRAME_TYPE_JSON, first + line[:-1]
+        head = first + await reader.readexactly(FRAME_HEADER.size - 1)
+        ftype, n = FRAME_HEADER.unpack(head)
+        return ftype, await reader.readexactly(n)
+
+async def record(path: str, host: str, port: int, duration: float = None):
+    """Graba el 6001 de `host` hasta que se cierre la conexión, pase
+       `duration` o llegue Ctrl+C. Devuelve los contadores por tipo.
+    """
+    reader, writer = await asyncio.open_connection(host, port, limit=RECORD_LINE_LIMIT)
+    writer.write((json.dumps({"cmd": "subscribe", "format": "binary",
+                              "queue": RECORD_QUEUE, "policy": RECORD_POLICY}) + "\n").encode())
+    await writer.drain()
+    rec = StateRecorder(path, source=f"{host}:{port}")
+    print(f"[REC] Grabando {host}:{port} en {path}")
+    deadline = time.monotonic() + duration if duration else None
+    try:
+        while True:
+            timeout = deadline - time.monotonic() if deadline else None
+            if timeout is not None and timeout <= 0:
+                break
+            try:
+                ftype, payload = await asyncio.wait_for(read_message(reader), timeout)
+            except asyncio.TimeoutError:
+                break
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                # Con RECORD_POLICY main.py también corta si la cola se llena:
+                # lo grabado hasta aquí está completo, pero la sesión no
+                print(f"[REC] El servidor cerró la conexión (política {RECORD_POLICY}: "
+                      f"puede ser por cola llena)")
+                break
+            if ftype == FRAME_TYPE_SAMPLE:
+                rec.write(KIND_SAMPLE, payload)
+            elif ftype == FRAME_TYPE_JSON:
+                kind = classify(payload)
+                if kind is not None:
+                    rec.write(kind, payload)
+    finally:
+        rec.close()
+        writer.close()
+    return rec.counts
+
+# ==================================
+#  Lectura
+# ==================================
+class Recording:
+    """Grabación .srec mapeada en memoria, con búsqueda por tiempo."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path}: no es una grabación de estado")
+        (n,) = META_LEN.unpack_from(self.mm, len(MAGIC))
+        start = len(MAGIC) + META_LEN.size
+        self.meta  = json.loads(self.mm[start:start + n])
+        self.start = start + n
+        self.index_t, self.index_off = self._load_index()
+        self.duration = self._last_t()
+
+    def _load_index(self):
+        times, offs = [0.0], [self.start]
+        try:
+            with open(self.path + ".idx", "rb") as f:
+                data = f.read()
+        except OSError:
+            data = b""
+        for t, off in INDEX_ENTRY.iter_unpack(data[:len(data) - len(data) % INDEX_ENTRY.size]):
+            if off < len(self.mm) and off > offs[-1]:
+                times.append(t)
+                offs.append(off)
+        if len(times) == 1 and len(self.mm) > self.start:
+            # Sin índice: una pasada por los registros
+            next_ix = INDEX_INTERVAL_S
+            for t, _, _, off in self.records():
+                if t >= next_ix:
+                    times.append(t)
+                    offs.append(off)
+                    next_ix = t + INDEX_INTERVAL_S
+        return times, offs
+
+    def _last_t(self) -> float:
+        t = 0.0
+        for t, _, _, _ in self.records(self.index_off[-1]):
+            pass
+        return t
+
+    def records(self, offset: int = None):
+        """Genera (t, tipo, payload, offset) desde `offset`. Un registro
+           cortado al final (grabación interrumpida) se ignora.
+        """
+        mm, end = self.mm, len(self.mm)
+        off = self.start if offset is None else offset
+        while off + REC_HEADER.size <= end:
+            t, code, n = REC_HEADER.unpack_from(mm, off)
+            body = off + REC_HEADER.size
+            if body + n > end:
+                break
+            yield t, CODE_KINDS.get(code, KIND_EVENT), mm[body:body + n], off
+            off = body + n
+
+    def offset_at(self, t: float) -> int:
+        """Offset del primer registro con tiempo >= t."""
+        i = max(0, bisect_right(self.index_t, t) - 1)
+        for rt, _, _, off in self.records(self.index_off[i]):
+            if rt >= t:
+                return off
+        return len(self.mm)
+
+    def info(self) -> dict:
+        counts = {k: 0 for k in KIND_CODES}
+        for _, kind, _, _ in self.records():
+            counts[kind] += 1
+        return {"path": self.path, **self.meta, "duration_s": round(self.duration, 3),
+                "bytes": len(self.mm), "index": len(self.index_t), "records": counts}
+
+    def close(self):
+        self.mm.close()
+
+def to_message(kind: str, payload: bytes, ts_shift: float = 0.0) -> StateMessage:
+    if kind == KIND_SAMPLE:
+        axis, ts, pos = SAMPLE_PAYLOAD.unpack(payload)
+        return StateMessage.sample(axis, ts + ts_shift, pos)
+    text = bytes(payload).decode()
+    if kind == KIND_KINEMATICS:
+        # eje y ts para los filtros por eje de la suscripción
+        obj = json.loads(text)
+        return StateMessage(kind, text=text, axis=obj.get("axis"), ts=obj.get("ts"))
+    return StateMessage(kind, text=text)
+
+# ==================================
+#  Reproducción
+# ==================================
+class Replayer:
+    """Publica una grabación en un StateBus respetando sus tiempos
+       divididos por `speed` (0 = sin esperas). Con `retime` las muestras
+       llevan ts del reloj actual, como si llegaran en vivo.
+    """
+    def __init__(self, rec: Recording, bus: StateBus, speed: float = 1.0,
+                 seek: float = 0.0, repeat: bool = False, retime: bool = False, log=None):
+        self.rec     = rec
+        self.bus     = bus
+        self.speed   = speed
+        self.repeat  = repeat
+        self.retime  = retime
+        self.log     = log
+        self.t       = seek          # tiempo de grabación del último publicado
+        self.sent    = 0
+        self.laps    = 0
+        self._seek   = seek
+        self._rebase = True
+        self._resume = asyncio.Event()
+        self._resume.set()
+        self._changed = asyncio.Event()
+
+    # ---------- control ----------
+    def control(self, sub, msg: dict):
+        """Línea de un cliente del puerto que no es "subscribe"."""
+        if msg.get("cmd") != "replay":
+            sub.event({"type": "error", "error": f"comando desconocido: {msg.get('cmd')!r}"})
+            return
+        try:
+            if "speed" in msg:
+                speed = float(msg["speed"])
+                if speed < 0:
+                    raise ValueError(f"velocidad inválida: {speed}")
+                self.speed = speed
+            if "seek" in msg:
+                self.seek(float(msg["seek"]))
+            if "pause" in msg:
+                self.pause(bool(msg["pause"]))
+        except (TypeError, ValueError) as e:
+            sub.event({"type": "error", "error": str(e)})
+            return
+        self._rebase = True
+        self._changed.set()
+        sub.event(self.status())
+
+    def seek(self, t: float):
+        self._seek = self.t = min(max(0.0, t), self.rec.duration)
+
+    def pause(self, paused: bool):
+        if paused:
+            self._resume.clear()
+        else:
+            self._resume.set()
+
+    def status(self) -> dict:
+        return {"type": "replay", "t": round(self.t, 3), "duration": round(self.rec.duration, 3),
+                "speed": self.speed, "paused": not self._resume.is_set(),
+                "sent": self.sent, "laps": self.laps}
+
+    # ---------- bucle ----------
+    async def _wait_until(self, deadline: float):
+        """Duerme hasta `deadline` salvo que cambien velocidad o posición."""
+        delay = deadline - time.monotonic()
+        if delay < REPLAY_SLEEP_MIN_S:
+            return
+        self._changed.clear()
+        try:
+            await asyncio.wait_for(self._changed.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def run(self):
+        started = self.rec.meta.get("started", 0.0)
+        while True:
+            off = self.rec.offset_at(self._seek)
+            self._seek = None
+            self._rebase = True
+            batch = 0
+            for t, kind, payload, _ in self.rec.records(off):
+                if not self._resume.is_set():
+                    await self._resume.wait()
+                    self._rebase = True
+                if self._rebase:
+                    wall0, t0 = time.monotonic(), t
+                    self._rebase = False
+                if self.speed > 0:
+                    await self._wait_until(wall0 + (t - t0) / self.speed)
+                    if self._rebase:        # cambió la velocidad durante la espera
+                        wall0, t0 = time.monotonic(), t
+                        self._rebase = False
+                else:
+                    batch += 1
+                    if batch >= REPLAY_BATCH:
+                        batch = 0
+                        await asyncio.sleep(0)
+                if self._seek is not None:
+                    break
+                # started + t es la hora a la que llegó el mensaje al grabar
+                ts_shift = time.time() - started - t if self.retime else 0.0
+                self.bus.publish(to_message(kind, payload, ts_shift))
+                self.t = t
+                self.sent += 1
+            else:
+                self.laps += 1
+                self.bus.publish(StateMessage(KIND_EVENT, text=json.dumps(
+                    {**self.status(), "event": "end"})))
+                if self.log:
+                    self.log.info("REPLAY", "Fin de la grabación (vuelta %d, %d mensajes)",
+                                  self.laps, self.sent)
+                if not self.repeat:
+                    return
+                self._seek = 0.0
+
+async def replay(path: str, port: int, speed: float, seek: float, repeat: bool,
+                 retime: bool, log, wait_clients: int = 0):
+    rec = Recording(path)
+    bus = StateBus(log=log)
+    player = Replayer(rec, bus, speed=speed, seek=seek, repeat=repeat, retime=retime, log=log)
+    bus.on_command = player.control
+    srv = await asyncio.start_server(bus.handle_client, "0.0.0.0", port, reuse_address=True)
+    log.info("REPLAY", "%s: %.1f s en el puerto %d (velocidad %s, desde t=%.1f s)",
+             path, rec.duration, port, speed or "máxima", seek)
+    async with srv:
+        if wait_clients:
+            log.info("REPLAY", "Esperando %d cliente(s)", wait_clients)
+            while len(bus) < wait_clients:
+                await asyncio.sleep(0.05)
+        await player.run()
+        if not repeat:
+            # Deja vaciar las colas de los suscriptores antes de cerrar
+            while any(s.queue for s in bus.subscribers()):
+                await asyncio.sleep(0.05)
+            bus.close()
+            while len(bus):
+                await asyncio.sleep(0.05)
+    rec.close()
+    return player.status()
+
+def main():
+    ap = argparse.ArgumentParser(description="Graba o reproduce el flujo del puerto 6001")
+    sub = ap.add_subparsers(dest="mode", required=True)
+    p = sub.add_parser("record", help="graba el 6001 de main.py")
+    p.add_argument("path")
+    p.add_argument("--host", default=STATE_HOST)
+    p.add_argument("--port", type=int, default=STATE_PORT)
+    p.add_argument("--duration", type=float, default=None, help="segundos (por defecto, hasta Ctrl+C)")
+    p = sub.add_parser("replay", help="sirve una grabación en el puerto 6001")
+    p.add_argument("path")
+    p.add_argument("--port", type=int, default=STATE_PORT)
+    p.add_argument("--speed", type=float, default=1.0, help="factor de velocidad (0 = máxima)")
+    p.add_argument("--seek", type=float, default=0.0, help="empieza en este t (s)")
+    p.add_argument("--loop", action="store_true", help="vuelve a empezar al terminar")
+    p.add_argument("--wait", type=int, default=0, metavar="N",
+                   help="no empieza hasta que haya N clientes conectados")
+    p.add_argument("--retime", action="store_true",
+                   help="ts de las muestras con el reloj actual en lugar del grabado")
+    p = sub.add_parser("info", help="resumen de una grabación")
+    p.add_argument("path")
+    args = ap.parse_args()
+
+    if args.mode == "info":
+        rec = Recording(args.path)
+        print(json.dumps(rec.info(), indent=2))
+        rec.close()
+        return
+    # Como main.py: SIGTERM sale igual que Ctrl+C (se cierra la grabación)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        if args.mode == "record":
+            counts = asyncio.run(record(args.path, args.host, args.port, args.duration))
+            print(f"[REC] {counts}")
+        else:
+            log = Logger("info").start()
+            try:
+                status = asyncio.run(replay(args.path, args.port, args.speed, args.seek,
+                                            args.loop, args.retime, log, args.wait))
+                log.info("REPLAY", "%s", status)
+            finally:
+                log.stop()
+    except KeyboardInterrupt:
+        pass
+    except (ConnectionError, socket.gaierror) as e:
+        print(f"[REC] No se pudo conectar: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Trayectorias PBD en columnas compactas y biblioteca persistente en disco.
+
+Cada eje se guarda como dos columnas paralelas: t_rel (float64) y posición
+de encoder (int32). En disco cada demostración es un directorio con dos
+ficheros por eje que solo crecen por el final:
+
+    <biblioteca>/<nombre>/axis<N>.t     float64 nativo, t_rel en segundos
+    <biblioteca>/<nombre>/axis<N>.pos   int32 nativo, cuentas de encoder
+
+Al cargar, las columnas se mapean en memoria (mmap) sin copiar nada.
+"""
+
+import mmap
+import os
+import re
+import shutil
+from array import array
+
+T_TYPECODE   = "d"
+POS_TYPECODE = "i"
+assert array(POS_TYPECODE).itemsize == 4, "se espera int32 para la posición"
+
+NAME_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+AXES    = (1, 2, 3)
+
+class Trajectory:
+    """Trayectoria de un eje: columnas `t` (float64) y `pos` (int32).
+       Las columnas pueden ser array (en memoria) o memoryview sobre un mmap
+       (solo lectura); al añadir a una mapeada se copia a memoria.
+    """
+    __slots__ = ("t", "pos", "_maps")
+
+    def __init__(self, t=None, pos=None, maps=()):
+        self.t     = t if t is not None else array(T_TYPECODE)
+        self.pos   = pos if pos is not None else array(POS_TYPECODE)
+        self._maps = maps     # mmaps que respaldan las columnas (si hay)
+
+    def __len__(self):
+        return len(self.t)
+
+    def __getitem__(self, i):
+        return self.t[i], self.pos[i]
+
+    def __iter__(self):
+        return zip(self.t, self.pos)
+
+    @property
+    def mapped(self) -> bool:
+        return bool(self._maps)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.t) * 8 + len(self.pos) * 4
+
+    def append(self, t_rel: float, pos: int):
+        if self._maps:
+            self.t     = array(T_TYPECODE, self.t)
+            self.pos   = array(POS_TYPECODE, self.pos)
+            self._maps = ()
+        self.t.append(t_rel)
+        self.pos.append(pos)
+
+    def duration(self) -> float:
+        return self.t[-1] - self.t[0] if len(self.t) else 0.0
+
+def _map_column(path: str, typecode: str):
+    """Mapea un fichero de columna en solo lectura. Devuelve (vista, mmap)."""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return array(typecode), None
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    itemsize = array(typecode).itemsize
+    n = size // itemsize
+    return memoryview(mm)[:n * itemsize].cast(typecode), mm
+
+def _stored_tail(d: str, axis: int):
+    """Puntos completos de un eje en disco y el último (t, pos). Recorta lo
+       que sobre de una escritura cortada para poder seguir añadiendo.
+    """
+    pt = os.path.join(d, f"axis{axis}.t")
+    pp = os.path.join(d, f"axis{axis}.pos")
+    if not (os.path.exists(pt) and os.path.exists(pp)):
+        return 0, None
+    n = min(os.path.getsize(pt) // 8, os.path.getsize(pp) // 4)
+    for path, itemsize in ((pt, 8), (pp, 4)):
+        if os.path.getsize(path) != n * itemsize:
+            os.truncate(path, n * itemsize)
+    if not n:
+        return 0, None
+    with open(pt, "rb") as f:
+        f.seek((n - 1) * 8)
+        t = array(T_TYPECODE, f.read(8))[0]
+    with open(pp, "rb") as f:
+        f.seek((n - 1) * 4)
+        pos = array(POS_TYPECODE, f.read(4))[0]
+    return n, (t, pos)
+
+def _append_columns(d: str, axis: int, traj: "Trajectory", start: int):
+    """Añade los puntos `start:` de `traj` al final de las columnas del eje."""
+    with open(os.path.join(d, f"axis{axis}.t"), "ab") as f:
+        f.write(memoryview(traj.t)[start:].cast("B"))
+    with open(os.path.join(d, f"axis{axis}.pos"), "ab") as f:
+        f.write(memoryview(traj.pos)[start:].cast("B"))
+
+class TrajectoryLibrary:
+    """Demostraciones con nombre guardadas bajo `root`."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _dir(self, name: str) -> str:
+        if not isinstance(name, str) or not NAME_RE.match(name):
+            raise ValueError(f"nombre inválido: {name!r} (use letras, dígitos, '_' o '-')")
+        return os.path.join(self.root, name)
+
+    def names(self):
+        try:
+            entries = os.listdir(self.root)
+        except FileNotFoundError:
+            return []
+        return sorted(e for e in entries
+                      if NAME_RE.match(e) and os.path.isdir(os.path.join(self.root, e)))
+
+    def info(self, name: str) -> dict:
+        """Resumen de una demostración leyendo solo el tamaño de los ficheros."""
+        d = self._dir(name)
+        axes = {}
+        size = 0
+        for axis in AXES:
+            p = os.path.join(d, f"axis{axis}.t")
+            if os.path.exists(p):
+                n = os.path.getsize(p) // 8
+                axes[axis] = n
+                size += n * 12
+        return {"name": name, "axes": axes, "bytes": size}
+
+    def list(self):
+        return [self.info(n) for n in self.names()]
+
+    def save(self, name: str, trajs: dict) -> dict:
+        """Guarda los ejes con datos de `trajs` ({eje: Trajectory}). Los
+           ficheros solo crecen: si el nombre ya existe, cada eje añade a sus
+           columnas los puntos que aún no tiene (lo guardado tiene que ser el
+           principio de la trayectoria; si no, ValueError) y un eje nuevo crea
+           las suyas. Un nombre nuevo se escribe en un directorio temporal que
+           se renombra al terminar.
+        """
+        d = self._dir(name)
+        os.makedirs(self.root, exist_ok=True)
+        if not os.path.isdir(d):
+            tmp = d + ".tmp"
+            shutil.rmtree(tmp, ignore_errors=True)
+            os.makedirs(tmp)
+            for axis, traj in trajs.items():
+                if len(traj):
+                    _append_columns(tmp, axis, traj, 0)
+            os.rename(tmp, d)
+            return self.info(name)
+        # Primero se comprueban todos los ejes: o se añade a todos o a ninguno
+        starts = {}
+        for axis, traj in trajs.items():
+            if not len(traj):
+                continue
+            n, last = _stored_tail(d, axis)
+            if n > len(traj) or (n and last != traj[n - 1]):
+                raise ValueError(f"'{name}' ya tiene otra trayectoria en el eje {axis}; "
+                                 f"bórrela o use otro nombre")
+            starts[axis] = n
+        for axis, n in starts.items():
+            if n < len(trajs[axis]):
+                _append_columns(d, axis, trajs[axis], n)
+        return self.info(name)
+
+    def load(self, name: str) -> dict:
+        """Devuelve {eje: Trajectory} mapeadas en memoria (sin copiar)."""
+        d = self._dir(name)
+        if not os.path.isdir(d):
+            raise ValueError(f"no existe la demostración {name!r}")
+        trajs = {}
+        for axis in AXES:
+            pt = os.path.join(d, f"axis{axis}.t")
+            pp = os.path.join(d, f"axis{axis}.pos")
+            if not (os.path.exists(pt) and os.path.exists(pp)):
+                continue
+            t, mt     = _map_column(pt, T_TYPECODE)
+            pos, mpos = _map_column(pp, POS_TYPECODE)
+            n = min(len(t), len(pos))     # tolera una escritura cortada
+            trajs[axis] = Trajectory(t[:n], pos[:n], tuple(m for m in (mt, mpos) if m))
+        return trajs
+
+    def delete(self, name: str):
+        d = self._dir(name)
+        if not os.path.isdir(d):
+            raise ValueError(f"no existe la demostración {name!r}")
+        shutil.rmtree(d)
+
+# ==================================
+#  Compilador de trayectorias
+# ==================================
+class MovePlan:
+    """Resultado de compilar una trayectoria: pasos (t_rel, pasos_con_signo)."""
+    __slots__ = ("moves", "duration", "stats")
+
+    def __init__(self, moves, duration, stats):
+        self.moves    = moves
+        self.duration = duration
+        self.stats    = stats
+
+def simplify(t, pos, tolerance: float):
+    """Ramer-Douglas-Peucker sobre (t, pos). La distancia es vertical, en
+       cuentas de encoder, respecto a la recta entre los extremos del tramo.
+       Devuelve los índices de los puntos que se conservan.
+    """
+    n = len(t)
+    if n <= 2:
+        return list(range(n))
+    keep = bytearray(n)
+    keep[0] = keep[n - 1] = 1
+    stack = [(0, n - 1)]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        ta, pa = t[a], pos[a]
+        span  = t[b] - ta
+        slope = (pos[b] - pa) / span if span > 0 else 0.0
+        dmax, imax = -1.0, -1
+        for i in range(a + 1, b):
+            d = abs(pos[i] - (pa + slope * (t[i] - ta)))
+            if d > dmax:
+                dmax, imax = d, i
+        if dmax > tolerance:
+            keep[imax] = 1
+            stack.append((a, imax))
+            stack.append((imax, b))
+    return [i for i in range(n) if keep[i]]
+
+INTERP_METHODS = ("linear", "spline")
+
+def resample(t, pos, rate_hz: float, method: str = "linear"):
+    """Remuestrea (t, pos) en una rejilla uniforme de `rate_hz` con
+       interpolación lineal o Catmull-Rom (spline cúbica que pasa por las
+       muestras; tangentes con la separación real de las muestras, que no es
+       uniforme). Un solo recorrido: la rejilla y las muestras están
+       ordenadas, así el tramo de cada punto se encuentra avanzando un índice.
+       Devuelve (t, pos) como listas; pos queda en float (cuentas).
+    """
+    n = len(t)
+    if n < 2 or rate_hz <= 0:
+        return list(t), [float(p) for p in pos]
+    if method not in INTERP_METHODS:
+        raise ValueError(f"interpolación desconocida: {method!r}")
+    t0, t1 = t[0], t[n - 1]
+    dt   = 1.0 / rate_hz
+    grid = [t0 + k * dt for k in range(int((t1 - t0) * rate_hz + 1e-9) + 1)]
+    if t1 - grid[-1] > 1e-9:
+        grid.append(t1)     # conserva el punto final exacto
+    spline = method == "spline"
+    out = []
+    j = 0
+    for tg in grid:
+        while j < n - 2 and t[j + 1] <= tg:
+            j += 1
+        ta, tb = t[j], t[j + 1]
+        h  = tb - ta
+        u  = (tg - ta) / h if h > 0 else 0.0
+        pa, pb = pos[j], pos[j + 1]
+        if spline and h > 0:
+            # Hermite con tangente (p[i+1] - p[i-1]) / (t[i+1] - t[i-1]) en
+            # cada extremo del tramo; con separación uniforme es Catmull-Rom
+            i0, i3 = max(j - 1, 0), min(j + 2, n - 1)
+            ma = (pb - pos[i0]) / (tb - t[i0]) * h
+            mb = (pos[i3] - pa) / (t[i3] - ta) * h
+            u2 = u * u
+            u3 = u2 * u
+            out.append((2 * u3 - 3 * u2 + 1) * pa + (u3 - 2 * u2 + u) * ma
+                       + (3 * u2 - 2 * u3) * pb + (u3 - u2) * mb)
+        else:
+            out.append(pa + (pb - pa) * u)
+    return grid, out
+
+def compile_plan(traj: Trajectory, counts_per_step: float, reverse: bool = False,
+                 tolerance: float = 0.0, min_steps: int = 1, speed: float = 1.0,
+                 rate_hz: float = None, method: str = "linear",
+                 max_step_rate: float = None, settle_s: float = 0.0,
+                 axes: int = 1, overhead_s: float = 0.0) -> MovePlan:
+    """Compila `traj` en un plan de movimientos:
+       1. escala el tiempo por `speed` (2.0 = el doble de rápido)
+       2. con `rate_hz`, remuestrea en una rejilla uniforme (ver resample);
+          si no, simplifica con RDP dentro de `tolerance` cuentas
+       3. convierte cuentas a pasos arrastrando el error de redondeo
+       4. limita cada tramo a lo que el motor puede dar (`max_step_rate`
+          pasos/s tras `settle_s` de pausa y `overhead_s` de línea, respuesta
+          y despacho por move); lo que no cabe pasa al tramo siguiente. El
+          firmware ejecuta un move a la vez para todos los ejes: con `axes`
+          ejes reproduciéndose juntos, a cada uno le toca 1/axes del tiempo.
+          Ese tiempo se acumula como crédito entre tramos (como mucho el coste
+          fijo de un move de arrastre), así con tramos más cortos que la
+          pausa el eje mueve cada varios tramos en vez de nunca
+       5. junta tramos de menos de `min_steps` pasos con el siguiente si van
+          en el mismo sentido, y descarta los de 0 pasos
+    """
+    n = len(traj)
+    if n < 2:
+        return MovePlan([], 0.0, {"points": n, "kept": n, "naive_commands": 0,
+                                  "commands": 0, "removed": 0, "capped_steps": 0,
+                                  "final_error_counts": 0.0, "naive_error_counts": 0.0})
+    if speed <= 0:
+        raise ValueError(f"velocidad inválida: {speed}")
+    t, pos = traj.t, traj.pos
+    if reverse:
+        t_last = t[n - 1]
+        t   = [t_last - t[i] for i in range(n - 1, -1, -1)]
+        pos = [pos[i] for i in range(n - 1, -1, -1)]
+    if speed != 1.0:
+        t = [ti / speed for ti in t]
+    if rate_hz:
+        t, pos = resample(t, pos, rate_hz, method)
+        n = len(t)
+    t0 = t[0]
+
+    # Conversión ingenua (un redondeo por segmento), solo para comparar
+    naive_cmds  = 0
+    naive_steps = 0
+    for i in range(1, n):
+        s = int(round((pos[i] - pos[i - 1]) / counts_per_step))
+        if s:
+            naive_cmds  += 1
+            naive_steps += s
+
+    idx = simplify(t, pos, tolerance) if tolerance > 0 and not rate_hz else list(range(n))
+
+    moves    = []
+    residual = 0.0
+    capped   = 0
+    credit   = 0.0      # tiempo de firmware disponible para este eje (s)
+    cost     = settle_s + overhead_s    # coste fijo de cada move (s)
+    axes     = max(1, int(axes))
+    pend_t   = None     # tramo pequeño pendiente de juntar
+    pend_n   = 0
+    for k in range(1, len(idx)):
+        a, b = idx[k - 1], idx[k]
+        residual += (pos[b] - pos[a]) / counts_per_step
+        steps = int(round(residual))
+        if max_step_rate:
+            share  = (t[b] - t[a]) / axes
+            credit = min(credit + share, share + cost)
+            budget = int(max(0.0, credit - cost) * max_step_rate)
+            if abs(steps) > budget:
+                capped += abs(steps) - budget
+                steps   = budget if steps > 0 else -budget
+            if steps:
+                credit -= cost + abs(steps) / max_step_rate
+        residual -= steps
+        if steps == 0:
+            continue
+        if pend_n:
+            if (pend_n > 0) == (steps > 0):
+                steps += pend_n
+                t_move = pend_t
+                pend_n = 0
+            else:
+                moves.append((pend_t, pend_n))
+                pend_n = 0
+                t_move = t[a] - t0
+        else:
+            t_move = t[a] - t0
+        if abs(steps) < min_steps:
+            pend_t, pend_n = t_move, steps
+            continue
+        moves.append((t_move, steps))
+    if pend_n:
+        moves.append((pend_t, pend_n))
+    duration = t[n - 1] - t0
+    # Lo que el límite de velocidad dejó pendiente se envía al final
+    tail = int(round(residual))
+    if capped and tail:
+        moves.append((duration, tail))
+        duration += abs(tail) / max_step_rate + cost
+
+    total_counts = pos[n - 1] - pos[0]
+    emitted      = sum(s for _, s in moves)
+    stats = {
+        "points":             n,
+        "kept":               len(idx),
+        "naive_commands":     naive_cmds,
+        "commands":           len(moves),
+        "removed":            naive_cmds - len(moves),
+        "capped_steps":       capped,
+        "final_error_counts": round(total_counts - emitted * counts_per_step, 2),
+        "naive_error_counts": round(total_counts - naive_steps * counts_per_step, 2),
+    }
+    return MovePlan(moves, duration, stats)
+
+def serial_end(moves, max_step_rate: float, cost_s: float) -> float:
+    """Cuándo termina el firmware los `moves` [(t, pasos)] ordenados por t,
+       de todos los ejes, si ejecuta uno a la vez: cada move empieza en su t
+       o al acabar el anterior y dura `cost_s` más sus pasos.
+    """
+    end = 0.0
+    for t_move, n in moves:
+        end = max(end, t_move) + cost_s + abs(n) / max_step_rate
+    return end